@@ -0,0 +1,86 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# ASCII control characters, newlines and tabs included; act_num values have
+# been seen with embedded newlines, which Cosmos stores as part of the id
+CONTROL_CHARACTERS = r"[\x00-\x1f\x7f]"
+
+# the parts of a canonical act_num, in order
+KEY_PARTS = ["state", "year", "original_act_num"]
+
+
+class KeyStats:
+    """Counters of the act_nums built by canonical_act_nums."""
+
+    def __init__(self):
+        self.rows = 0
+        self.rewritten = 0
+        self.incomplete = 0
+
+    def add(self, other):
+        self.rows += other.rows
+        self.rewritten += other.rewritten
+        self.incomplete += other.incomplete
+
+    def summary(self):
+        return (
+            f"{self.rows} act_nums built, {self.rewritten} rewritten "
+            f"(control characters or surrounding whitespace removed), "
+            f"{self.incomplete} without a state, year or original_act_num"
+        )
+
+
+def _to_arrow(values):
+    array = pa.Array.from_pandas(values)
+    if pa.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+    return array.cast(pa.string())
+
+
+def _sanitize_arrow(array):
+    array = pc.replace_substring_regex(array, CONTROL_CHARACTERS, "")
+    array = pc.utf8_trim_whitespace(array)
+    # a value that was only whitespace counts as missing
+    return pc.if_else(pc.equal(array, ""), pa.scalar(None, pa.string()), array)
+
+
+def sanitize(values):
+    """
+    Remove control characters and surrounding whitespace from string values.
+
+    Values left empty become None. Runs on the whole column at once.
+
+    Args:
+        values (Series): String values, object or categorical, None for missing
+
+    Returns:
+        Series: Sanitized values (object dtype) with the same index
+    """
+    array = _sanitize_arrow(_to_arrow(values))
+    return pd.Series(array.to_numpy(zero_copy_only=False), index=values.index, dtype=object)
+
+
+def canonical_act_nums(df):
+    """
+    Build the canonical act_num, state + year + original_act_num, of every row.
+
+    Each part is sanitized first, so keys never carry newlines or other
+    control characters. A row with a missing part gets None instead of a key.
+
+    Args:
+        df (DataFrame): Normalized clean data with state, year and original_act_num
+
+    Returns:
+        tuple: (Series of act_nums with the index of `df`, KeyStats)
+    """
+    stats = KeyStats()
+    stats.rows = len(df)
+    raw = [_to_arrow(df[column]) for column in KEY_PARTS]
+    canonical = pc.binary_join_element_wise(*[_sanitize_arrow(part) for part in raw], "")
+    # what the row-by-row concatenation would have produced
+    concatenated = pc.binary_join_element_wise(*raw, "")
+    stats.incomplete = canonical.null_count
+    stats.rewritten = pc.sum(pc.not_equal(canonical, concatenated).fill_null(False)).as_py() or 0
+    act_nums = pd.Series(canonical.to_numpy(zero_copy_only=False), index=df.index, dtype=object)
+    return act_nums, stats
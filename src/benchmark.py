@@ -0,0 +1,752 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from os.path import dirname, join
+
+import benchmark_suite
+import key_index
+import release
+import synthetic_data
+import upload_data
+import verify_data
+import verify_uploaded_raw_pdfs
+from act_nums import CONTROL_CHARACTERS
+from alive_progress import config_handler
+from azure.cosmos.exceptions import CosmosHttpResponseError
+from classification import ClassificationIndex, load_classification
+from clean_data import load_clean_csv
+from clean_dataset import dataset_dir_for, dataset_partitions, iter_dataset, read_dataset, update_dataset
+from cosmos_uploader import assemble_batches, content_hash, upload_batches, upload_stream
+from delta_sync import plan_sync, sync_operations
+from local_services import FakeBlobServer, FakeContainer
+from parallel import ordered_map
+from partition_scan import CountAction, DeleteAction, run_scan
+from pdf_checker import check_pdf_urls
+from rate_control import AdaptiveConcurrency
+from search_keys import SearchKeyStore, parse_search_keys
+from storage import SqliteContainer
+
+
+def legacy_verify_counts(df, df_classification):
+    """
+    Row-by-row reference for the verify_data.py counters, kept as the baseline.
+
+    Args:
+        df (DataFrame): Clean data with object state and year columns
+        df_classification (DataFrame): Classification results indexed by act_num
+
+    Returns:
+        tuple: (csv counters dict, classification counters dict)
+    """
+    csv_counts = dict.fromkeys(
+        [
+            "act_num_missing",
+            "act_num_bad_format",
+            "act_num_unsanitized",
+            "duplicate_act_num",
+            "nan_year_count",
+            "link_missing",
+        ],
+        0,
+    )
+    class_counts = dict.fromkeys(
+        ["classification_missing", "multiple_classification", "search_keys_missing", "search_keys_bad_format"], 0
+    )
+    for (state, year), group_df in df.groupby(["state", "year"]):
+        year_classification = df_classification[
+            (df_classification["year"] == year) & (df_classification["state"] == state)
+        ]
+        for _, row in group_df.iterrows():
+            if not str(row["year"]).isnumeric():
+                csv_counts["nan_year_count"] += 1
+            try:
+                if row["link"] == None or row["link"] == "":
+                    csv_counts["link_missing"] += 1
+            except KeyError:
+                csv_counts["link_missing"] += 1
+            try:
+                if row["act_num"] == None or row["act_num"] == "":
+                    csv_counts["act_num_missing"] += 1
+                else:
+                    if not row["act_num"].startswith(row["state"] + str(row["year"])):
+                        csv_counts["act_num_bad_format"] += 1
+                    if re.sub(CONTROL_CHARACTERS, "", row["act_num"]).strip() != row["act_num"]:
+                        csv_counts["act_num_unsanitized"] += 1
+                    if df[df["act_num"] == row["act_num"]].shape[0] > 1:
+                        csv_counts["duplicate_act_num"] += 1
+            except KeyError:
+                csv_counts["act_num_missing"] += 1
+                continue
+            try:
+                classification = year_classification.loc[row["act_num"]]
+            except KeyError:
+                class_counts["classification_missing"] += 1
+                continue
+            if isinstance(classification, pd.DataFrame):
+                first_row = classification.iloc[0]
+                if not (classification == first_row).all(axis=1).all():
+                    class_counts["multiple_classification"] += 1
+                    continue
+                classification = first_row
+            if classification["search_keys"] in ("{}", "", None):
+                class_counts["search_keys_missing"] += 1
+            else:
+                try:
+                    parse_search_keys(classification["search_keys"])
+                except ValueError:
+                    class_counts["search_keys_bad_format"] += 1
+    return csv_counts, class_counts
+
+
+def bench_verify(args):
+    """Compare the vectorized verify_data counters with the row-by-row baseline."""
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.rows} synthetic rows...")
+        path = synthetic_data.generate(tmp, args.rows)[0]
+        df = load_clean_csv(path, verify_data.COLUMNS)
+        df_classification = load_classification(join(tmp, "classification_results.csv"))
+        df_classification.set_index(["act_num"], inplace=True)
+
+        start = time.perf_counter()
+        classification_index = ClassificationIndex(df_classification)
+        csv_counts = verify_data.check_csv(df)
+        class_counts = verify_data.check_classification(df, classification_index)
+        vectorized = time.perf_counter() - start
+
+        # the baseline is quadratic, so it only runs on a prefix of the file
+        sample = df.head(args.baseline_rows)
+        start = time.perf_counter()
+        expected = legacy_verify_counts(
+            sample.astype({"state": object, "year": object}), df_classification
+        )
+        baseline = time.perf_counter() - start
+        actual = (
+            verify_data.check_csv(sample),
+            verify_data.check_classification(sample, classification_index),
+        )
+
+    baseline_rate = len(sample) / baseline
+    vectorized_rate = len(df) / vectorized
+    print(json.dumps({"csv": csv_counts, "classification": class_counts}, indent=2))
+    print(f"Vectorized: {len(df)} rows in {vectorized:.2f}s ({vectorized_rate:,.0f} rows/s)")
+    print(f"Row-by-row: {len(sample)} rows in {baseline:.2f}s ({baseline_rate:,.0f} rows/s)")
+    print(f"Speedup (rows/s): {vectorized_rate / baseline_rate:,.0f}x")
+    print(f"Counters match baseline on sample: {actual == expected}")
+
+
+def bench_load(args):
+    """Compare a plain pandas parse of a clean-data CSV with clean_data.load_clean_csv."""
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.rows} synthetic rows...")
+        path = synthetic_data.generate(tmp, args.rows)[0]
+
+        start = time.perf_counter()
+        df = pd.read_csv(path, dtype=str, usecols=verify_data.COLUMNS)
+        df = df.where(pd.notna(df), None)
+        pandas_time = time.perf_counter() - start
+        pandas_mb = df.memory_usage(deep=True).sum() / 1e6
+
+        start = time.perf_counter()
+        loaded = load_clean_csv(path, verify_data.COLUMNS)
+        arrow_time = time.perf_counter() - start
+        arrow_mb = loaded.memory_usage(deep=True).sum() / 1e6
+
+        as_object = loaded.astype({"state": object, "year": object})
+        same = df.equals(as_object.where(as_object.notna(), None)[df.columns])
+
+    print(f"pandas.read_csv: {pandas_time:.2f}s, frame {pandas_mb:.0f} MB")
+    print(f"load_clean_csv:  {arrow_time:.2f}s, frame {arrow_mb:.0f} MB")
+    print(f"Speedup: {pandas_time / arrow_time:.1f}x, same values: {same}")
+
+
+def bench_dataset(args):
+    """Compare reading one state-year from the CSVs with the partitioned Parquet dataset."""
+    states = args.states.split(",")
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.rows} synthetic rows...")
+        paths = synthetic_data.generate(tmp, args.rows, states=states)
+        clean_data_dir = join(tmp, "clean-data")
+        dataset_dir = dataset_dir_for(clean_data_dir)
+
+        start = time.perf_counter()
+        update_dataset(clean_data_dir, dataset_dir)
+        ingest = time.perf_counter() - start
+        start = time.perf_counter()
+        manifest = update_dataset(clean_data_dir, dataset_dir)
+        refresh = time.perf_counter() - start
+
+        state, year = states[0], str(args.year)
+        start = time.perf_counter()
+        df = load_clean_csv(paths[0])
+        from_csv = df[(df["state"] == state) & (df["year"] == year)]
+        csv_time = time.perf_counter() - start
+        csv_bytes = os.path.getsize(paths[0])
+
+        start = time.perf_counter()
+        from_dataset = read_dataset(dataset_dir, manifest, states=[state], years=[year])
+        dataset_time = time.perf_counter() - start
+        dataset_bytes = sum(
+            os.path.getsize(join(dataset_dir, p["path"]))
+            for p in dataset_partitions(manifest, [state], [year])
+        )
+
+    print(f"Ingest: {ingest:.2f}s, refresh without changes: {refresh * 1000:.1f} ms")
+    print(f"{state}/{year} from CSV:     {len(from_csv)} rows in {csv_time:.3f}s, {csv_bytes / 1024:,.0f} KB read")
+    print(f"{state}/{year} from dataset: {len(from_dataset)} rows in {dataset_time:.3f}s, {dataset_bytes / 1024:,.0f} KB read")
+
+
+def bench_jobs(args):
+    """Time verify_data over several state files with 1 and `--jobs` worker processes."""
+    states = [f"S{i:02d}" for i in range(args.states)]
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.rows} synthetic rows over {len(states)} states...")
+        synthetic_data.generate(tmp, args.rows, states=states)
+        classification_path = join(tmp, "classification_results.csv")
+        clean_data_dir = join(tmp, "clean-data")
+        dataset_dir = dataset_dir_for(clean_data_dir)
+        manifest = update_dataset(clean_data_dir, dataset_dir)
+        load_classification(classification_path, states=[])
+        files = list(manifest["sources"])
+
+        start = time.perf_counter()
+        tasks = [(classification_path, dataset_dir, manifest, file, None, None, None, None) for file in files]
+        sequential = list(ordered_map(verify_data.verify_file_task, tasks, 1))
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tasks = [(classification_path, dataset_dir, manifest, file, None, None, None, 1) for file in files]
+        parallel = list(ordered_map(verify_data.verify_file_task, tasks, args.jobs))
+        parallel_time = time.perf_counter() - start
+
+    print(f"1 process:   {sequential_time:.2f}s")
+    print(f"{args.jobs} processes: {parallel_time:.2f}s ({sequential_time / parallel_time:.1f}x)")
+    print(f"Same reports in the same order: {sequential == parallel}")
+
+
+def bench_incremental(args):
+    """Time verify_data with cold, warm and partly invalidated statistics caches."""
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.rows} synthetic rows...")
+        synthetic_data.generate(tmp, args.rows, states=args.states.split(","))
+        classification_path = join(tmp, "classification_results.csv")
+        clean_data_dir = join(tmp, "clean-data")
+        dataset_dir = dataset_dir_for(clean_data_dir)
+        cache_path = join(tmp, ".cache", "verify_stats.sqlite")
+
+        def verify(cache_path):
+            load_classification(classification_path, states=[])
+            manifest = update_dataset(clean_data_dir, dataset_dir)
+            tasks = [
+                (classification_path, dataset_dir, manifest, file, None, None, cache_path, None)
+                for file in manifest["sources"]
+            ]
+            start = time.perf_counter()
+            reports = list(ordered_map(verify_data.verify_file_task, tasks, 1))
+            elapsed = time.perf_counter() - start
+            reused = sum(report["reused"] for report in reports)
+            partitions = sum(report["partitions"] for report in reports)
+            counters = [(report["csv"], report["classification"]) for report in reports]
+            return elapsed, f"{reused}/{partitions} partitions reused", counters
+
+        full = verify(None)
+        cold = verify(cache_path)
+        warm = verify(cache_path)
+
+        # re-scrape one year of the first state
+        path = join(clean_data_dir, sorted(os.listdir(clean_data_dir))[0])
+        df = pd.read_csv(path, dtype=str)
+        year_rows = df.index[df["year"] == str(args.year)]
+        df.loc[year_rows[:10], "link"] = None
+        df.to_csv(path, index=False)
+        full_changed = verify(None)
+        changed = verify(cache_path)
+
+    print(f"Without cache: {full[0]:.2f}s")
+    print(f"Cold cache:    {cold[0]:.2f}s ({cold[1]})")
+    print(f"Warm cache:    {warm[0]:.2f}s ({warm[1]})")
+    print(f"One year changed: {changed[0]:.2f}s ({changed[1]})")
+    print(
+        "Same counters as without cache: "
+        f"{full[2] == cold[2] == warm[2] and full_changed[2] == changed[2]}"
+    )
+
+
+def bench_release(args):
+    """Compare running verify, PDF check and upload one after another with the single-pass release."""
+    states = args.states.split(",")
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.rows} synthetic rows over {len(states)} states...")
+        synthetic_data.generate(tmp, args.rows, states=states)
+        classification_path = join(tmp, "classification_results.csv")
+        clean_data_dir = join(tmp, "clean-data")
+        dataset_dir = dataset_dir_for(clean_data_dir)
+        manifest = update_dataset(clean_data_dir, dataset_dir)
+        load_classification(classification_path, states=[])
+        files = list(manifest["sources"])
+        act_nums = read_dataset(dataset_dir, manifest, ["act_num"])["act_num"].dropna()
+        rng = random.Random(0)
+        blob_names = {f"{act_num}.pdf" for act_num in act_nums.unique() if rng.random() >= args.missing}
+        # the stages of the release run side by side
+        config_handler.set_global(disable=True)
+
+        with FakeBlobServer(blob_names, latency=args.latency) as server:
+            verify_uploaded_raw_pdfs.PDF_BASE_URL = server.url
+            verify_uploaded_raw_pdfs.CHECK_MODE = "head"
+
+            container = FakeContainer(latency=args.latency)
+            start = time.perf_counter()
+            reports, pdfs = [], []
+            for file in files:
+                reports.append(verify_data.verify_file(dataset_dir, manifest, file, classification_path))
+            for file in files:
+                df = read_dataset(dataset_dir, manifest, ["act_num"], sources=[file])
+                results = verify_uploaded_raw_pdfs.check_file(
+                    file, file.split("_")[0], df, None, verify_uploaded_raw_pdfs.new_controller(), join(tmp, "sequential")
+                )
+                pdfs.append((results.pdf_exists_count, results.pdf_missing_count, results.pdf_error_count))
+            for file in files:
+                index = ClassificationIndex.from_csv(classification_path, states=[file.split("_")[0]])
+                chunks = iter_dataset(dataset_dir, manifest, 50_000, upload_data.COLUMNS, sources=[file])
+                operations = upload_data.build_operations(chunks, index, release.KEYS_TO_UPLOAD)
+                upload_stream(container, assemble_batches(operations), controller=AdaptiveConcurrency(8, 32))
+            sequential_time = time.perf_counter() - start
+            sequential_items = container.items
+
+            container = FakeContainer(latency=args.latency)
+            start = time.perf_counter()
+            results = release.release(
+                dataset_dir,
+                manifest,
+                files,
+                classification_path,
+                container=container,
+                upload_controller=AdaptiveConcurrency(8, 32),
+                output_dir=join(tmp, "release"),
+                lookahead=args.lookahead,
+            )
+            release_time = time.perf_counter() - start
+
+    same_reports = [(r["csv"], r["classification"]) for r in reports] == [
+        (results[file]["verify"]["csv"], results[file]["verify"]["classification"]) for file in files
+    ]
+    same_pdfs = pdfs == [
+        (r.pdf_exists_count, r.pdf_missing_count, r.pdf_error_count)
+        for r in (results[file]["pdfs"] for file in files)
+    ]
+    print(f"One script after another: {sequential_time:.2f}s")
+    print(f"Single-pass release:      {release_time:.2f}s ({sequential_time / release_time:.1f}x)")
+    print(f"Same verify counters: {same_reports}, same PDF outcomes: {same_pdfs}, "
+          f"same items: {sequential_items == container.items}")
+
+
+def bench_key_index(args):
+    """Time the global key index with the exact on-disk table and with a Bloom filter."""
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.rows} synthetic rows...")
+        synthetic_data.generate(tmp, args.rows, states=args.states.split(","))
+        classification_path = join(tmp, "classification_results.csv")
+        clean_data_dir = join(tmp, "clean-data")
+        load_classification(classification_path, states=[])
+        dataset_dir = dataset_dir_for(clean_data_dir)
+        manifest = update_dataset(clean_data_dir, dataset_dir)
+
+        reports = {}
+        for name, bloom_bits in (("exact", None), ("bloom", int(args.bloom_mb * 8 * 1024 * 1024))):
+            report = key_index.find_key_issues(
+                dataset_dir, manifest, classification_path, chunk_rows=args.chunk_rows, bloom_bits=bloom_bits
+            )
+            # a second run for memory, as tracing slows the first one down
+            tracemalloc.start()
+            key_index.find_key_issues(
+                dataset_dir, manifest, classification_path, chunk_rows=args.chunk_rows, bloom_bits=bloom_bits
+            )
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            reports[name] = report
+            print(
+                f"{name}: {report['keys']} keys in {report['first_pass'] + report['second_pass']:.2f}s "
+                f"({report['candidates']} hashes re-read), peak {peak / 1e6:,.1f} MB, {report['counts']}"
+            )
+        verify_duplicates = sum(
+            verify_data.verify_file(dataset_dir, manifest, file, classification_path)["csv"]["duplicate_act_num"]
+            for file in manifest["sources"]
+        )
+    issues = reports["exact"]["issues"]
+    stored = issues.loc["stored"] if "stored" in issues.index.get_level_values("key") else issues.iloc[:0]
+    print(f"Same issues: {reports['exact']['issues'].equals(reports['bloom']['issues'])}")
+    print(f"Duplicate act_num rows: {int(stored.loc[stored['duplicate'], 'rows'].sum())} in the key index, "
+          f"{verify_duplicates} in verify_data")
+
+
+def bench_search_keys(args):
+    """Compare per-row key lists with the interned SearchKeyStore."""
+    rng = random.Random(0)
+    pool = [synthetic_data.make_search_keys(rng, args.search_keys_size) for _ in range(4096)]
+    values = [pool[i % len(pool)] for i in range(args.rows)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    per_row = [list(parse_search_keys(value).keys()) for value in values]
+    per_row_time = time.perf_counter() - start
+    per_row_peak = tracemalloc.get_traced_memory()[1]
+    del per_row
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = SearchKeyStore.build(values, workers=args.workers)
+    store_time = time.perf_counter() - start
+    store_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f"Per-row lists:   {per_row_time:.2f}s, peak {per_row_peak / 1e6:,.1f} MB")
+    print(f"SearchKeyStore:  {store_time:.2f}s, peak {store_peak / 1e6:,.1f} MB, "
+          f"resident {store.nbytes() / 1e6:,.1f} MB, {len(store.tokens)} distinct tokens")
+
+
+def synthetic_item_batches(rows, partitions, search_keys_size=20):
+    """Build upload_data-style operations keyed by "state/year"."""
+    rng = random.Random(0)
+    pool = [list(parse_search_keys(synthetic_data.make_search_keys(rng, search_keys_size))) for _ in range(256)]
+    item_batches = {}
+    for i in range(rows):
+        year = 2000 + i % partitions
+        item = {
+            "id": f"MN{year}HF{i}",
+            "act_num": f"MN{year}HF{i}",
+            "year": year,
+            "state": "MN",
+            "name": f"Act HF{i}",
+            "link": f"https://example.org/MN/{year}/HF{i}",
+            "search_keys": pool[i % len(pool)],
+        }
+        item_batches.setdefault(f"MN/{year}", []).append(("create", (item,), {}))
+    return item_batches
+
+
+def bench_upload(args):
+    """Compare sequential and concurrent uploads against a fake container."""
+    item_batches = synthetic_item_batches(args.rows, args.partitions)
+    for max_in_flight in sorted({1, args.max_in_flight}):
+        container = FakeContainer(latency=args.latency, throttle_rate=args.throttle_rate)
+        stats = upload_batches(container, item_batches, max_in_flight=max_in_flight)
+        assert len(container.items) == args.rows
+        print(f"max_in_flight={max_in_flight}: {stats.summary()}")
+
+
+def bench_sync(args):
+    """Compare a full re-upload with a delta sync after a small share of rows changed."""
+    item_batches = synthetic_item_batches(args.rows, args.partitions)
+    for operations in item_batches.values():
+        for _, (item,), _ in operations:
+            item["content_hash"] = content_hash(item)
+
+    def changed_operations():
+        rng = random.Random(1)
+        for batch_key, operations in item_batches.items():
+            for _, (item,), kwargs in operations:
+                if rng.random() < args.changed:
+                    item = dict(item, name=item["name"] + " (amended)")
+                    item["content_hash"] = content_hash(item)
+                yield batch_key, ("upsert", (item,), kwargs)
+
+    for mode in ("upload", "sync"):
+        container = FakeContainer(latency=args.latency)
+        upload_batches(container, item_batches, max_in_flight=8)
+        container.request_charge = 0.0
+        start = time.perf_counter()
+        operations = changed_operations()
+        if mode == "sync":
+            plan = plan_sync(container, operations)
+            operations = sync_operations(changed_operations(), plan)
+            print(f"Sync plan: {plan.summary()}")
+        stats = upload_stream(container, assemble_batches(operations), max_in_flight=8)
+        elapsed = time.perf_counter() - start
+        print(f"{mode}: {stats.items} writes, {container.request_charge:,.0f} RU including reads, {elapsed:.2f}s")
+
+
+def bench_local_store(args):
+    """Load, query, sync and delete against the SQLite mirror, checked against the in-memory container."""
+    item_batches = synthetic_item_batches(args.rows, args.partitions)
+    for operations in item_batches.values():
+        for _, (item,), _ in operations:
+            if random.Random(item["id"]).random() < args.newlines:
+                item["act_num"] += "\n"
+            item["content_hash"] = content_hash(item)
+    batch_keys = list(item_batches)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outcomes = {}
+        for name, container in (("memory", FakeContainer()), ("sqlite", SqliteContainer(join(tmp, "leginfo_clean.sqlite")))):
+            timings = {}
+            start = time.perf_counter()
+            upload_batches(container, item_batches, max_in_flight=8)
+            timings["load"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            operations = (
+                (batch_key, ("upsert", (item,), {}))
+                for batch_key, batch in item_batches.items()
+                for _, (item,), _ in batch
+            )
+            plan = plan_sync(container, operations)
+            timings["sync plan"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            act_num = f"MN{2000 + args.partitions // 2}HF{args.partitions // 2}"
+            for _ in range(args.lookups):
+                found = list(container.query_items(
+                    "SELECT c.id FROM c WHERE c.act_num = @act_num",
+                    parameters=[{"name": "@act_num", "value": act_num}],
+                    enable_cross_partition_query=True,
+                ))
+            timings[f"{args.lookups} act_num lookups"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            action = DeleteAction(container)
+            scan = run_scan(container, batch_keys, action, where="CONTAINS(c.act_num, '\n')", fields=["id"])
+            timings["newline cleanup"] = time.perf_counter() - start
+
+            remaining = run_scan(container, batch_keys, CountAction(), fields=["id"])["items_matched"]
+            outcomes[name] = (plan.summary(), len(found), scan["items_matched"], remaining)
+            print(f"{name}: " + ", ".join(f"{label} {seconds:.2f}s" for label, seconds in timings.items())
+                  + f"; {args.rows / timings['load']:,.0f} items/second loaded, "
+                  f"{scan['items_matched']} deleted, {remaining} left")
+    print(f"Same results: {outcomes['memory'] == outcomes['sqlite']}")
+
+
+def bench_pdf_check(args):
+    """Compare the thread-pool, asyncio and listing PDF checkers against a local blob server."""
+    rng = random.Random(0)
+    act_nums = [f"MN{2000 + i % 24}HF{i}" for i in range(args.urls)]
+    blob_names = {f"{act_num}.pdf" for act_num in act_nums if rng.random() >= args.missing}
+
+    outcomes = {}
+    with FakeBlobServer(blob_names, latency=args.latency) as server:
+        verify_uploaded_raw_pdfs.PDF_BASE_URL = server.url
+        for name in ("threads", "async", "list"):
+            requests_before = server.requests
+            start = time.perf_counter()
+            if name == "threads":
+                results = verify_uploaded_raw_pdfs.process_act_nums_batch(act_nums, max_workers=args.threads)
+            elif name == "async":
+                controller = AdaptiveConcurrency(initial=64, maximum=args.max_in_flight)
+                results = verify_uploaded_raw_pdfs.process_act_nums_async(act_nums, controller)
+            else:
+                results = verify_uploaded_raw_pdfs.process_act_nums_listing(act_nums, "MN")
+            elapsed = time.perf_counter() - start
+            outcomes[name] = {item["act_num"] for item in results.outcomes("missing")}
+            print(
+                f"{name}: {len(act_nums) / elapsed:,.0f} URLs/second, {server.requests - requests_before} requests, "
+                f"{results.pdf_exists_count} found, {results.pdf_missing_count} missing, "
+                f"{results.pdf_error_count} errors"
+            )
+            results.close()
+    assert outcomes["threads"] == outcomes["async"] == outcomes["list"], "checkers disagree on missing act_nums"
+
+
+def bench_adaptive(args):
+    """Compare fixed and adaptive concurrency against services with limited capacity."""
+    act_nums = [f"MN{2000 + i % 24}HF{i}" for i in range(args.urls)]
+    with FakeBlobServer({f"{act_num}.pdf" for act_num in act_nums}, latency=args.latency,
+                        max_concurrent=args.blob_capacity) as server:
+        for name in ("fixed", "adaptive"):
+            results = []
+            controller = None
+            if name == "adaptive":
+                controller = AdaptiveConcurrency(initial=16, maximum=512, max_retries=6)
+            busy_before = server.busy
+            start = time.perf_counter()
+            check_pdf_urls(act_nums, server.url, results.append, max_in_flight=args.fixed, controller=controller)
+            elapsed = time.perf_counter() - start
+            errors = sum(1 for _, exists, _, _ in results if not exists)
+            print(
+                f"PDF check {name}: {len(act_nums) / elapsed:,.0f} URLs/second, {errors} errors, "
+                f"{server.busy - busy_before} requests answered 503"
+            )
+            if controller is not None:
+                print(f"  {controller.summary()}")
+
+    item_batches = synthetic_item_batches(args.rows, 24)
+    for name in ("fixed", "adaptive"):
+        container = FakeContainer(latency=args.latency, max_concurrent=args.cosmos_capacity, retry_after_ms=10)
+        controller = None
+        if name == "adaptive":
+            controller = AdaptiveConcurrency(initial=4, maximum=64)
+        try:
+            stats = upload_batches(container, item_batches, max_in_flight=args.fixed, controller=controller)
+            print(f"Upload {name}: {stats.summary()}")
+        except CosmosHttpResponseError as e:
+            print(
+                f"Upload {name}: failed with {e.status_code} after retries, "
+                f"{len(container.items)}/{args.rows} items written, {container.throttled} requests throttled"
+            )
+        if controller is not None:
+            print(f"  {controller.summary()}")
+
+
+def bench_suite(args):
+    """Run verify, PDF check, upload and delete, record them and compare with the last run of the same parameters."""
+    params = {
+        "states": args.states.split(","),
+        "years": synthetic_data.parse_years(args.years),
+        "acts": args.acts,
+        "search_keys_size": args.search_keys_size,
+        "latency": args.latency,
+        "throttle_rate": args.throttle_rate,
+        "missing": args.missing,
+        "newlines": args.newlines,
+        "backend": args.backend,
+        "pdf_mode": args.pdf_mode,
+        "max_in_flight": args.max_in_flight,
+        "stages": args.stages.split(","),
+    }
+    history = benchmark_suite.load_history(args.history)
+    if args.show_history:
+        benchmark_suite.print_history(history, None if args.all else params, args.last)
+        return
+
+    results = benchmark_suite.run_suite(**params, repeat=args.repeat, quiet=not args.verbose)
+    benchmark_suite.print_results(results)
+    previous = [run for run in history if run["params"] == params]
+    if not args.no_record:
+        benchmark_suite.record_run(args.history, params, results)
+        print(f"Recorded in {args.history}")
+    if not previous:
+        print("No earlier run with these parameters to compare with")
+        return
+    regressions = benchmark_suite.compare(previous[-1]["stages"], results, args.tolerance)
+    print(f"Compared with {previous[-1]['time']} ({previous[-1]['commit'] or 'unknown commit'}):")
+    for stage, description in regressions:
+        print(f"  Regression in {stage}: {description}")
+    if not regressions:
+        print(f"  No stage slower or bigger by more than {args.tolerance:.0%}")
+    elif args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks on synthetic data")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    verify = subparsers.add_parser("verify", help="verify_data.py counters")
+    verify.add_argument("--rows", type=int, default=1_000_000)
+    verify.add_argument("--baseline-rows", type=int, default=10_000)
+    verify.set_defaults(func=bench_verify)
+
+    load = subparsers.add_parser("load", help="clean-data CSV loading")
+    load.add_argument("--rows", type=int, default=1_000_000)
+    load.set_defaults(func=bench_load)
+
+    dataset = subparsers.add_parser("dataset", help="Partitioned Parquet dataset vs CSV")
+    dataset.add_argument("--rows", type=int, default=1_000_000)
+    dataset.add_argument("--states", default="MN,GA", help="Comma-separated state codes")
+    dataset.add_argument("--year", type=int, default=2005, help="Year to read back")
+    dataset.set_defaults(func=bench_dataset)
+
+    jobs = subparsers.add_parser("jobs", help="verify_data with a process pool")
+    jobs.add_argument("--rows", type=int, default=2_000_000)
+    jobs.add_argument("--states", type=int, default=8)
+    jobs.add_argument("--jobs", type=int, default=os.cpu_count())
+    jobs.set_defaults(func=bench_jobs)
+
+    incremental = subparsers.add_parser("incremental", help="verify_data with the statistics cache")
+    incremental.add_argument("--rows", type=int, default=1_000_000)
+    incremental.add_argument("--states", default="MN,GA", help="Comma-separated state codes")
+    incremental.add_argument("--year", type=int, default=2005, help="Year whose rows are changed")
+    incremental.set_defaults(func=bench_incremental)
+
+    release_parser = subparsers.add_parser("release", help="Single-pass release vs the scripts one after another")
+    release_parser.add_argument("--rows", type=int, default=300_000)
+    release_parser.add_argument("--states", default="MN,GA,IA,KS", help="Comma-separated state codes")
+    release_parser.add_argument("--missing", type=float, default=0.05, help="Fraction of PDFs that do not exist")
+    release_parser.add_argument("--latency", type=float, default=0.02, help="Seconds per request")
+    release_parser.add_argument("--lookahead", type=int, default=1, help="Files read ahead of the running stages")
+    release_parser.set_defaults(func=bench_release)
+
+    keys_index = subparsers.add_parser("key-index", help="Global duplicate and collision index")
+    keys_index.add_argument("--rows", type=int, default=1_000_000)
+    keys_index.add_argument("--states", default="MN,GA", help="Comma-separated state codes")
+    keys_index.add_argument("--chunk-rows", type=int, default=200_000)
+    keys_index.add_argument("--bloom-mb", type=float, default=8, help="Bloom filter size")
+    keys_index.set_defaults(func=bench_key_index)
+
+    keys = subparsers.add_parser("search-keys", help="search_keys parsing and memory")
+    keys.add_argument("--rows", type=int, default=1_000_000)
+    keys.add_argument("--search-keys-size", type=int, default=20)
+    keys.add_argument("--workers", type=int, default=None)
+    keys.set_defaults(func=bench_search_keys)
+
+    upload = subparsers.add_parser("upload", help="Cosmos uploads against a fake container")
+    upload.add_argument("--rows", type=int, default=20_000)
+    upload.add_argument("--partitions", type=int, default=24)
+    upload.add_argument("--max-in-flight", type=int, default=8)
+    upload.add_argument("--latency", type=float, default=0.02, help="Seconds per request")
+    upload.add_argument("--throttle-rate", type=float, default=0.05, help="Fraction of requests answered with 429")
+    upload.set_defaults(func=bench_upload)
+
+    sync = subparsers.add_parser("sync", help="Delta sync against a fake container")
+    sync.add_argument("--rows", type=int, default=20_000)
+    sync.add_argument("--partitions", type=int, default=24)
+    sync.add_argument("--changed", type=float, default=0.03, help="Fraction of rows that changed")
+    sync.add_argument("--latency", type=float, default=0.02, help="Seconds per request")
+    sync.set_defaults(func=bench_sync)
+
+    local_store = subparsers.add_parser("local-store", help="SQLite mirror of the container")
+    local_store.add_argument("--rows", type=int, default=100_000)
+    local_store.add_argument("--partitions", type=int, default=24)
+    local_store.add_argument("--lookups", type=int, default=20, help="Cross-partition act_num queries")
+    local_store.add_argument("--newlines", type=float, default=0.01, help="Fraction of act_nums with a newline")
+    local_store.set_defaults(func=bench_local_store)
+
+    pdf_check = subparsers.add_parser("pdf-check", help="PDF HEAD checks against a local blob server")
+    pdf_check.add_argument("--urls", type=int, default=5_000)
+    pdf_check.add_argument("--missing", type=float, default=0.05, help="Fraction of PDFs that do not exist")
+    pdf_check.add_argument("--threads", type=int, default=30)
+    pdf_check.add_argument("--max-in-flight", type=int, default=256)
+    pdf_check.add_argument("--latency", type=float, default=0.02, help="Seconds per request")
+    pdf_check.set_defaults(func=bench_pdf_check)
+
+    adaptive = subparsers.add_parser("adaptive", help="Fixed vs adaptive concurrency under throttling")
+    adaptive.add_argument("--urls", type=int, default=5_000)
+    adaptive.add_argument("--rows", type=int, default=20_000)
+    adaptive.add_argument("--fixed", type=int, default=30, help="Concurrency of the fixed runs")
+    adaptive.add_argument("--blob-capacity", type=int, default=20, help="Concurrent requests the blob server serves")
+    adaptive.add_argument("--cosmos-capacity", type=int, default=6, help="Concurrent batches the container serves")
+    adaptive.add_argument("--latency", type=float, default=0.02, help="Seconds per request")
+    adaptive.set_defaults(func=bench_adaptive)
+
+    suite = subparsers.add_parser("suite", help="Verify, PDF check, upload and delete, recorded over time")
+    suite.add_argument("--states", default="MN,GA", help="Comma-separated state codes")
+    suite.add_argument("--years", default="2000-2023", help="Year range or comma-separated years")
+    suite.add_argument("--acts", type=int, default=1000, help="Acts per state and year")
+    suite.add_argument("--search-keys-size", type=int, default=20)
+    suite.add_argument("--latency", type=float, default=0.01, help="Seconds per request")
+    suite.add_argument("--throttle-rate", type=float, default=0.01, help="Fraction of container requests answered with 429")
+    suite.add_argument("--missing", type=float, default=0.05, help="Fraction of PDFs that do not exist")
+    suite.add_argument("--newlines", type=float, default=0.01, help="Fraction of items with a newline to delete")
+    suite.add_argument("--backend", choices=["memory", "local"], default="memory",
+                       help="In-memory container with latency and throttling, or the SQLite mirror")
+    suite.add_argument("--pdf-mode", choices=["head", "list"], default="head")
+    suite.add_argument("--max-in-flight", type=int, default=8)
+    suite.add_argument("--stages", default=",".join(benchmark_suite.STAGES), help="Comma-separated stages to run")
+    suite.add_argument("--repeat", type=int, default=1, help="Runs of each stage; the median is kept")
+    suite.add_argument("--history", default=join(dirname(__file__), "benchmark_output", "suite_history.jsonl"))
+    suite.add_argument("--tolerance", type=float, default=0.2, help="Relative change reported as a regression")
+    suite.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    suite.add_argument("--no-record", action="store_true", help="Do not append this run to the history")
+    suite.add_argument("--show-history", action="store_true", help="Print the recorded runs and exit")
+    suite.add_argument("--all", action="store_true", help="With --show-history, runs of any parameters")
+    suite.add_argument("--last", type=int, default=10, help="With --show-history, runs shown")
+    suite.add_argument("--verbose", action="store_true", help="Show what the scripts print")
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
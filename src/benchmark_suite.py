@@ -0,0 +1,427 @@
+import contextlib
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from os.path import dirname, join
+from threading import Event, Thread
+from alive_progress import config_handler
+import synthetic_data
+import upload_data
+import verify_data
+import verify_uploaded_raw_pdfs
+from classification import ClassificationIndex, load_classification
+from clean_dataset import dataset_dir_for, iter_dataset, read_dataset, update_dataset
+from cosmos_uploader import assemble_batches, item_id, upload_batches, upload_stream
+from local_services import FakeBlobServer, FakeContainer
+from partition_scan import CountAction, DeleteAction, local_partitions, run_scan
+from rate_control import AdaptiveConcurrency
+from release import KEYS_TO_UPLOAD
+from storage import SqliteContainer
+
+STAGES = ["verify", "pdfs", "upload", "delete"]
+
+# what the throughput of each stage counts
+UNITS = {"verify": "rows", "pdfs": "act_nums", "upload": "items", "delete": "items"}
+
+# a stage is reported as a regression when its throughput drops, or its
+# peak memory grows, by more than the tolerance and the memory noise floor
+MEMORY_NOISE_MB = 16
+
+# memory samples kept per stage in the history file
+TIMELINE_POINTS = 50
+
+
+class ResourceMonitor:
+    """
+    Samples the resident memory of the process on a background thread.
+
+    Resident memory covers pandas, Arrow and SQLite buffers alike, unlike
+    tracemalloc, and sampling does not slow the code being measured. On
+    systems without /proc only the peak since process start is available.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.samples = []
+        self._stop = Event()
+        self._thread = None
+        self._start = None
+
+    @staticmethod
+    def rss():
+        """Resident memory of the process in bytes."""
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # kilobytes on Linux, bytes on macOS
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def _sample(self):
+        self.samples.append((time.perf_counter() - self._start, self.rss()))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._sample()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def peak(self):
+        return max(rss for _, rss in self.samples)
+
+    @property
+    def growth(self):
+        """Peak resident memory above the memory at start, in bytes."""
+        return self.peak - self.samples[0][1]
+
+    def timeline(self, points=TIMELINE_POINTS):
+        """(seconds, MB) samples thinned to at most `points`, always keeping the peak."""
+        step = max(1, len(self.samples) // points)
+        kept = set(range(0, len(self.samples), step))
+        kept.add(max(range(len(self.samples)), key=lambda i: self.samples[i][1]))
+        kept.add(len(self.samples) - 1)
+        return [[round(self.samples[i][0], 3), round(self.samples[i][1] / 1e6, 1)] for i in sorted(kept)]
+
+
+def measure(function, quiet=True):
+    """
+    Run one stage under a ResourceMonitor.
+
+    Args:
+        function (callable): Runs the stage and returns the number of units processed
+        quiet (bool): Discard what the stage prints
+
+    Returns:
+        dict: seconds, items, items_per_second, peak_mb, growth_mb and the memory timeline
+    """
+    output = open(os.devnull, "w") if quiet else None
+    try:
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            with ResourceMonitor() as monitor:
+                start = time.perf_counter()
+                items = function()
+                seconds = time.perf_counter() - start
+    finally:
+        if output is not None:
+            output.close()
+    return {
+        "seconds": round(seconds, 3),
+        "items": items,
+        "items_per_second": round(items / seconds, 1) if seconds else 0.0,
+        "peak_mb": round(monitor.peak / 1e6, 1),
+        "growth_mb": round(monitor.growth / 1e6, 1),
+        "memory": monitor.timeline(),
+    }
+
+
+def newline_copies(dataset_dir, manifest, rate, seed=0):
+    """
+    Build items whose act_num ends in a newline, like the ones delete.py removes.
+
+    Args:
+        dataset_dir (str): Clean-data Parquet dataset directory
+        manifest (dict): Dataset manifest
+        rate (float): Fraction of rows copied
+        seed (int): Random seed
+
+    Returns:
+        dict: "state/year" batch key to upsert operations
+    """
+    rng = random.Random(seed)
+    df = read_dataset(dataset_dir, manifest, ["act_num", "state", "year"]).dropna()
+    item_batches = {}
+    for act_num, state, year in df.itertuples(index=False):
+        if not year.isnumeric() or rng.random() >= rate:
+            continue
+        act_num = act_num + "\n"
+        item = {"id": item_id(state, year, act_num), "act_num": act_num, "state": state, "year": int(year)}
+        item_batches.setdefault(f"{state}/{int(year)}", []).append(("upsert", (item,), {}))
+    return item_batches
+
+
+def new_container(backend, workdir, latency, throttle_rate):
+    if backend == "local":
+        path = join(workdir, "leginfo_clean.sqlite")
+        if os.path.exists(path):
+            os.remove(path)
+        return SqliteContainer(path)
+    return FakeContainer(latency=latency, throttle_rate=throttle_rate)
+
+
+def run_suite(
+    states=("MN", "GA"),
+    years=range(2000, 2024),
+    acts=1000,
+    search_keys_size=20,
+    anomaly_rate=0.01,
+    latency=0.01,
+    throttle_rate=0.01,
+    missing=0.05,
+    newlines=0.01,
+    backend="memory",
+    pdf_mode="head",
+    max_in_flight=8,
+    chunk_rows=50_000,
+    repeat=1,
+    stages=STAGES,
+    quiet=True,
+):
+    """
+    Run verify, PDF check, upload and delete on one synthetic dataset.
+
+    The dataset is generated with a fixed seed and ingested once. Each
+    repeat then runs the stages in order against a new blob server
+    stand-in and container: verify_data.verify_file on every file, the
+    PDF check of every file, the upload of every file as upload_data.py
+    does it, and the delete.py newline cleanup after a fraction of
+    `newlines` items with a newline in their act_num were added. The
+    median time and the highest peak memory of the repeats are kept.
+
+    Args:
+        states (iterable): State codes, one CSV each
+        years (iterable): Years of every state
+        acts (int): Acts per state and year
+        search_keys_size (int): Tokens per search_keys value
+        anomaly_rate (float): Fraction of rows with an injected verify issue
+        latency (float): Seconds per blob or container request
+        throttle_rate (float): Fraction of container requests answered with 429
+        missing (float): Fraction of PDFs that do not exist
+        newlines (float): Fraction of items copied with a newline for the delete stage
+        backend (str): "memory" for the in-memory container, "local" for the SQLite mirror
+        pdf_mode (str): verify_uploaded_raw_pdfs.CHECK_MODE, "head" or "list"
+        max_in_flight (int): Initial batches in flight for upload and delete
+        chunk_rows (int): Rows turned into payloads at a time
+        repeat (int): Times the stages run
+        stages (iterable): Stages to run, in the order of STAGES
+        quiet (bool): Discard what the scripts print
+
+    Returns:
+        dict: Per stage, the measure() result of the median repeat
+    """
+    states = list(states)
+    years = list(years)
+    runs = {stage: [] for stage in STAGES if stage in stages}
+    # the stages of a file run one after another here, the bars only add noise
+    config_handler.set_global(disable=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = len(states) * len(years) * acts
+        print(f"Generating {rows} synthetic rows ({len(states)} states x {len(years)} years x {acts} acts)...")
+        synthetic_data.generate(
+            tmp, rows, states=states, years=years, search_keys_size=search_keys_size, anomaly_rate=anomaly_rate
+        )
+        classification_path = join(tmp, "classification_results.csv")
+        clean_data_dir = join(tmp, "clean-data")
+        dataset_dir = dataset_dir_for(clean_data_dir)
+        manifest = update_dataset(clean_data_dir, dataset_dir)
+        load_classification(classification_path, states=[])
+        files = list(manifest["sources"])
+        batch_keys = local_partitions(clean_data_dir)
+        act_nums = read_dataset(dataset_dir, manifest, ["act_num"])["act_num"].dropna()
+        rng = random.Random(0)
+        blob_names = {f"{act_num}.pdf" for act_num in act_nums.unique() if rng.random() >= missing}
+        del act_nums
+        copies = newline_copies(dataset_dir, manifest, newlines)
+
+        def verify():
+            return sum(
+                verify_data.verify_file(dataset_dir, manifest, file, classification_path)["total_rows"]
+                for file in files
+            )
+
+        def pdfs(output_dir):
+            checked = 0
+            for file in files:
+                df = read_dataset(dataset_dir, manifest, ["act_num"], sources=[file])
+                results = verify_uploaded_raw_pdfs.check_file(
+                    file, file.split("_")[0], df, None, verify_uploaded_raw_pdfs.new_controller(), output_dir
+                )
+                if results is not None:
+                    checked += results.pdf_exists_count + results.pdf_missing_count + results.pdf_error_count
+            return checked
+
+        def upload(container):
+            uploaded = 0
+            controller = AdaptiveConcurrency(initial=max_in_flight, maximum=max_in_flight * 4)
+            for file in files:
+                index = ClassificationIndex.from_csv(classification_path, states=[file.split("_")[0]])
+                chunks = iter_dataset(dataset_dir, manifest, chunk_rows, upload_data.COLUMNS, sources=[file])
+                operations = upload_data.build_operations(chunks, index, KEYS_TO_UPLOAD)
+                uploaded += upload_stream(container, assemble_batches(operations), controller=controller).items
+            return uploaded
+
+        def delete(container):
+            action = DeleteAction(container, controller=AdaptiveConcurrency(initial=max_in_flight, maximum=max_in_flight * 4))
+            run_scan(container, batch_keys, action, where="CONTAINS(c.act_num, '\n')", fields=["id"],
+                     max_in_flight=max_in_flight)
+            action.close()
+            return action.total
+
+        with FakeBlobServer(blob_names, latency=latency) as server:
+            verify_uploaded_raw_pdfs.PDF_BASE_URL = server.url
+            verify_uploaded_raw_pdfs.CHECK_MODE = pdf_mode
+            for r in range(repeat):
+                print(f"Run {r + 1}/{repeat}...")
+                container = new_container(backend, tmp, latency, throttle_rate)
+                if "verify" in runs:
+                    runs["verify"].append(measure(verify, quiet))
+                if "pdfs" in runs:
+                    runs["pdfs"].append(measure(lambda: pdfs(join(tmp, f"pdfs_{r}")), quiet))
+                if "upload" in runs:
+                    runs["upload"].append(measure(lambda: upload(container), quiet))
+                if "delete" in runs:
+                    # the newline copies are part of the setup, not of the measured stage
+                    upload_batches(container, copies, max_in_flight=max_in_flight)
+                    before = run_scan(container, batch_keys, CountAction(), fields=["id"])["items_matched"]
+                    runs["delete"].append(measure(lambda: delete(container), quiet))
+                    after = run_scan(container, batch_keys, CountAction(), fields=["id"])["items_matched"]
+                    deleted = runs["delete"][-1]["items"]
+                    assert before - after == deleted == sum(map(len, copies.values())), (
+                        f"delete removed {before - after} items, expected {sum(map(len, copies.values()))}"
+                    )
+                if backend == "local":
+                    container.close()
+
+    results = {}
+    for stage, measurements in runs.items():
+        result = sorted(measurements, key=lambda m: m["seconds"])[len(measurements) // 2]
+        result = dict(result, peak_mb=max(m["peak_mb"] for m in measurements))
+        if len(measurements) > 1:
+            result["seconds_stdev"] = round(statistics.stdev(m["seconds"] for m in measurements), 3)
+        results[stage] = result
+    return results
+
+
+def git_commit():
+    """Short hash of the checked out commit, with "+" if the tree has changes, or None."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=dirname(__file__)
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True, text=True, check=True, cwd=dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+" if dirty else "")
+
+
+def load_history(path):
+    """Recorded suite runs, oldest first."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def record_run(path, params, results):
+    """
+    Append a suite run to the history file.
+
+    Args:
+        path (str): JSON Lines history file
+        params (dict): Suite parameters; runs are only compared with the same ones
+        results (dict): run_suite result
+
+    Returns:
+        dict: The recorded run
+    """
+    run = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "params": params,
+        "stages": results,
+    }
+    os.makedirs(dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    return run
+
+
+def compare(previous, current, tolerance=0.2):
+    """
+    Find the stages of `current` that got slower or bigger than in `previous`.
+
+    Args:
+        previous (dict): Stage results of an earlier run
+        current (dict): Stage results of this run
+        tolerance (float): Allowed relative drop in throughput or growth in peak memory
+
+    Returns:
+        list: (stage, description) of every regression
+    """
+    regressions = []
+    for stage, result in current.items():
+        before = previous.get(stage)
+        if not before:
+            continue
+        if before["items_per_second"] and result["items_per_second"] < before["items_per_second"] * (1 - tolerance):
+            regressions.append(
+                (stage, f"throughput {before['items_per_second']:,.0f} -> {result['items_per_second']:,.0f} "
+                        f"{UNITS[stage]}/second")
+            )
+        if (
+            result["peak_mb"] > before["peak_mb"] * (1 + tolerance)
+            and result["peak_mb"] - before["peak_mb"] > MEMORY_NOISE_MB
+        ):
+            regressions.append((stage, f"peak memory {before['peak_mb']:,.0f} -> {result['peak_mb']:,.0f} MB"))
+    return regressions
+
+
+def print_results(results):
+    for stage, result in results.items():
+        spread = f" ± {result['seconds_stdev']:.2f}s" if "seconds_stdev" in result else ""
+        print(
+            f"{stage:7} {result['seconds']:8.2f}s{spread}  {result['items_per_second']:>12,.0f} {UNITS[stage]}/second  "
+            f"peak {result['peak_mb']:,.0f} MB (+{result['growth_mb']:,.0f} MB during the stage)"
+        )
+
+
+def print_history(history, params=None, last=10):
+    """
+    Print throughput and peak memory per stage of the recorded runs.
+
+    Args:
+        history (list): load_history result
+        params (dict): Only show runs with these parameters, or None for all
+        last (int): Number of most recent runs to show
+    """
+    runs = [run for run in history if params is None or run["params"] == params][-last:]
+    if not runs:
+        print("No recorded runs")
+        return
+    stages = [stage for stage in STAGES if any(stage in run["stages"] for run in runs)]
+    print(f"{'time':25} {'commit':10} " + " ".join(f"{stage + ' /s':>12} {'MB':>6}" for stage in stages))
+    for run in runs:
+        cells = []
+        for stage in stages:
+            result = run["stages"].get(stage)
+            cells.append(f"{result['items_per_second']:>12,.0f} {result['peak_mb']:>6,.0f}" if result else f"{'-':>12} {'-':>6}")
+        print(f"{run['time']:25} {run['commit'] or '-':10} " + " ".join(cells))
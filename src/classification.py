@@ -0,0 +1,133 @@
+import pandas as pd
+from act_nums import sanitize
+from columnar_cache import read_cached_csv
+from search_keys import SearchKeyStore
+
+KEYS = ["state", "year", "act_num"]
+CLASSIFICATION_COLUMNS = ["act_num", "year", "state", "uni_bigrams_word_counts"]
+
+def load_classification(file_path, states=None, use_cache=True, years=None, search_keys=True):
+    """
+    Load classification_results.csv with only the columns the scripts use.
+
+    By default the file is read through a per-state columnar cache that is
+    rebuilt whenever the CSV changes, so only the requested states are read.
+    `states=[]` only brings the cache up to date: scripts do that once up
+    front, and then every file or worker process builds the index of just
+    its own states from the memory-mapped cache.
+
+    Args:
+        file_path (str): Path to classification_results.csv
+        states (iterable): State codes to keep, or None for all states
+        use_cache (bool): Read through the columnar cache instead of parsing the CSV
+        years (iterable): Years to keep (str or int), or None for all years
+        search_keys (bool): Also read the search keys, the largest column
+
+    Returns:
+        DataFrame: Columns act_num (sanitized, see act_nums.sanitize), year,
+        state and, if asked for, search_keys
+    """
+    columns = CLASSIFICATION_COLUMNS if search_keys else CLASSIFICATION_COLUMNS[:3]
+    if use_cache:
+        df_classification = read_cached_csv(
+            file_path,
+            columns,
+            states=states,
+            # the cache always holds every column, whichever ones are read
+            cache_columns=CLASSIFICATION_COLUMNS,
+            filters=None if years is None else {"year": years},
+        )
+    else:
+        df_classification = pd.read_csv(
+            file_path,
+            dtype={"year": str},
+            usecols=columns,
+        )
+        if states is not None:
+            df_classification = df_classification[df_classification["state"].isin(states)]
+        if years is not None:
+            df_classification = df_classification[
+                df_classification["year"].isin([str(year) for year in years])
+            ]
+    df_classification.rename(
+        columns={"uni_bigrams_word_counts": "search_keys"}, inplace=True
+    )
+    # joined on the same canonical keys the clean data is rewritten to
+    df_classification["act_num"] = sanitize(df_classification["act_num"])
+    return df_classification
+
+
+def summarize_classification(df_classification):
+    """
+    Collapse classification results to one record per (state, year, act_num).
+
+    The record keeps the first row's search keys. Duplicate rows are flagged
+    as conflicting when their search keys differ or any of them is missing,
+    the same way a row-by-row comparison against the first duplicate would.
+
+    Args:
+        df_classification (DataFrame): Classification results with act_num as
+            a column or as the index
+
+    Returns:
+        DataFrame: Sorted by (state, year, act_num) with search_keys and a
+        boolean conflicting column
+    """
+    flat = df_classification.reset_index()
+    flat = flat[flat[KEYS].notna().all(axis=1)]
+
+    counts = flat.groupby(KEYS, sort=False)["search_keys"].agg(
+        ["size", "count", "nunique"]
+    )
+    summary = flat.drop_duplicates(KEYS).set_index(KEYS)[["search_keys"]]
+    summary["conflicting"] = (counts["size"] > 1) & (
+        (counts["count"] < counts["size"]) | (counts["nunique"] > 1)
+    )
+    return summary.sort_index()
+
+
+class ClassificationIndex:
+    """
+    Classification results resolved to one record per (state, year, act_num).
+
+    Conflicting duplicates are detected once when the index is built, and the
+    search keys are parsed once into an interned SearchKeyStore whose rows
+    follow the frame. Keys are resolved to rows in bulk with `positions`.
+    """
+
+    def __init__(self, df_classification, workers=None):
+        summary = summarize_classification(df_classification)
+        self.search_keys = SearchKeyStore.build(summary["search_keys"], workers=workers)
+        self.frame = summary[["conflicting"]]
+
+    @classmethod
+    def from_csv(cls, file_path, states=None, use_cache=True, workers=None, years=None):
+        """
+        Build the index from classification_results.csv.
+
+        Args:
+            file_path (str): Path to classification_results.csv
+            states (iterable): State codes to keep, or None for all states
+            use_cache (bool): Read through the columnar cache
+            workers (int): Processes used to parse search keys
+            years (iterable): Years to keep (str or int), or None for all years
+
+        Returns:
+            ClassificationIndex: The built index
+        """
+        return cls(load_classification(file_path, states, use_cache, years), workers=workers)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def positions(self, keys):
+        """
+        Resolve many keys to row positions at once.
+
+        Args:
+            keys (MultiIndex): (state, year, act_num) keys
+
+        Returns:
+            ndarray: Row position per key, -1 where the key is missing
+        """
+        return self.frame.index.get_indexer(keys)
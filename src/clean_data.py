@@ -0,0 +1,150 @@
+import csv
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from columnar_cache import PANDAS_NA_VALUES
+
+# canonical column -> source header names, in order of preference
+COLUMN_ALIASES = {
+    "state": ["state", "State"],
+    "year": ["year", "Year"],
+    "act_num": ["act_num"],
+    "original_act_num": ["original_act_num", "bill_num"],
+    "link": ["link", "links", "Link to full text"],
+    "name": ["name", "Title"],
+}
+COLUMNS = list(COLUMN_ALIASES)
+
+# low-cardinality columns, kept as pandas categoricals
+CATEGORICAL_COLUMNS = ("state", "year")
+
+def resolve_columns(file_path, columns=None):
+    """
+    Map canonical column names to the header names used by one clean-data CSV.
+
+    Only the header line is read. When a file has several aliases of the
+    same column (e.g. both "links" and "Link to full text"), the first one
+    in COLUMN_ALIASES wins.
+
+    Args:
+        file_path (str): Path to the CSV
+        columns (list): Canonical columns wanted, defaults to COLUMNS
+
+    Returns:
+        dict: canonical name -> source header name, for the columns present,
+        in canonical order
+    """
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    present = set(header)
+    sources = {}
+    for column in columns or COLUMNS:
+        for alias in COLUMN_ALIASES[column]:
+            if alias in present:
+                sources[column] = alias
+                break
+    return sources
+
+
+def _options(sources):
+    return (
+        # act_num values have been seen with embedded newlines
+        pa_csv.ParseOptions(newlines_in_values=True),
+        pa_csv.ConvertOptions(
+            include_columns=list(sources.values()),
+            column_types={source: pa.string() for source in sources.values()},
+            null_values=PANDAS_NA_VALUES,
+            strings_can_be_null=True,
+        ),
+    )
+
+
+def _rename(table, sources):
+    return table.select(list(sources.values())).rename_columns(list(sources))
+
+
+def to_frame(table):
+    """
+    Convert a table with canonical column names into the normalized clean-data frame.
+
+    state and year become categoricals and the other columns hold str or None.
+
+    Args:
+        table (pyarrow.Table): Table with string columns
+
+    Returns:
+        DataFrame: Normalized frame
+    """
+    arrays = []
+    for name, array in zip(table.column_names, table.columns):
+        if name in CATEGORICAL_COLUMNS and not pa.types.is_dictionary(array.type):
+            array = array.dictionary_encode()
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, names=table.column_names).to_pandas()
+
+
+def read_clean_table(file_path, columns=None):
+    """
+    Read a clean-data CSV into an Arrow table with canonical column names.
+
+    Only the wanted columns are parsed, with pyarrow's multithreaded
+    reader. Missing values follow pandas.read_csv.
+
+    Args:
+        file_path (str): Path to the CSV
+        columns (list): Canonical columns to load, defaults to COLUMNS;
+            those the file does not have are left out
+
+    Returns:
+        pyarrow.Table: String columns in canonical order
+    """
+    sources = resolve_columns(file_path, columns)
+    if not sources:
+        return pa.table({})
+    parse_options, convert_options = _options(sources)
+    table = pa_csv.read_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(use_threads=True),
+        parse_options=parse_options,
+        convert_options=convert_options,
+    )
+    return _rename(table, sources)
+
+
+def load_clean_csv(file_path, columns=None):
+    """
+    Load a clean-data CSV as a normalized frame, see read_clean_table and to_frame.
+
+    Args:
+        file_path (str): Path to the CSV
+        columns (list): Canonical columns to load, defaults to COLUMNS
+
+    Returns:
+        DataFrame: Normalized frame
+    """
+    return to_frame(read_clean_table(file_path, columns))
+
+
+def rechunk(batches, chunk_rows):
+    """
+    Regroup record batches into tables of `chunk_rows` rows.
+
+    Args:
+        batches (iterable): pyarrow.RecordBatch values
+        chunk_rows (int): Rows per table; the last one may be shorter
+
+    Yields:
+        pyarrow.Table: Consecutive rows of the input
+    """
+    pending = []
+    pending_rows = 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunk_rows:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_rows)
+            rest = table.slice(chunk_rows)
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending)
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+from os import listdir
+from os.path import basename, dirname, exists, isfile, join
+from urllib.parse import quote
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from clean_data import COLUMNS, rechunk, read_clean_table, to_frame
+from columnar_cache import file_fingerprint, fingerprint_matches, read_manifest, write_manifest
+
+# the hive directory name pyarrow (and Spark/DuckDB) read back as null
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# bump when the layout or the manifest changes, so the dataset is rebuilt
+DATASET_VERSION = 2
+
+PARTITION_COLUMNS = ["state", "year"]
+DATA_COLUMNS = [column for column in COLUMNS if column not in PARTITION_COLUMNS]
+PARTITIONING = ds.partitioning(
+    pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]), flavor="hive"
+)
+SCHEMA = pa.schema([(column, pa.string()) for column in DATA_COLUMNS + PARTITION_COLUMNS])
+
+
+def dataset_dir_for(clean_data_dir):
+    """
+    Get the dataset directory for a clean-data directory, e.g. data/.cache/clean-data.
+
+    Args:
+        clean_data_dir (str): Directory with the clean-data CSVs
+
+    Returns:
+        str: Dataset directory path
+    """
+    clean_data_dir = clean_data_dir.rstrip("/")
+    return join(dirname(clean_data_dir), ".cache", basename(clean_data_dir))
+
+
+def partition_dir(state, year):
+    """Relative hive directory of one (state, year) partition, values URI-encoded."""
+    parts = []
+    for column, value in (("state", state), ("year", year)):
+        parts.append(f"{column}={NULL_PARTITION if value is None else quote(value, safe='')}")
+    return "/".join(parts)
+
+
+def _remove_source(dataset_dir, entry):
+    for partition in entry["partitions"]:
+        path = join(dataset_dir, partition["path"])
+        if exists(path):
+            os.remove(path)
+        # drop year= and state= directories left empty
+        for directory in (dirname(path), dirname(dirname(path))):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+
+
+def frame_digest(df):
+    """
+    Hash the column names and values of a frame, in row order.
+
+    Args:
+        df (DataFrame): Frame to hash
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    digest = hashlib.sha256(json.dumps([str(column) for column in df.columns]).encode())
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    digest.update(hashes.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def table_digest(table):
+    """Hash the column names and values of a pyarrow Table, see frame_digest."""
+    return frame_digest(table.to_pandas())
+
+
+def _write_source(file_path, dataset_dir):
+    """
+    Split one CSV into per-(state, year) Parquet files named after it.
+
+    Rows keep their CSV order within each partition, and partitions are
+    listed in order of first appearance.
+
+    Returns:
+        dict: Manifest entry with the fingerprint, columns and partitions
+    """
+    fingerprint = file_fingerprint(file_path)
+    table = read_clean_table(file_path)
+    file_name = basename(file_path).rsplit(".", 1)[0] + ".parquet"
+    columns = table.column_names
+    partitions = []
+    if "state" in columns and "year" in columns:
+        keys = pd.DataFrame(
+            {
+                "state": table["state"].to_pandas(),
+                "year": table["year"].to_pandas(),
+            }
+        )
+        data = table.drop_columns(PARTITION_COLUMNS)
+        groups = keys.groupby(["state", "year"], sort=False, dropna=False).indices
+        for (state, year), positions in groups.items():
+            state = None if pd.isna(state) else state
+            year = None if pd.isna(year) else year
+            path = join(partition_dir(state, year), file_name)
+            os.makedirs(join(dataset_dir, dirname(path)), exist_ok=True)
+            part = data.take(positions)
+            pq.write_table(part, join(dataset_dir, path))
+            partitions.append(
+                {
+                    "state": state,
+                    "year": year,
+                    "path": path,
+                    "rows": len(positions),
+                    # lets readers tell which partitions changed
+                    "digest": table_digest(part),
+                }
+            )
+    return {"source": fingerprint, "columns": columns, "partitions": partitions}
+
+
+def update_dataset(clean_data_dir, dataset_dir=None):
+    """
+    Bring the Parquet dataset of a clean-data directory up to date.
+
+    Each CSV is written as one file per (state, year) under
+    `state=<state>/year=<year>/`. Only CSVs whose size or content changed
+    since the last update are rewritten, and the files of CSVs that were
+    removed are deleted. CSVs without state and year columns are recorded
+    without partitions.
+
+    The scripts call this before reading any clean-data and then read the
+    Parquet copy, never the CSVs, so an unchanged CSV is not parsed again.
+
+    Args:
+        clean_data_dir (str): Directory with the clean-data CSVs
+        dataset_dir (str): Dataset directory, defaults to dataset_dir_for(clean_data_dir)
+
+    Returns:
+        dict: Manifest with one entry per CSV name under "sources"
+    """
+    dataset_dir = dataset_dir or dataset_dir_for(clean_data_dir)
+    os.makedirs(dataset_dir, exist_ok=True)
+    manifest = read_manifest(dataset_dir)
+    if manifest is None or manifest.get("version") != DATASET_VERSION:
+        for entry in (manifest or {}).get("sources", {}).values():
+            _remove_source(dataset_dir, entry)
+        manifest = {"version": DATASET_VERSION, "sources": {}}
+    sources = manifest["sources"]
+    files = sorted(
+        f for f in listdir(clean_data_dir) if isfile(join(clean_data_dir, f)) and f.endswith(".csv")
+    )
+
+    for file in set(sources) - set(files):
+        _remove_source(dataset_dir, sources.pop(file))
+    for file in files:
+        file_path = join(clean_data_dir, file)
+        entry = sources.get(file)
+        # refreshed mtimes are recorded with the manifest below
+        if entry is not None and fingerprint_matches(entry["source"], file_path):
+            continue
+        print(f"Updating Parquet dataset from {file}, this only happens when it changes...")
+        if entry is not None:
+            _remove_source(dataset_dir, entry)
+        sources[file] = _write_source(file_path, dataset_dir)
+        # a crash between files leaves a manifest that matches the disk
+        write_manifest(dataset_dir, manifest)
+    # also records removed CSVs and refreshed mtimes
+    write_manifest(dataset_dir, manifest)
+    return manifest
+
+
+def dataset_partitions(manifest, states=None, years=None, sources=None):
+    """
+    List the partition files matching a state/year filter from the manifest.
+
+    Args:
+        manifest (dict): Manifest returned by update_dataset
+        states (iterable): State codes to keep, or None for all; a None
+            entry selects the rows without a state
+        years (iterable): Years to keep (str or int), or None for all; a None
+            entry selects the rows without a year
+        sources (iterable): CSV names to keep, or None for all
+
+    Returns:
+        list: Partition entries (state, year, path, rows, digest), in source order
+    """
+    states = None if states is None else set(states)
+    years = None if years is None else {None if year is None else str(year) for year in years}
+    partitions = []
+    for file, entry in manifest["sources"].items():
+        if sources is not None and file not in sources:
+            continue
+        for partition in entry["partitions"]:
+            if states is not None and partition["state"] not in states:
+                continue
+            if years is not None and partition["year"] not in years:
+                continue
+            partitions.append(partition)
+    return partitions
+
+
+def _dataset(dataset_dir, manifest, states, years, sources, columns):
+    partitions = dataset_partitions(manifest, states, years, sources)
+    present = set()
+    for file, entry in manifest["sources"].items():
+        if sources is None or file in sources:
+            present.update(entry["columns"])
+    columns = [column for column in (columns or COLUMNS) if column in present]
+    dataset = ds.dataset(
+        [join(dataset_dir, partition["path"]) for partition in partitions],
+        schema=SCHEMA,
+        format="parquet",
+        partitioning=PARTITIONING,
+        partition_base_dir=dataset_dir,
+    )
+    return dataset, columns
+
+
+def read_dataset(dataset_dir, manifest, columns=None, states=None, years=None, sources=None):
+    """
+    Read clean-data rows from the Parquet dataset.
+
+    The filters are resolved against the manifest, so only the files of
+    the selected partitions are opened, and only the wanted columns are
+    decoded. Rows with a missing state or year are only returned without
+    a states/years filter.
+
+    Args:
+        dataset_dir (str): Dataset directory
+        manifest (dict): Manifest returned by update_dataset
+        columns (list): Canonical columns to load, defaults to COLUMNS;
+            columns none of the selected CSVs have are left out
+        states (iterable): State codes to read, or None for all
+        years (iterable): Years to read (str or int), or None for all
+        sources (iterable): CSV names to read, or None for all
+
+    Returns:
+        DataFrame: Normalized frame, see clean_data.to_frame
+    """
+    dataset, columns = _dataset(dataset_dir, manifest, states, years, sources, columns)
+    return to_frame(dataset.to_table(columns=columns))
+
+
+def iter_dataset(dataset_dir, manifest, chunk_rows, columns=None, states=None, years=None, sources=None):
+    """
+    Stream clean-data rows from the Parquet dataset in frames of `chunk_rows` rows.
+
+    Same selection as read_dataset.
+
+    Yields:
+        DataFrame: Normalized frame, see clean_data.to_frame
+    """
+    dataset, columns = _dataset(dataset_dir, manifest, states, years, sources, columns)
+    for table in rechunk(dataset.to_batches(columns=columns), chunk_rows):
+        yield to_frame(table)
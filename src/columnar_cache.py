@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+from os.path import basename, dirname, exists, join, splitext
+from urllib.parse import quote
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+
+# Strings pandas.read_csv treats as missing, so cached frames match a CSV parse
+PANDAS_NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null",
+]
+
+MANIFEST_NAME = "manifest.json"
+NULL_PARTITION = "_null"
+
+
+def cache_dir_for(file_path):
+    """
+    Get the cache directory for a source CSV, e.g. data/.cache/classification_results.
+
+    Args:
+        file_path (str): Source CSV path
+
+    Returns:
+        str: Cache directory path
+    """
+    return join(dirname(file_path), ".cache", splitext(basename(file_path))[0])
+
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(file_path, with_hash=True):
+    """
+    Fingerprint a file by size, modification time and optionally content hash.
+
+    Args:
+        file_path (str): File to fingerprint
+        with_hash (bool): Whether to hash the file contents
+
+    Returns:
+        dict: size, mtime_ns and sha256 (None when not hashed)
+    """
+    stat = os.stat(file_path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_hash(file_path) if with_hash else None,
+    }
+
+
+def read_manifest(cache_dir):
+    try:
+        with open(join(cache_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(cache_dir, manifest):
+    # write then rename so a crash never leaves a half-written manifest
+    tmp_path = join(cache_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, join(cache_dir, MANIFEST_NAME))
+
+
+def fingerprint_matches(source, file_path):
+    """
+    Check a recorded file fingerprint against the current file.
+
+    Size and mtime are compared first. If only the mtime moved, the content
+    hash decides, and a matching hash refreshes the recorded mtime in place.
+
+    Args:
+        source (dict): Fingerprint recorded by file_fingerprint
+        file_path (str): Current file
+
+    Returns:
+        bool: True if the file content is unchanged
+    """
+    current = file_fingerprint(file_path, with_hash=False)
+    if current["size"] != source["size"]:
+        return False
+    if current["mtime_ns"] == source["mtime_ns"]:
+        return True
+    if file_hash(file_path) != source["sha256"]:
+        return False
+    source["mtime_ns"] = current["mtime_ns"]
+    return True
+
+
+def is_fresh(manifest, file_path, cache_dir):
+    """
+    Check a cache manifest against the current source file, see fingerprint_matches.
+
+    A refreshed mtime is written back to the manifest.
+
+    Args:
+        manifest (dict): Manifest read from the cache, or None
+        file_path (str): Source CSV path
+        cache_dir (str): Cache directory
+
+    Returns:
+        bool: True if the cached partitions can be used
+    """
+    if manifest is None:
+        return False
+    mtime_ns = manifest["source"]["mtime_ns"]
+    if not fingerprint_matches(manifest["source"], file_path):
+        return False
+    if manifest["source"]["mtime_ns"] != mtime_ns:
+        write_manifest(cache_dir, manifest)
+    return True
+
+
+def partition_file(state):
+    if state is None:
+        return f"{NULL_PARTITION}.arrow"
+    return f"state={quote(state, safe='')}.arrow"
+
+
+def build_cache(file_path, cache_dir, columns):
+    """
+    Convert a CSV into one uncompressed Arrow IPC file per state.
+
+    Args:
+        file_path (str): Source CSV path
+        cache_dir (str): Cache directory
+        columns (list): Columns to keep, all read as strings
+
+    Returns:
+        dict: The written manifest
+    """
+    print(f"Building columnar cache of {basename(file_path)}, this only happens when it changes...")
+    os.makedirs(cache_dir, exist_ok=True)
+    if exists(join(cache_dir, MANIFEST_NAME)):
+        os.remove(join(cache_dir, MANIFEST_NAME))
+    for name in os.listdir(cache_dir):
+        if name.endswith(".arrow"):
+            os.remove(join(cache_dir, name))
+
+    fingerprint = file_fingerprint(file_path)
+    table = pa_csv.read_csv(
+        file_path,
+        # act_num values have been seen with embedded newlines
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=columns,
+            column_types={column: pa.string() for column in columns},
+            null_values=PANDAS_NA_VALUES,
+            strings_can_be_null=True,
+        ),
+    )
+
+    partitions = {}
+    for state in table["state"].unique().to_pylist():
+        if state is None:
+            part = table.filter(pc.is_null(table["state"]))
+        else:
+            part = table.filter(pc.equal(table["state"], state))
+        name = partition_file(state)
+        with pa.OSFile(join(cache_dir, name), "wb") as sink:
+            with pa.ipc.new_file(sink, part.schema) as writer:
+                writer.write_table(part)
+        partitions[state if state is not None else NULL_PARTITION] = name
+
+    manifest = {"source": fingerprint, "columns": columns, "partitions": partitions}
+    write_manifest(cache_dir, manifest)
+    return manifest
+
+
+def read_cached_csv(file_path, columns, states=None, cache_columns=None, filters=None):
+    """
+    Read a CSV through its per-state columnar cache, rebuilding it if stale.
+
+    Partition files are memory-mapped and only the requested states and
+    columns are materialized. `filters` drops rows before they are
+    converted to pandas.
+
+    Args:
+        file_path (str): Source CSV path
+        columns (list): Columns to return
+        states (iterable): State codes to read, or None for every partition
+        cache_columns (list): Columns to keep in the cache, defaults to columns
+        filters (dict): Cached column -> values to keep, compared as strings
+
+    Returns:
+        DataFrame: Requested rows and columns with object string columns
+    """
+    cache_columns = cache_columns or columns
+    cache_dir = cache_dir_for(file_path)
+    manifest = read_manifest(cache_dir)
+    if (
+        not is_fresh(manifest, file_path, cache_dir)
+        or not set(columns) <= set(manifest["columns"])
+    ):
+        manifest = build_cache(file_path, cache_dir, cache_columns)
+
+    if states is None:
+        names = list(manifest["partitions"].values())
+    else:
+        names = [manifest["partitions"][s] for s in states if s in manifest["partitions"]]
+
+    frames = []
+    for name in names:
+        with pa.memory_map(join(cache_dir, name)) as source:
+            table = pa.ipc.open_file(source).read_all()
+            for column, values in (filters or {}).items():
+                value_set = pa.array([str(value) for value in values], pa.string())
+                table = table.filter(pc.is_in(table[column], value_set=value_set))
+            frames.append(table.select(columns).to_pandas())
+    if not frames:
+        schema = pa.schema([(column, pa.string()) for column in columns])
+        return schema.empty_table().to_pandas()
+    return pd.concat(frames, ignore_index=True)
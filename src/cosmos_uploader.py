@@ -0,0 +1,544 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from itertools import repeat, zip_longest
+from alive_progress import alive_it
+from azure.core.exceptions import HttpResponseError
+from azure.cosmos.exceptions import CosmosBatchOperationError, CosmosHttpResponseError
+from rate_control import FAILED, IGNORED, SUCCESS, THROTTLED, backoff_delay, retry_after_seconds
+
+# Transactional batches are limited to 100 operations and a 2 MB request;
+# the byte budget leaves headroom for request framing
+BATCH_SIZE = 100
+MAX_BATCH_BYTES = 1_900_000
+# Rough per-operation framing added to the serialized item
+OPERATION_OVERHEAD_BYTES = 100
+
+# Namespace for item ids derived from (state, year, act_num)
+ITEM_ID_NAMESPACE = uuid.UUID("5f3c1d2e-8a4b-4c6d-9e7f-0a1b2c3d4e5f")
+
+
+def item_id(state, year, act_num):
+    """
+    Derive a stable item id so re-uploading a row overwrites the same item.
+
+    Args:
+        state (str): State code
+        year (str): Year
+        act_num (str): Standardized act number
+
+    Returns:
+        str: UUID string, identical across runs for the same key
+    """
+    return str(uuid.uuid5(ITEM_ID_NAMESPACE, f"{state}/{year}/{act_num}"))
+
+
+def content_hash(item):
+    """
+    Hash an item's content, ignoring its id and any stored content hash.
+
+    Args:
+        item (dict): Item payload
+
+    Returns:
+        str: Hex digest, stable across runs for the same content
+    """
+    content = {key: value for key, value in item.items() if key not in ("id", "content_hash")}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def operation_size(operation):
+    """
+    Estimate the bytes an operation adds to a batch request.
+
+    Args:
+        operation (tuple): Batch operation like ("upsert", (item,), {})
+
+    Returns:
+        int: Serialized item size plus framing overhead
+    """
+    # the body is the last argument: (item,) for create/upsert, (id, item) for replace
+    body = operation[1][-1]
+    return len(json.dumps(body, default=str).encode()) + OPERATION_OVERHEAD_BYTES
+
+
+def chunk_digest(batch):
+    """Hash the operations of a chunk so the journal only skips identical work."""
+    payload = json.dumps(batch, sort_keys=True, default=str).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+class UploadJournal:
+    """
+    Append-only JSONL record of acknowledged upload chunks.
+
+    Each line holds a source name, a "state/year" batch key, the chunk index,
+    a digest of the chunk's operations and the RU charge it cost. A chunk is skipped on a later run
+    only if all four match, so changed data is always re-sent.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._done = set()
+        self._lock = Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a torn last line from a crash
+                        continue
+                    self._done.add(self._key(entry["source"], entry["batch_key"], entry["chunk"], entry["digest"]))
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a")
+
+    @staticmethod
+    def _key(source, batch_key, chunk, digest):
+        return (source, batch_key, chunk, digest)
+
+    def __len__(self):
+        return len(self._done)
+
+    def is_done(self, source, batch_key, chunk, digest):
+        return self._key(source, batch_key, chunk, digest) in self._done
+
+    def record(self, source, batch_key, chunk, digest, items, request_charge=None):
+        entry = {
+            "source": source,
+            "batch_key": batch_key,
+            "chunk": chunk,
+            "digest": digest,
+            "items": items,
+            "request_charge": request_charge,
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            self._done.add(self._key(source, batch_key, chunk, digest))
+
+    def close(self):
+        self._file.close()
+
+
+class UploadStats:
+    """Thread-safe counters for an upload run."""
+
+    def __init__(self):
+        self.items = 0
+        self.batches = 0
+        self.request_charge = 0.0
+        self.throttled = 0
+        self.skipped = 0
+        self.splits = 0
+        self.max_batch_charge = 0.0
+        self.start_time = time.time()
+        self.end_time = None
+        self._lock = Lock()
+
+    def record_batch(self, items, request_charge):
+        with self._lock:
+            self.items += items
+            self.batches += 1
+            self.request_charge += request_charge
+            self.max_batch_charge = max(self.max_batch_charge, request_charge)
+
+    def record_split(self):
+        with self._lock:
+            self.splits += 1
+
+    def record_skip(self, items):
+        with self._lock:
+            self.skipped += items
+
+    def record_throttle(self):
+        with self._lock:
+            self.throttled += 1
+
+    def finish(self):
+        self.end_time = time.time()
+
+    @property
+    def elapsed(self):
+        return (self.end_time or time.time()) - self.start_time
+
+    @property
+    def items_per_second(self):
+        return self.items / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def ru_per_second(self):
+        return self.request_charge / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def average_batch_charge(self):
+        return self.request_charge / self.batches if self.batches else 0.0
+
+    def summary(self):
+        return (
+            f"{self.items} items in {self.batches} batches, {self.elapsed:.1f} seconds "
+            f"({self.items_per_second:.1f} items/second, {self.ru_per_second:.1f} RU/second, "
+            f"{self.request_charge:.0f} RU total, {self.average_batch_charge:.1f} RU/batch average, "
+            f"{self.max_batch_charge:.1f} RU/batch max, {self.throttled} throttled, "
+            f"{self.splits} oversized batches split, {self.skipped} skipped as already uploaded)"
+        )
+
+
+class RateLimiter:
+    """Spaces calls to `wait` so they happen at most `rate` times per second."""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def partition_key_for(batch_key):
+    """
+    Convert a "state/year" batch key into the container's hierarchical partition key.
+
+    Args:
+        batch_key (str): Batch key like "MN/2020"
+
+    Returns:
+        tuple: (state, int(year))
+    """
+    state, year = batch_key.split("/")
+    return state, int(year)
+
+
+def request_charge(response):
+    """
+    Get the RU charge of a batch response.
+
+    Args:
+        response (CosmosList): Result of execute_item_batch
+
+    Returns:
+        float: Request units charged, 0.0 if unknown
+    """
+    try:
+        return float(response.get_response_headers().get("x-ms-request-charge", 0))
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+def execute_batch_with_retry(
+    container, batch, partition_key, stats=None, max_retries=9, base_delay=0.1, controller=None
+):
+    """
+    Execute one transactional batch, retrying when the service throttles (429).
+
+    The server's retry-after hint is honored; without one the delay grows
+    exponentially with jitter. With a controller, every attempt holds one of
+    its slots and reports its outcome, and the controller's backoff is used.
+    Other errors, including a failed operation inside the batch, are raised
+    without changing the controller's limit.
+
+    Args:
+        container: Cosmos container client (or a stand-in with execute_item_batch)
+        batch (list): Batch operations
+        partition_key (tuple): Hierarchical partition key
+        stats (UploadStats): Counters to update, optional
+        max_retries (int): Maximum number of retries after throttling
+        base_delay (float): Initial backoff in seconds when no hint is given
+        controller (AdaptiveConcurrency): Shared concurrency controller, optional
+
+    Returns:
+        CosmosList: The batch response
+    """
+    for attempt in range(max_retries + 1):
+        start = controller.acquire() if controller is not None else None
+        outcome, retry_after = FAILED, None
+        try:
+            response = container.execute_item_batch(batch, partition_key=partition_key)
+            outcome = SUCCESS
+            return response
+        except CosmosBatchOperationError:
+            # an operation in the batch failed (e.g. 404 on a delete, 409);
+            # send_batch drops or reports it, it is not a load signal
+            outcome = IGNORED
+            raise
+        except CosmosHttpResponseError as e:
+            if e.status_code != 429:
+                # only throttling adjusts the concurrency limit
+                outcome = IGNORED
+                raise
+            outcome, retry_after = THROTTLED, retry_after_seconds(e.headers)
+            if attempt == max_retries:
+                raise
+            if stats is not None:
+                stats.record_throttle()
+        finally:
+            if controller is not None:
+                controller.release(start, outcome, retry_after)
+        if controller is not None:
+            time.sleep(controller.backoff(attempt, retry_after))
+        else:
+            time.sleep(backoff_delay(attempt, retry_after, base_delay))
+
+
+def stream_limits(memory_budget_mb, bytes_per_row=4096, batch_size=BATCH_SIZE):
+    """
+    Split a memory budget between the parsed CSV chunk and queued batches.
+
+    Half of the budget goes to each. `bytes_per_row` is a rough size of one
+    parsed row or one payload including its search keys.
+
+    Args:
+        memory_budget_mb (int): Budget in megabytes
+        bytes_per_row (int): Estimated bytes per row or payload
+        batch_size (int): Operations per batch
+
+    Returns:
+        tuple: (rows per CSV chunk, maximum queued batches)
+    """
+    half = memory_budget_mb * 1024 * 1024 // 2
+    chunk_rows = max(1000, half // bytes_per_row)
+    max_queued = max(1, half // (bytes_per_row * batch_size))
+    return chunk_rows, max_queued
+
+
+def assemble_batches(operations, batch_size=BATCH_SIZE, max_batch_bytes=MAX_BATCH_BYTES):
+    """
+    Pack a stream of operations into batches per partition key.
+
+    A batch is closed when it reaches `batch_size` operations or when the next
+    operation would push its estimated request size past `max_batch_bytes`.
+    Partial batches are emitted when the stream ends. Chunk numbers count up
+    per partition key, so they are stable for the same input.
+
+    Args:
+        operations (iterable): ("state/year" batch key, operation) pairs
+        batch_size (int): Maximum operations per batch
+        max_batch_bytes (int): Maximum estimated request bytes per batch
+
+    Yields:
+        tuple: (batch key, chunk number, list of operations)
+    """
+    open_batches = {}
+    chunk_counts = {}
+
+    def close(batch_key, batch):
+        chunk = chunk_counts.get(batch_key, 0)
+        chunk_counts[batch_key] = chunk + 1
+        return batch_key, chunk, batch
+
+    for batch_key, operation in operations:
+        size = operation_size(operation)
+        batch, batch_bytes = open_batches.get(batch_key, ([], 0))
+        if batch and batch_bytes + size > max_batch_bytes:
+            yield close(batch_key, batch)
+            batch, batch_bytes = [], 0
+        batch.append(operation)
+        batch_bytes += size
+        if len(batch) == batch_size:
+            yield close(batch_key, batch)
+            batch, batch_bytes = [], 0
+        open_batches[batch_key] = (batch, batch_bytes)
+    for batch_key, (batch, _) in open_batches.items():
+        if batch:
+            yield close(batch_key, batch)
+
+
+def send_batch(container, batch_key, batch, stats, max_retries=9, controller=None):
+    """
+    Send one batch, halving it and retrying when the request is too large (413).
+
+    A delete of an item that no longer exists (404) is dropped from the batch
+    and the rest is retried.
+
+    Args:
+        container: Cosmos container client (or a stand-in with execute_item_batch)
+        batch_key (str): "state/year" batch key
+        batch (list): Batch operations
+        stats (UploadStats): Counters to update
+        max_retries (int): Maximum retries per request after throttling
+        controller (AdaptiveConcurrency): Shared concurrency controller, optional
+
+    Returns:
+        float: Total request charge of the batch and any split parts
+    """
+    try:
+        response = execute_batch_with_retry(
+            container,
+            batch,
+            partition_key_for(batch_key),
+            stats=stats,
+            max_retries=max_retries,
+            controller=controller,
+        )
+    except HttpResponseError as e:
+        failed = getattr(e, "error_index", None)
+        if e.status_code == 404 and failed is not None and batch[failed][0] == "delete":
+            # already gone; drop it so the rest of the transaction can commit
+            remaining = batch[:failed] + batch[failed + 1 :]
+            return send_batch(container, batch_key, remaining, stats, max_retries, controller) if remaining else 0.0
+        if e.status_code != 413 or len(batch) == 1:
+            raise
+        stats.record_split()
+        half = len(batch) // 2
+        return send_batch(container, batch_key, batch[:half], stats, max_retries, controller) + send_batch(
+            container, batch_key, batch[half:], stats, max_retries, controller
+        )
+    charge = request_charge(response)
+    stats.record_batch(len(batch), charge)
+    return charge
+
+
+def upload_stream(
+    container,
+    batches,
+    max_in_flight=8,
+    max_queued=None,
+    max_retries=9,
+    journal=None,
+    source=None,
+    max_batches_per_second=None,
+    controller=None,
+):
+    """
+    Upload batches from a stream while the stream is still being produced.
+
+    The stream is consumed on the calling thread, so parsing continues while
+    earlier batches upload. At most `max_in_flight` batches are sent at once
+    and at most `max_queued` are held in memory; the stream is not read
+    further until a slot frees up. With a controller, its adaptive limit
+    (up to `controller.maximum`) replaces `max_in_flight`. With a journal,
+    every acknowledged chunk is recorded and chunks already recorded for
+    `source` are skipped.
+
+    Args:
+        container: Cosmos container client (or a stand-in with execute_item_batch)
+        batches (iterable): (batch key, chunk number, operations) from assemble_batches
+        max_in_flight (int): Maximum number of concurrent batches
+        max_queued (int): Maximum batches held in memory, defaults to 4 * max_in_flight
+        max_retries (int): Maximum retries per batch after throttling
+        journal (UploadJournal): Checkpoint journal, optional
+        source (str): Name of the input the operations came from, e.g. the CSV file
+        max_batches_per_second (float): Rate limit on sent batches, None for no limit
+        controller (AdaptiveConcurrency): Shared concurrency controller, optional
+
+    Returns:
+        UploadStats: Items, batches, RU charge and throughput of the run
+    """
+    if controller is not None:
+        max_in_flight = controller.maximum
+    stats = UploadStats()
+    limiter = RateLimiter(max_batches_per_second)
+    slots = BoundedSemaphore(max(max_queued or max_in_flight * 4, max_in_flight))
+    errors = []
+
+    def upload_chunk(batch_key, chunk, batch, digest):
+        try:
+            if errors:
+                return
+            charge = send_batch(container, batch_key, batch, stats, max_retries=max_retries, controller=controller)
+            if journal is not None:
+                journal.record(source, batch_key, chunk, digest, len(batch), charge)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for batch_key, chunk, batch in alive_it(batches, title="Uploading"):
+            digest = None
+            if journal is not None:
+                digest = chunk_digest(batch)
+                if journal.is_done(source, batch_key, chunk, digest):
+                    stats.record_skip(len(batch))
+                    continue
+            slots.acquire()
+            if errors:
+                slots.release()
+                break
+            limiter.wait()
+            executor.submit(upload_chunk, batch_key, chunk, batch, digest)
+
+    stats.finish()
+    if errors:
+        raise errors[0]
+    return stats
+
+
+def iter_item_batches(item_batches, batch_size=BATCH_SIZE, max_batch_bytes=MAX_BATCH_BYTES):
+    """
+    Pack operations already grouped by partition key into numbered batches.
+
+    Partition keys are interleaved so a bounded queue still keeps several
+    partition keys in flight.
+
+    Args:
+        item_batches (dict): Operations keyed by "state/year"
+        batch_size (int): Maximum operations per batch
+        max_batch_bytes (int): Maximum estimated request bytes per batch
+
+    Yields:
+        tuple: (batch key, chunk number, list of operations)
+    """
+    packers = [
+        assemble_batches(zip(repeat(key), operations), batch_size, max_batch_bytes)
+        for key, operations in item_batches.items()
+    ]
+    for round_batches in zip_longest(*packers):
+        for batch in round_batches:
+            if batch is not None:
+                yield batch
+
+
+def upload_batches(
+    container,
+    item_batches,
+    batch_size=BATCH_SIZE,
+    max_in_flight=8,
+    max_retries=9,
+    journal=None,
+    source=None,
+    max_batches_per_second=None,
+    controller=None,
+    max_batch_bytes=MAX_BATCH_BYTES,
+):
+    """
+    Upload operations already grouped by partition key.
+
+    Args:
+        container: Cosmos container client (or a stand-in with execute_item_batch)
+        item_batches (dict): Operations keyed by "state/year"
+        batch_size (int): Operations per transactional batch
+        max_in_flight (int): Maximum number of concurrent batches
+        max_retries (int): Maximum retries per batch after throttling
+        journal (UploadJournal): Checkpoint journal, optional
+        source (str): Name of the input the operations came from, e.g. the CSV file
+        max_batches_per_second (float): Rate limit on sent batches, None for no limit
+        controller (AdaptiveConcurrency): Shared concurrency controller, optional
+        max_batch_bytes (int): Maximum estimated request bytes per batch
+
+    Returns:
+        UploadStats: Items, batches, RU charge and throughput of the run
+    """
+    return upload_stream(
+        container,
+        iter_item_batches(item_batches, batch_size, max_batch_bytes),
+        max_in_flight=max_in_flight,
+        max_retries=max_retries,
+        journal=journal,
+        source=source,
+        max_batches_per_second=max_batches_per_second,
+        controller=controller,
+    )
@@ -1,45 +1,62 @@
-from azure.cosmos import CosmosClient
 from dotenv import load_dotenv
-from os import environ
-from alive_progress import alive_it
+from os.path import dirname, join, realpath
+from partition_scan import CountAction, DeleteAction, local_partitions, run_scan
+from rate_control import AdaptiveConcurrency
+from storage import open_container
+
 
 def run():
     load_dotenv()
 
-    URL = environ["ACCOUNT_URI"]
-    KEY = environ["ACCOUNT_KEY"]
-    COSMOS_DB_NAME = environ["COSMOS_DB_NAME"]
-    client = CosmosClient(URL, credential=KEY)
-
-    database = client.get_database_client(COSMOS_DB_NAME)
+    ## "cosmos" scans the Cosmos DB account in .env, "local" the SQLite
+    ## mirror written by upload_data.py with backend = "local"
+    backend = "cosmos"
+    ## only count the matching items, do not delete anything
+    dry_run = False
+    ## maximum number of partitions scanned at once
+    max_in_flight = 8
+    ## maximum delete batches sent per second, None for no limit
+    max_batches_per_second = None
+    ## states to scan, None for every state in the local clean-data
+    states = None
+
+    script_dir = dirname(realpath(__file__))
     CONTAINER_NAME = "leginfo_clean"
-    container = database.get_container_client(CONTAINER_NAME)
+    container, COSMOS_DB_NAME = open_container(
+        backend, CONTAINER_NAME, local_path=join(script_dir, f"../data/.cache/{CONTAINER_NAME}.sqlite")
+    )
+    # partition keys come from the local clean-data; partitions that only
+    # exist remotely are not scanned
+    batch_keys = local_partitions(join(script_dir, "../data/clean-data"), states=states)
+    # delete batches adapt their concurrency to throttling (429)
+    controller = AdaptiveConcurrency(initial=max_in_flight, maximum=max_in_flight * 4)
+    action = (
+        CountAction()
+        if dry_run
+        else DeleteAction(container, controller=controller, max_batches_per_second=max_batches_per_second)
+    )
+    # a dry run always rescans; real deletes resume where they stopped
+    checkpoint_dir = None
+    if not dry_run:
+        checkpoint_dir = join(script_dir, f"../data/.cache/scans_{COSMOS_DB_NAME}_{CONTAINER_NAME}")
 
     # delete all items where CONTAINS(c.act_num, "\n")
-    items = container.query_items(
-        query="SELECT * FROM c WHERE CONTAINS(c.act_num, '\n')",
-        enable_cross_partition_query=True
+    result = run_scan(
+        container,
+        batch_keys,
+        action,
+        where="CONTAINS(c.act_num, '\n')",
+        fields=["id"],
+        max_in_flight=max_in_flight,
+        checkpoint_dir=checkpoint_dir,
     )
-
-    item_batches = {}
-    # filter df_classification by state and year
-    for i, row in enumerate(items):
-        print(f"{i}")
-        container.delete_item(item=row, partition_key=(row["state"], row["year"]))
-        # batch_key = f"{row['state']}/{row['year']}"
-        # if batch_key not in item_batches:
-        #     item_batches[batch_key] = []
-        # item_batches[batch_key].append(("delete", (row,), {}))
-
-    # batch_size = 100
-    # for key, value in alive_it(item_batches.items()):
-    #     num_items = len(value)
-    #     for i in range(0, num_items, batch_size):
-    #         batch = value[i : i + batch_size]
-    #         print(batch)
-    #         container.execute_item_batch(
-    #             batch, partition_key=(key.split("/")[0], int(key.split("/")[1]))
-    #         )
+    print(
+        f"Scanned {result['partitions_scanned']} partitions "
+        f"({result['partitions_skipped']} already done), "
+        f"{result['items_matched']} matching items"
+    )
+    if not dry_run:
+        print(f"Deleted {action.stats.summary()}")
 
 
 if __name__ == "__main__":
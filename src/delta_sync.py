@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from alive_progress import alive_it
+from cosmos_uploader import partition_key_for
+
+
+class SyncPlan:
+    """Which item ids of each partition key need a create, replace or delete."""
+
+    def __init__(self):
+        # id -> content hash of the payload to write
+        self.creates = {}
+        self.replaces = {}
+        # batch key -> ids that only exist remotely
+        self.deletes = {}
+        self.unchanged = 0
+
+    def add_partition(self, batch_key, local_hashes, remote_hashes):
+        """
+        Diff one partition key's local and remote content hashes.
+
+        Args:
+            batch_key (str): "state/year" batch key
+            local_hashes (dict): id -> content hash of the prepared payloads
+            remote_hashes (dict): id -> content hash stored in the container
+        """
+        for item_id, local_hash in local_hashes.items():
+            if item_id not in remote_hashes:
+                self.creates[item_id] = local_hash
+            elif remote_hashes[item_id] != local_hash:
+                self.replaces[item_id] = local_hash
+            else:
+                self.unchanged += 1
+        stale = [item_id for item_id in remote_hashes if item_id not in local_hashes]
+        if stale:
+            self.deletes[batch_key] = stale
+
+    @property
+    def delete_count(self):
+        return sum(len(ids) for ids in self.deletes.values())
+
+    def summary(self):
+        return (
+            f"{len(self.creates)} to create, {len(self.replaces)} to replace, "
+            f"{self.delete_count} to delete, {self.unchanged} unchanged"
+        )
+
+
+def fetch_partition_hashes(container, batch_key):
+    """
+    Read the id and content hash of every item in one partition key.
+
+    Only the two fields are projected, so the query stays cheap. Items
+    uploaded before content hashes were stored come back with None and are
+    always replaced.
+
+    Args:
+        container: Cosmos container client (or a stand-in with query_items)
+        batch_key (str): "state/year" batch key
+
+    Returns:
+        dict: id -> content hash
+    """
+    items = container.query_items(
+        query="SELECT c.id, c.content_hash FROM c",
+        partition_key=list(partition_key_for(batch_key)),
+    )
+    return {item["id"]: item.get("content_hash") for item in items}
+
+
+def plan_sync(container, operations, max_in_flight=8):
+    """
+    Compare prepared upsert operations with the container, partition by partition.
+
+    Only ids and content hashes of the local payloads are kept. When rows
+    share an id, the last one counts, as it would with upserts. Partitions
+    are read concurrently.
+
+    Args:
+        container: Cosmos container client (or a stand-in with query_items)
+        operations (iterable): ("state/year" batch key, upsert operation) pairs
+        max_in_flight (int): Maximum number of concurrent partition reads
+
+    Returns:
+        SyncPlan: The operations needed to make the container match
+    """
+    local = {}
+    for batch_key, (_, (item,), _) in operations:
+        local.setdefault(batch_key, {})[item["id"]] = item["content_hash"]
+
+    plan = SyncPlan()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        futures = {
+            executor.submit(fetch_partition_hashes, container, batch_key): batch_key
+            for batch_key in local
+        }
+        for future in alive_it(as_completed(futures), total=len(futures), title="Reading partitions"):
+            batch_key = futures[future]
+            plan.add_partition(batch_key, local[batch_key], future.result())
+    return plan
+
+
+def sync_operations(operations, plan):
+    """
+    Turn prepared upsert operations into only the writes a plan calls for.
+
+    Each id is written once, with the payload the plan hashed, so rows
+    that share an id do not send a second create that would fail with 409.
+
+    Args:
+        operations (iterable): ("state/year" batch key, upsert operation) pairs,
+            the same stream the plan was built from
+        plan (SyncPlan): Result of plan_sync
+
+    Yields:
+        tuple: ("state/year" batch key, create/replace/delete operation)
+    """
+    written = set()
+    for batch_key, (_, (item,), kwargs) in operations:
+        item_id = item["id"]
+        if item_id in written:
+            continue
+        if plan.creates.get(item_id) == item["content_hash"]:
+            written.add(item_id)
+            yield batch_key, ("create", (item,), kwargs)
+        elif plan.replaces.get(item_id) == item["content_hash"]:
+            written.add(item_id)
+            yield batch_key, ("replace", (item_id, item), kwargs)
+    for batch_key, ids in plan.deletes.items():
+        for item_id in ids:
+            yield batch_key, ("delete", (item_id,), {})
@@ -0,0 +1,370 @@
+import os
+import tempfile
+import time
+from os.path import abspath, dirname, join
+import numpy as np
+import pandas as pd
+from act_nums import canonical_act_nums, sanitize
+from classification import load_classification
+from clean_dataset import dataset_dir_for, iter_dataset, update_dataset
+from columnar_cache import cache_dir_for, read_manifest
+
+# clean-data columns the keys are built from
+COLUMNS = ["state", "year", "act_num", "original_act_num"]
+
+# source name of classification_results.csv rows
+CLASSIFICATION = "classification_results.csv"
+
+# issues reported per act_num, see analyze_candidates
+ISSUES = {
+    "duplicate": "Same (state, year, act_num) more than once in clean-data",
+    "cross_file": "act_num in more than one clean-data file",
+    "cross_partition": "act_num under more than one (state, year) in clean-data",
+    "collision": "Different original_act_nums with the same act_num",
+    "classification_duplicate": "Same (state, year, act_num) more than once in classification",
+    "classification_conflict": "Classification duplicates with different search keys",
+}
+
+
+def run():
+    # Get the directory where the script is located
+    script_dir = dirname(abspath(__file__))
+
+    ## rows read at a time; memory holds one chunk plus the candidate keys
+    chunk_rows = 500_000
+    ## None keeps an exact on-disk table of every key hash, split into
+    ## buckets that are sorted one at a time; a size in MB uses a Bloom filter
+    ## of that size instead, which spills only the keys it may have seen before
+    bloom_mb = None
+    ## hash buckets of the exact table; each is sorted in memory on its own
+    buckets = 64
+
+    classification_path = join(script_dir, "../data/classification_results.csv")
+    print("Preparing classification results...")
+    load_classification(classification_path, states=[])
+    clean_data_dir = join(script_dir, "../data/clean-data")
+    dataset_dir = dataset_dir_for(clean_data_dir)
+    manifest = update_dataset(clean_data_dir, dataset_dir)
+    print("--------------------------------")
+
+    output_path = join(script_dir, "key_index_output", "key_issues.csv")
+    report = find_key_issues(
+        dataset_dir,
+        manifest,
+        classification_path,
+        chunk_rows=chunk_rows,
+        bloom_bits=None if bloom_mb is None else int(bloom_mb * 8 * 1024 * 1024),
+        buckets=buckets,
+        output_path=output_path,
+    )
+    print_report(report)
+
+
+class BloomFilter:
+    """
+    Bit array with `hashes` probes per key, derived from one 64-bit key hash.
+
+    `add` is vectorized over a whole array of hashes and returns which of
+    them may have been added before, in earlier calls or earlier in the
+    same array.
+    """
+
+    def __init__(self, bits, hashes=4):
+        self.bits = max(8, bits)
+        self.hashes = hashes
+        self._array = np.zeros((self.bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, key_hashes):
+        # double hashing: h1 + i * h2, with h2 odd so the probes differ
+        h1 = key_hashes
+        h2 = (key_hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.hashes, dtype=np.uint64)[:, None]
+        return (h1[None, :] + steps * h2[None, :]) % np.uint64(self.bits)
+
+    def add(self, key_hashes):
+        """
+        Add key hashes and report those that may have been seen before.
+
+        Args:
+            key_hashes (ndarray): uint64 key hashes
+
+        Returns:
+            ndarray: bool per hash, True if it may be a repeat (false positives possible)
+        """
+        positions = self._positions(key_hashes)
+        byte, bit = positions // np.uint64(8), (positions % np.uint64(8)).astype(np.uint8)
+        seen = ((self._array[byte] >> bit) & 1).all(axis=0).astype(bool)
+        # repeats within the array are not in the filter yet
+        first = np.zeros(len(key_hashes), dtype=bool)
+        first[np.unique(key_hashes, return_index=True)[1]] = True
+        seen |= ~first
+        np.bitwise_or.at(self._array, byte.ravel(), (np.uint8(1) << bit).ravel())
+        return seen
+
+    def nbytes(self):
+        return self._array.nbytes
+
+
+class KeyTable:
+    """
+    On-disk table of key hashes, hash-partitioned into bucket files.
+
+    Hashes are appended as they are streamed; `repeated` then sorts one
+    bucket at a time, so memory holds a single bucket.
+    """
+
+    def __init__(self, directory, buckets=64):
+        self.directory = directory
+        self.buckets = buckets
+        self._files = [open(join(directory, f"bucket_{b:04d}.u64"), "ab") for b in range(buckets)]
+        self.rows = 0
+
+    def add(self, key_hashes):
+        self.rows += len(key_hashes)
+        bucket = key_hashes % np.uint64(self.buckets)
+        order = np.argsort(bucket, kind="stable")
+        bounds = np.searchsorted(bucket[order], np.arange(self.buckets + 1, dtype=np.uint64))
+        for b in range(self.buckets):
+            if bounds[b] < bounds[b + 1]:
+                key_hashes[order[bounds[b]:bounds[b + 1]]].tofile(self._files[b])
+
+    def repeated(self):
+        """
+        Get the hashes that were added more than once.
+
+        Returns:
+            ndarray: Sorted uint64 hashes
+        """
+        repeated = []
+        for b, f in enumerate(self._files):
+            f.close()
+            values, counts = np.unique(
+                np.fromfile(join(self.directory, f"bucket_{b:04d}.u64"), dtype=np.uint64),
+                return_counts=True,
+            )
+            repeated.append(values[counts > 1])
+        return np.concatenate(repeated)
+
+
+# hash keys of the key spaces: the canonical act_nums the upload builds,
+# the act_num column as stored in clean-data, and the classification; an
+# act_num is expected once in each, so only repeats within one space are
+# candidates
+HASH_KEYS = {"canonical": "canonical-keys00", "stored": "stored-act-nums0", "classification": "classification00"}
+
+
+def key_hashes(act_nums, key):
+    """
+    Hash act_num strings to uint64.
+
+    Args:
+        act_nums (Series): act_num strings
+        key (str): Key space, one of HASH_KEYS
+
+    Returns:
+        ndarray: uint64 hash per act_num, the same for the same string in
+        every file of the same space
+    """
+    return pd.util.hash_array(act_nums.to_numpy(dtype=object), hash_key=HASH_KEYS[key], categorize=False)
+
+
+def iter_keys(dataset_dir, manifest, classification_path, chunk_rows, search_keys=False):
+    """
+    Stream the act_num keys of every clean-data file and of the classification.
+
+    Clean-data rows give two keys: the canonical act_num the upload builds
+    (see act_nums.canonical_act_nums) and the act_num column as stored,
+    the one verify_data checks for duplicates. Files without
+    original_act_num only have the stored one. Rows without a key are left
+    out. Classification rows are read one state at a time from the
+    columnar cache, with their search keys only if asked for.
+
+    Yields:
+        tuple: (source name, key space, DataFrame with state, year, act_num,
+        raw and search_keys, one row per key); raw is the original_act_num
+        of clean-data rows
+    """
+
+    def frame(df, act_nums, raw, search_keys=None):
+        return pd.DataFrame(
+            {
+                "state": df["state"].astype(object),
+                "year": df["year"].astype(object),
+                "act_num": act_nums,
+                "raw": raw.astype(object),
+                "search_keys": search_keys,
+            }
+        )
+
+    for file, entry in manifest["sources"].items():
+        if "state" not in entry["columns"] or "year" not in entry["columns"]:
+            continue
+        for chunk in iter_dataset(dataset_dir, manifest, chunk_rows, COLUMNS, sources=[file]):
+            raw = chunk["original_act_num"] if "original_act_num" in chunk.columns else chunk.get("act_num")
+            if raw is None:
+                continue
+            if "original_act_num" in chunk.columns:
+                keys = frame(chunk, canonical_act_nums(chunk)[0], raw)
+                yield file, "canonical", keys[keys["act_num"].notna()]
+            if "act_num" in chunk.columns:
+                keys = frame(chunk, chunk["act_num"].astype(object), raw)
+                # empty act_nums are counted as missing, not as duplicates
+                yield file, "stored", keys[keys["act_num"].notna() & (keys["act_num"] != "")]
+
+    manifest = read_manifest(cache_dir_for(classification_path)) or {"partitions": {}}
+    for state in manifest["partitions"]:
+        df = load_classification(classification_path, states=[state], search_keys=search_keys)
+        keys = frame(df, df["act_num"], df["act_num"], df["search_keys"] if search_keys else None)
+        for start in range(0, len(keys), chunk_rows):
+            chunk = keys.iloc[start:start + chunk_rows]
+            yield CLASSIFICATION, "classification", chunk[chunk["act_num"].notna()]
+
+
+def analyze_candidates(candidates):
+    """
+    Find the key issues among the rows of the candidate act_nums.
+
+    Clean-data issues are found in the canonical and the stored key space
+    separately; a collision is one act_num with different original_act_nums.
+
+    Args:
+        candidates (DataFrame): source, key, state, year, act_num, raw and
+            search_keys of every row whose act_num hash was seen more than once
+
+    Returns:
+        DataFrame: One row per (key space, act_num) with an issue, a boolean
+        column per ISSUES entry and the rows and sources involved
+    """
+    clean = candidates[candidates["key"] != "classification"]
+    classification = candidates[candidates["key"] == "classification"]
+    issues = pd.DataFrame(index=pd.MultiIndex.from_frame(candidates[["key", "act_num"]].drop_duplicates()))
+    per_key = ["key", "act_num"]
+
+    by_partition = clean.groupby(per_key + ["state", "year"], dropna=False).size()
+    issues["duplicate"] = (by_partition > 1).groupby(level=per_key).any()
+    by_key = clean.groupby(per_key)
+    issues["cross_file"] = by_key["source"].nunique() > 1
+    issues["cross_partition"] = by_partition.groupby(level=per_key).size() > 1
+    issues["collision"] = by_key["raw"].nunique() > 1
+
+    by_classification = classification.groupby(per_key + ["state", "year"], dropna=False)["search_keys"]
+    counts = by_classification.agg(["size", "count", "nunique"])
+    duplicated = counts["size"] > 1
+    issues["classification_duplicate"] = duplicated.groupby(level=per_key).any()
+    # same rule as classification.summarize_classification
+    issues["classification_conflict"] = (
+        duplicated & ((counts["count"] < counts["size"]) | (counts["nunique"] > 1))
+    ).groupby(level=per_key).any()
+
+    issues = issues.astype("boolean").fillna(False).astype(bool)
+    issues = issues[issues.any(axis=1)]
+    involved = candidates[pd.MultiIndex.from_frame(candidates[per_key]).isin(issues.index)]
+    involved = involved.assign(partition=involved["state"].astype(str) + "/" + involved["year"].astype(str))
+    involved = involved.groupby(per_key)
+    issues["rows"] = involved.size()
+    issues["sources"] = involved["source"].agg(lambda sources: ";".join(sorted(set(sources))))
+    issues["partitions"] = involved["partition"].agg(lambda partitions: ";".join(sorted(set(partitions))))
+    return issues.sort_index()
+
+
+def find_key_issues(
+    dataset_dir,
+    manifest,
+    classification_path,
+    chunk_rows=500_000,
+    bloom_bits=None,
+    buckets=64,
+    output_path=None,
+):
+    """
+    Report duplicate and colliding act_nums across all clean-data files and the classification.
+
+    The first pass streams every key and keeps only a 64-bit hash of it,
+    in an on-disk table of `buckets` sorted buckets or, with `bloom_bits`,
+    in a Bloom filter that passes on only the hashes it may have seen
+    before. The second pass streams the keys again and keeps the rows of
+    the repeated hashes, which are compared by their actual values, so
+    hash and Bloom false positives never show up as issues. Memory holds
+    one chunk, one state of the classification, one bucket (or the
+    filter) and the candidate rows.
+
+    Args:
+        dataset_dir (str): Clean-data Parquet dataset directory
+        manifest (dict): Dataset manifest, see clean_dataset.update_dataset
+        classification_path (str): Path to classification_results.csv
+        chunk_rows (int): Rows read at a time
+        bloom_bits (int): Bloom filter size in bits, None for the exact table
+        buckets (int): Buckets of the exact table
+        output_path (str): CSV to write the issues to, optional
+
+    Returns:
+        dict: keys, candidates, per-issue act_num counts, passes timing and
+        the issues DataFrame
+    """
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        if bloom_bits is None:
+            table = KeyTable(tmp, buckets)
+            for _, key, keys in iter_keys(dataset_dir, manifest, classification_path, chunk_rows):
+                table.add(key_hashes(keys["act_num"], key))
+            total = table.rows
+            repeated = table.repeated()
+        else:
+            bloom = BloomFilter(bloom_bits)
+            total = 0
+            maybe_seen = []
+            for _, key, keys in iter_keys(dataset_dir, manifest, classification_path, chunk_rows):
+                hashes = key_hashes(keys["act_num"], key)
+                total += len(hashes)
+                maybe_seen.append(hashes[bloom.add(hashes)])
+            repeated = np.unique(np.concatenate(maybe_seen)) if maybe_seen else np.zeros(0, np.uint64)
+    first_pass = time.perf_counter() - start
+
+    start = time.perf_counter()
+    candidates = []
+    for source, key, keys in iter_keys(dataset_dir, manifest, classification_path, chunk_rows, search_keys=True):
+        rows = keys[np.isin(key_hashes(keys["act_num"], key), repeated)]
+        if len(rows):
+            candidates.append(rows.assign(source=source, key=key))
+    candidates = pd.concat(candidates, ignore_index=True) if candidates else pd.DataFrame(
+        columns=["state", "year", "act_num", "raw", "search_keys", "source", "key"]
+    )
+    issues = analyze_candidates(candidates)
+    second_pass = time.perf_counter() - start
+
+    if output_path is not None:
+        os.makedirs(dirname(output_path) or ".", exist_ok=True)
+        issues.to_csv(output_path)
+    return {
+        "keys": total,
+        "candidates": len(repeated),
+        "issues": issues,
+        # an act_num with the issue in both clean-data key spaces counts once
+        "counts": {
+            name: issues.index[issues[name]].get_level_values("act_num").nunique() for name in ISSUES
+        },
+        "first_pass": first_pass,
+        "second_pass": second_pass,
+        "output_path": output_path,
+    }
+
+
+def print_report(report):
+    print("\nKey Index Results:")
+    print("=" * 50)
+    print(f"Keys indexed: {report['keys']}")
+    print(f"Repeated key hashes re-read: {report['candidates']}")
+    print(f"Passes: {report['first_pass']:.1f}s indexing, {report['second_pass']:.1f}s resolving")
+    if any(report["counts"].values()):
+        for name, label in ISSUES.items():
+            if report["counts"][name]:
+                print(f"{label:60}: {report['counts'][name]:5} act_nums")
+        if report["output_path"]:
+            print(f"  → Every act_num with an issue written to: {report['output_path']}")
+    else:
+        print("No issues found")
+    print("-" * 50)
+
+
+if __name__ == "__main__":
+    run()
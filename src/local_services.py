@@ -0,0 +1,390 @@
+import bisect
+import copy
+import hashlib
+import itertools
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+from azure.core.utils import CaseInsensitiveDict
+from azure.cosmos import CosmosList
+from azure.cosmos.exceptions import CosmosBatchOperationError, CosmosHttpResponseError
+from storage import parse_query
+
+
+def throttled_error(retry_after_ms):
+    """Build the 429 error the Cosmos SDK raises when a request is throttled."""
+    error = CosmosHttpResponseError(status_code=429, message="Request rate is large")
+    error.headers = {"x-ms-retry-after-ms": str(retry_after_ms)}
+    return error
+
+
+class FakeItemPaged(list):
+    """
+    Query results that can also be read page by page like the SDK's ItemPaged.
+
+    `by_page(continuation_token)` returns an iterator of pages whose
+    `continuation_token` attribute is set after each page and is None once
+    the last page has been read. Results are ordered by item id and a token
+    is the last id returned, so reopening a query with a token resumes after
+    that item even if earlier items have been deleted meanwhile.
+    """
+
+    def __init__(self, items, ids, page_size=None, on_page=None):
+        super().__init__(items)
+        self.ids = ids
+        self.page_size = page_size or max(1, len(items))
+        self.on_page = on_page
+
+    def by_page(self, continuation_token=None):
+        return FakePager(self, continuation_token)
+
+
+class FakePager:
+    """Iterator of result pages returned by FakeItemPaged.by_page."""
+
+    def __init__(self, results, continuation_token):
+        self.results = results
+        self.offset = 0 if continuation_token is None else bisect.bisect_right(results.ids, continuation_token)
+        self.continuation_token = None
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        if self.results.on_page is not None:
+            self.results.on_page()
+        page = self.results[self.offset : self.offset + self.results.page_size]
+        self.offset += len(page)
+        if self.offset < len(self.results):
+            self.continuation_token = self.results.ids[self.offset - 1]
+        else:
+            self.continuation_token = None
+            self._done = True
+        return iter(page)
+
+
+class FakeContainer:
+    """
+    In-memory stand-in for a Cosmos DB container client.
+
+    Implements execute_item_batch with create/upsert/replace/delete
+    operations against a dict keyed by (partition key, id), and query_items
+    for the SQL subset the scripts use (see `parse_query`). Every request
+    sleeps for `latency` seconds and is throttled with probability
+    `throttle_rate`, raising a 429 with a retry-after header like the
+    service does; with `max_concurrent`, requests beyond that many at once
+    are throttled too, like a container with limited throughput. Batches whose serialized operations exceed
+    `max_batch_bytes` are rejected with a 413. Request charges are reported
+    in the response headers.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        throttle_rate=0.0,
+        retry_after_ms=50,
+        ru_per_write=5.0,
+        ru_per_read=1.0,
+        max_batch_bytes=2 * 1024 * 1024,
+        max_concurrent=None,
+        seed=0,
+    ):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after_ms = retry_after_ms
+        self.ru_per_write = ru_per_write
+        self.ru_per_read = ru_per_read
+        self.request_charge = 0.0
+        self.max_batch_bytes = max_batch_bytes
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.items = {}
+        self.requests = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    def _request(self):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            throttle = self._random.random() < self.throttle_rate
+            if self.max_concurrent is not None and self.active > self.max_concurrent:
+                throttle = True
+            if throttle:
+                self.throttled += 1
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.active -= 1
+        if throttle:
+            raise throttled_error(self.retry_after_ms)
+
+    def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        self._request()
+        size = sum(len(json.dumps(args[0], default=str)) for _, args, _ in batch_operations)
+        if size > self.max_batch_bytes:
+            raise CosmosHttpResponseError(status_code=413, message="Request size is too large")
+        partition_key = tuple(partition_key) if isinstance(partition_key, (list, tuple)) else (partition_key,)
+        with self._lock:
+            # transactional: stage every change and commit only if all succeed
+            staged = {}
+            results = []
+            for index, (operation, args, _) in enumerate(batch_operations):
+                # (item,) for create/upsert, (id, item) for replace, (id,) for delete
+                item = args[-1]
+                item_id = args[0] if isinstance(args[0], str) else args[0]["id"]
+                key = (partition_key, item_id)
+                exists = staged[key] is not None if key in staged else key in self.items
+                status = 200
+                if operation == "create":
+                    status = 409 if exists else 201
+                elif operation in ("replace", "delete") and not exists:
+                    status = 404
+                if status >= 400:
+                    raise CosmosBatchOperationError(
+                        error_index=index,
+                        headers={"x-ms-request-charge": "0"},
+                        status_code=status,
+                        message=f"Batch operation {index} ({operation}) failed with {status}",
+                        operation_responses=[{"statusCode": status}],
+                    )
+                if operation == "delete":
+                    staged[key] = None
+                    status = 204
+                else:
+                    staged[key] = copy.deepcopy(item)
+                results.append({"statusCode": status, "requestCharge": self.ru_per_write})
+            for key, item in staged.items():
+                if item is None:
+                    self.items.pop(key, None)
+                else:
+                    self.items[key] = item
+
+        charge = self.ru_per_write * len(batch_operations)
+        with self._lock:
+            self.request_charge += charge
+        return CosmosList(results, response_headers=CaseInsensitiveDict({"x-ms-request-charge": str(charge)}))
+
+    def query_items(
+        self,
+        query,
+        parameters=None,
+        partition_key=None,
+        enable_cross_partition_query=False,
+        max_item_count=None,
+        **kwargs,
+    ):
+        """
+        Run a query from the supported subset, optionally scoped to one partition key.
+
+        Results are evaluated against a snapshot taken when the query runs.
+        Reading them with `by_page()` costs one extra request per page after
+        the first, `max_item_count` items each.
+
+        Returns:
+            FakeItemPaged: Matching items, projected to the selected fields
+        """
+        self._request()
+        fields, predicate = parse_query(query, parameters)
+        if partition_key is not None:
+            partition_key = tuple(partition_key) if isinstance(partition_key, (list, tuple)) else (partition_key,)
+        with self._lock:
+            candidates = [
+                (item_id, item)
+                for (item_partition, item_id), item in self.items.items()
+                if partition_key is None or item_partition == partition_key
+            ]
+        candidates.sort(key=lambda pair: pair[0])
+        results = []
+        ids = []
+        for item_id, item in candidates:
+            if predicate(item):
+                results.append(dict(item) if fields is None else {f: item[f] for f in fields if f in item})
+                ids.append(item_id)
+        with self._lock:
+            self.request_charge += self.ru_per_read * max(1, len(results))
+        pages_read = []
+
+        def on_page():
+            # the first page is the query request itself
+            if pages_read:
+                self._request()
+            pages_read.append(True)
+
+        return FakeItemPaged(results, ids, max_item_count, on_page)
+
+
+class _BlobHTTPServer(ThreadingHTTPServer):
+    # benchmarks open hundreds of connections at once
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class FakeBlobServer:
+    """
+    Local HTTP stand-in for a public blob container.
+
+    Serves HEAD requests for `http://127.0.0.1:<port>/<container>/<blob name>`
+    with 200 for names in `blob_names` and 404 otherwise (304 when an
+    If-None-Match header carries the blob's ETag), and List Blobs
+    requests (`GET /<container>/?restype=container&comp=list` with prefix,
+    marker and maxresults) with the service's XML, or 403 when
+    `allow_listing` is False. Every request sleeps for `latency` seconds
+    and fails with a 500 with probability `error_rate`; with
+    `max_concurrent`, requests beyond that many at once get a 503 (Server
+    Busy) like a throttled storage account. Connections are
+    kept alive. Use as a context manager; `url` is the container URL with
+    a trailing slash.
+    """
+
+    def __init__(
+        self,
+        blob_names,
+        container="raw-data",
+        latency=0.0,
+        error_rate=0.0,
+        allow_listing=True,
+        max_concurrent=None,
+        seed=0,
+    ):
+        self.blob_names = set(blob_names)
+        self.sorted_names = sorted(self.blob_names)
+        self.container = container
+        self.latency = latency
+        self.error_rate = error_rate
+        self.allow_listing = allow_listing
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.requests = 0
+        self.busy = 0
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/{self.container}/"
+
+    def _request(self):
+        """Count a request, sleep for the latency, and return its forced status (500/503) or None."""
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            status = 500 if self._random.random() < self.error_rate else None
+            if self.max_concurrent is not None and self.active > self.max_concurrent:
+                status = 503
+                self.busy += 1
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.active -= 1
+        return status
+
+    @staticmethod
+    def etag(name):
+        return '"0x' + hashlib.md5(name.encode()).hexdigest()[:16].upper() + '"'
+
+    def _head(self, path, if_none_match):
+        """Status and ETag of a request for one blob."""
+        status = self._request()
+        if status:
+            return status, None
+        prefix = f"/{self.container}/"
+        name = unquote(path[len(prefix):]) if path.startswith(prefix) else None
+        if name not in self.blob_names:
+            return 404, None
+        etag = self.etag(name)
+        return (304 if if_none_match == etag else 200), etag
+
+    def _list(self, query):
+        """Status and XML body of a List Blobs request."""
+        status = self._request()
+        if status:
+            return status, b""
+        if not self.allow_listing:
+            return 403, b""
+        params = {key: values[0] for key, values in parse_qs(query).items()}
+        prefix = params.get("prefix", "")
+        page_size = min(int(params.get("maxresults", 5000)), 5000)
+        start = bisect.bisect_left(self.sorted_names, max(prefix, params.get("marker", "")))
+        names = []
+        next_marker = ""
+        for name in itertools.islice(self.sorted_names, start, None):
+            if not name.startswith(prefix):
+                break
+            if len(names) == page_size:
+                next_marker = name
+                break
+            names.append(name)
+        blobs = "".join(
+            f"<Blob><Name>{escape(name)}</Name><Properties><Etag>{self.etag(name)}</Etag></Properties></Blob>"
+            for name in names
+        )
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            f'<EnumerationResults ContainerName="{self.container}"><Prefix>{escape(prefix)}</Prefix>'
+            f"<MaxResults>{page_size}</MaxResults><Blobs>{blobs}</Blobs>"
+            f"<NextMarker>{escape(next_marker)}</NextMarker></EnumerationResults>"
+        )
+        return 200, body.encode()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                status, etag = server._head(urlsplit(self.path).path, self.headers.get("If-None-Match"))
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path.rstrip("/") == f"/{server.container}" and "comp=list" in url.query:
+                    status, body = server._list(url.query)
+                else:
+                    status, body = server._head(url.path, None)[0], b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/xml")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = _BlobHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
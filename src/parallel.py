@@ -0,0 +1,57 @@
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def ordered_map(fn, items, jobs, ahead=None):
+    """
+    Apply `fn` to every item in a process pool and yield the results in input order.
+
+    At most `ahead` items are submitted but not yet yielded, so a slow
+    consumer bounds the memory held by finished results. With one job
+    everything runs in this process.
+
+    Args:
+        fn (callable): Module-level function, so it can be sent to the workers
+        items (iterable): Arguments, one per call
+        jobs (int): Worker processes
+        ahead (int): Calls in flight, defaults to twice the number of jobs
+
+    Yields:
+        The result of each call, in the order of `items`
+    """
+    if jobs <= 1:
+        for item in items:
+            yield fn(item)
+        return
+    ahead = ahead or 2 * jobs
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def jobs_argument(description):
+    """
+    Parse the `--jobs` option of a script.
+
+    Args:
+        description (str): Script description for --help
+
+    Returns:
+        int: Number of worker processes, 1 to run in-process
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help=f"Worker processes, 0 for one per CPU ({os.cpu_count()} here); default 1",
+    )
+    jobs = parser.parse_args().jobs
+    return jobs if jobs > 0 else os.cpu_count() or 1
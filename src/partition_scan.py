@@ -0,0 +1,297 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from os.path import join
+from threading import Lock
+from alive_progress import alive_it
+from azure.cosmos.exceptions import CosmosHttpResponseError
+from clean_dataset import dataset_partitions, update_dataset
+from cosmos_uploader import BATCH_SIZE, RateLimiter, UploadStats, partition_key_for, send_batch
+from rate_control import backoff_delay, retry_after_seconds
+
+
+def local_partitions(clean_data_dir, states=None):
+    """
+    List the (state, year) partition keys present in the local clean-data CSVs.
+
+    The keys come from the manifest of the clean-data Parquet dataset,
+    which is brought up to date first.
+
+    Args:
+        clean_data_dir (str): Directory with *_leginfo_clean.csv files
+        states (iterable): State codes to keep, or None for all
+
+    Returns:
+        list: Sorted "state/year" batch keys with numeric years
+    """
+    batch_keys = set()
+    for partition in dataset_partitions(update_dataset(clean_data_dir), states=states):
+        state, year = partition["state"], partition["year"]
+        if state is not None and year is not None and year.isnumeric():
+            batch_keys.add(f"{state}/{int(year)}")
+    return sorted(batch_keys)
+
+
+class CountAction:
+    """Counts matches per partition."""
+
+    name = "count"
+
+    def __init__(self):
+        self.counts = {}
+        self._lock = Lock()
+
+    def handle(self, batch_key, items):
+        with self._lock:
+            self.counts[batch_key] = self.counts.get(batch_key, 0) + len(items)
+
+    def close(self):
+        pass
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+
+class ExportAction:
+    """Appends every match as one JSON line to a file."""
+
+    name = "export"
+
+    def __init__(self, path):
+        self.path = path
+        self.total = 0
+        self._file = open(path, "a")
+        self._lock = Lock()
+
+    def handle(self, batch_key, items):
+        lines = "".join(json.dumps(item) + "\n" for item in items)
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+            self.total += len(items)
+
+    def close(self):
+        self._file.close()
+
+
+class DeleteAction:
+    """
+    Deletes matches in transactional batches as pages arrive; matches need an id.
+
+    With `max_batches_per_second`, batches of every scanned partition share
+    one rate limit.
+    """
+
+    name = "delete"
+
+    def __init__(self, container, max_retries=9, controller=None, max_batches_per_second=None):
+        self.container = container
+        self.max_retries = max_retries
+        self.controller = controller
+        self.limiter = RateLimiter(max_batches_per_second)
+        self.stats = UploadStats()
+
+    def handle(self, batch_key, items):
+        operations = [("delete", (item["id"],), {}) for item in items]
+        for i in range(0, len(operations), BATCH_SIZE):
+            self.limiter.wait()
+            send_batch(
+                self.container,
+                batch_key,
+                operations[i : i + BATCH_SIZE],
+                self.stats,
+                self.max_retries,
+                self.controller,
+            )
+
+    def close(self):
+        self.stats.finish()
+
+    @property
+    def total(self):
+        return self.stats.items
+
+
+class ScanCheckpoint:
+    """
+    Append-only record of partitions a scan has finished.
+
+    The file name is derived from the query, the action and the partition
+    keys, so only the same scan over the same partitions resumes from it.
+    run_scan removes it once the scan completes, so a later run starts over.
+    """
+
+    def __init__(self, directory, query, action_name, batch_keys):
+        scan = json.dumps([action_name, query, sorted(batch_keys)])
+        digest = hashlib.sha256(scan.encode()).hexdigest()[:16]
+        os.makedirs(directory, exist_ok=True)
+        self.path = join(directory, f"scan_{action_name}_{digest}.jsonl")
+        self.done = set()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["batch_key"])
+                    except (ValueError, KeyError):
+                        continue
+        self._file = open(self.path, "a")
+        self._lock = Lock()
+
+    def record(self, batch_key, matched):
+        with self._lock:
+            self._file.write(json.dumps({"batch_key": batch_key, "matched": matched}) + "\n")
+            self._file.flush()
+            self.done.add(batch_key)
+
+    def close(self):
+        self._file.close()
+
+    def remove(self):
+        self.close()
+        os.remove(self.path)
+
+
+def build_query(where=None, fields=None):
+    """
+    Build a partition-scoped query.
+
+    Args:
+        where (str): SQL predicate on `c`, e.g. "CONTAINS(c.act_num, '\\n')"
+        fields (list): Fields to project, or None for all fields
+
+    Returns:
+        str: SQL text
+    """
+    projection = ", ".join(f"c.{field}" for field in fields) if fields else "*"
+    query = f"SELECT {projection} FROM c"
+    if where:
+        query += f" WHERE {where}"
+    return query
+
+
+def scan_partition(
+    container, batch_key, query, action, python_filter=None, page_size=1000, max_retries=9, base_delay=0.1
+):
+    """
+    Page through one partition's query results and feed matches to an action.
+
+    Each page is handed to the action before the next one is requested. If
+    a page request is throttled (429), the query is reopened from the last
+    continuation token instead of from the start.
+
+    Args:
+        container: Cosmos container client (or a stand-in with query_items)
+        batch_key (str): "state/year" batch key
+        query (str): SQL text
+        action: Object with handle(batch_key, items)
+        python_filter (callable): Extra client-side filter on each item, optional
+        page_size (int): Items per page
+        max_retries (int): Maximum number of consecutive retries after throttling
+        base_delay (float): Initial backoff in seconds when no hint is given
+
+    Returns:
+        tuple: (items scanned, items matched)
+    """
+    scanned = matched = 0
+    continuation_token = None
+    attempt = 0
+    while True:
+        try:
+            pages = container.query_items(
+                query=query,
+                partition_key=list(partition_key_for(batch_key)),
+                max_item_count=page_size,
+            ).by_page(continuation_token)
+            for page in pages:
+                items = list(page)
+                scanned += len(items)
+                if python_filter is not None:
+                    items = [item for item in items if python_filter(item)]
+                if items:
+                    action.handle(batch_key, items)
+                    matched += len(items)
+                continuation_token = pages.continuation_token
+                attempt = 0
+            return scanned, matched
+        except CosmosHttpResponseError as e:
+            if e.status_code != 429 or attempt == max_retries:
+                raise
+            time.sleep(backoff_delay(attempt, retry_after_seconds(e.headers), base_delay))
+            attempt += 1
+
+
+def run_scan(
+    container,
+    batch_keys,
+    action,
+    where=None,
+    fields=None,
+    python_filter=None,
+    max_in_flight=8,
+    page_size=1000,
+    checkpoint_dir=None,
+):
+    """
+    Scan many partitions in parallel, one partition-scoped query each.
+
+    With `checkpoint_dir`, finished partitions are recorded, so an
+    interrupted scan over the same partitions resumes where it stopped. The
+    checkpoint is removed once every partition is done.
+
+    Args:
+        container: Cosmos container client (or a stand-in with query_items)
+        batch_keys (list): "state/year" partition keys to scan
+        action: CountAction, ExportAction, DeleteAction or any object with handle/close
+        where (str): SQL predicate on `c`, optional
+        fields (list): Fields to project, or None for all fields
+        python_filter (callable): Extra client-side filter on each item, optional
+        max_in_flight (int): Maximum number of partitions scanned at once
+        page_size (int): Items per page
+        checkpoint_dir (str): Directory for the resume checkpoint, optional
+
+    Returns:
+        dict: Partitions scanned and skipped, items scanned and matched
+    """
+    query = build_query(where, fields)
+    checkpoint = ScanCheckpoint(checkpoint_dir, query, action.name, batch_keys) if checkpoint_dir else None
+    pending = [key for key in batch_keys if checkpoint is None or key not in checkpoint.done]
+    result = {
+        "partitions_scanned": 0,
+        "partitions_skipped": len(batch_keys) - len(pending),
+        "items_scanned": 0,
+        "items_matched": 0,
+    }
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            futures = {
+                executor.submit(
+                    scan_partition, container, key, query, action, python_filter, page_size
+                ): key
+                for key in pending
+            }
+            for future in alive_it(as_completed(futures), total=len(futures), title="Scanning partitions"):
+                try:
+                    scanned, matched = future.result()
+                except Exception:
+                    for other in futures:
+                        other.cancel()
+                    raise
+                result["partitions_scanned"] += 1
+                result["items_scanned"] += scanned
+                result["items_matched"] += matched
+                if checkpoint is not None:
+                    checkpoint.record(futures[future], matched)
+    except BaseException:
+        if checkpoint is not None:
+            checkpoint.close()
+        raise
+    finally:
+        action.close()
+    if checkpoint is not None:
+        # finished; only an interrupted scan resumes
+        checkpoint.remove()
+    return result
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import time
+from os.path import dirname
+
+# rows written per transaction
+COMMIT_EVERY = 5000
+
+
+class PdfExistenceCache:
+    """
+    On-disk record of PDF check results, keyed by act_num.
+
+    Found PDFs are trusted until their result is older than `ttl_seconds`;
+    misses, errors and expired entries are probed again. The last seen
+    ETag is kept so an expired entry can be revalidated with If-None-Match.
+    """
+
+    def __init__(self, path, ttl_seconds):
+        os.makedirs(dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        # release.py opens the cache on the main thread and checks PDFs on
+        # another one; only one thread uses it at a time
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pdf_status (
+                act_num TEXT PRIMARY KEY,
+                found INTEGER NOT NULL,
+                status_code INTEGER,
+                etag TEXT,
+                checked_at REAL NOT NULL
+            )
+            """
+        )
+        self._pending = []
+
+    def split(self, act_nums, now=None):
+        """
+        Separate act_nums whose cached result can be trusted from those to probe.
+
+        Args:
+            act_nums (list): act_num values to check
+            now (float): Current time in seconds since the epoch, optional
+
+        Returns:
+            tuple: (list of cached result tuples, list of act_nums to probe,
+                dict of act_num -> ETag for the act_nums to probe)
+        """
+        now = time.time() if now is None else now
+        cutoff = now - self.ttl_seconds
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (act_num TEXT PRIMARY KEY)")
+        self._conn.execute("DELETE FROM wanted")
+        self._conn.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", ((a,) for a in act_nums))
+        rows = self._conn.execute(
+            """
+            SELECT s.act_num, s.found, s.status_code, s.etag, s.checked_at
+            FROM wanted w JOIN pdf_status s ON s.act_num = w.act_num
+            """
+        )
+        fresh = {}
+        etags = {}
+        for act_num, found, status_code, etag, checked_at in rows:
+            if found and checked_at >= cutoff:
+                fresh[act_num] = (act_num, True, status_code, None)
+            elif etag:
+                etags[act_num] = etag
+        self._conn.execute("DELETE FROM wanted")
+
+        cached = [fresh[act_num] for act_num in act_nums if act_num in fresh]
+        to_probe = [act_num for act_num in act_nums if act_num not in fresh]
+        return cached, to_probe, etags
+
+    def record(self, act_num, exists, status_code, etag=None, now=None):
+        """Queue one probe result; written in batches of COMMIT_EVERY."""
+        now = time.time() if now is None else now
+        self._pending.append((act_num, int(bool(exists)), status_code, etag, now))
+        if len(self._pending) >= COMMIT_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self._conn:
+            # a found PDF without an ETag (e.g. a 304) keeps the one already stored
+            self._conn.executemany(
+                """
+                INSERT INTO pdf_status (act_num, found, status_code, etag, checked_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(act_num) DO UPDATE SET
+                    found = excluded.found,
+                    status_code = excluded.status_code,
+                    etag = CASE WHEN excluded.found THEN COALESCE(excluded.etag, pdf_status.etag) END,
+                    checked_at = excluded.checked_at
+                """,
+                self._pending,
+            )
+        self._pending = []
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM pdf_status").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self._conn.close()
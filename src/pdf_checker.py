@@ -0,0 +1,198 @@
+import asyncio
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+import aiohttp
+from rate_control import FAILED, SUCCESS, THROTTLE_STATUSES, THROTTLED, backoff_delay, retry_after_seconds
+
+# List Blobs returns at most 5000 names per page
+LIST_PAGE_SIZE = 5000
+
+
+def result_for_status(act_num, status_code):
+    """
+    Turn a HEAD response status into a check result.
+
+    304 (Not Modified, answer to an If-None-Match request) counts as found.
+
+    Args:
+        act_num (str): The act number that was checked
+        status_code (int): HTTP status of the response
+
+    Returns:
+        tuple: (act_num: str, exists: bool, status_code: int, error: str)
+    """
+    if status_code in (200, 304):
+        return act_num, True, status_code, None
+    elif status_code == 404:
+        return act_num, False, status_code, "Not found"
+    return act_num, False, status_code, f"HTTP {status_code}"
+
+
+async def check_pdf_url_exists_async(client, base_url, act_num, max_retries=2, etags=None, controller=None):
+    """
+    Check if `{act_num}.pdf` exists under `base_url` with one HEAD request.
+
+    Same results as verify_uploaded_raw_pdfs.check_pdf_url_exists: throttled
+    (429/503), timed out and failed requests are retried with jittered
+    backoff (honoring Retry-After), up to `max_retries` attempts in total.
+
+    With `etags`, a known ETag is sent as If-None-Match and the ETag of
+    the response is stored back into the dict. With a controller, every
+    attempt holds one of its slots and reports its outcome.
+
+    Args:
+        client (aiohttp.ClientSession): Shared session with a connection pool
+        base_url (str): URL prefix the quoted file name is appended to
+        act_num (str): The act number to check
+        max_retries (int): Maximum number of attempts
+        etags (dict): act_num -> ETag, optional
+        controller (AdaptiveConcurrency): Shared concurrency controller, optional
+
+    Returns:
+        tuple: (act_num: str, exists: bool, status_code: int, error: str)
+    """
+    if not act_num or act_num.strip() == "":
+        return act_num, False, None, "Empty act_num"
+
+    pdf_url = base_url + quote(f"{act_num}.pdf")
+    headers = None
+    if etags is not None and act_num in etags:
+        headers = {"If-None-Match": etags[act_num]}
+    result = (act_num, False, None, "Max retries exceeded")
+    for attempt in range(max_retries):
+        start = await controller.acquire_async() if controller is not None else None
+        outcome, retry_after = FAILED, None
+        try:
+            async with client.head(pdf_url, allow_redirects=True, headers=headers) as response:
+                if etags is not None and "ETag" in response.headers:
+                    etags[act_num] = response.headers["ETag"]
+                result = result_for_status(act_num, response.status)
+                if response.status in THROTTLE_STATUSES:
+                    outcome, retry_after = THROTTLED, retry_after_seconds(response.headers)
+                else:
+                    outcome = SUCCESS
+        except asyncio.TimeoutError:
+            result = (act_num, False, None, "Timeout")
+        except aiohttp.ClientError as e:
+            result = (act_num, False, None, f"Request error: {str(e)}")
+        finally:
+            if controller is not None:
+                controller.release(start, outcome, retry_after)
+        if outcome == SUCCESS or attempt == max_retries - 1:
+            break
+        if controller is not None:
+            await asyncio.sleep(controller.backoff(attempt, retry_after))
+        else:
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+    return result
+
+
+async def _check_all(act_nums, base_url, on_result, workers, timeout, max_retries, headers, etags, controller):
+    connector = aiohttp.TCPConnector(limit=workers, ttl_dns_cache=300)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout, headers=headers) as client:
+        # a fixed set of workers pulls from one iterator, so only
+        # `workers` act_nums are pending at any time
+        pending = iter(act_nums)
+
+        async def worker():
+            for act_num in pending:
+                on_result(
+                    await check_pdf_url_exists_async(client, base_url, act_num, max_retries, etags, controller)
+                )
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+
+def check_pdf_urls(
+    act_nums,
+    base_url,
+    on_result,
+    max_in_flight=512,
+    timeout=5,
+    max_retries=2,
+    headers=None,
+    etags=None,
+    controller=None,
+):
+    """
+    HEAD-check many act_nums concurrently on one event loop.
+
+    Connections are pooled and kept alive across requests. With a
+    controller, concurrency adapts between its minimum and maximum and its
+    `max_retries` applies; otherwise `max_in_flight` requests run at once.
+    `etags` is read and updated as in check_pdf_url_exists_async, before
+    `on_result` is called.
+
+    Args:
+        act_nums (iterable): act_num values to check
+        base_url (str): URL prefix the quoted `{act_num}.pdf` is appended to
+        on_result (callable): Called with each result tuple as it completes
+        max_in_flight (int): Maximum number of concurrent requests without a controller
+        timeout (float): Request timeout in seconds
+        max_retries (int): Maximum number of attempts per act_num without a controller
+        headers (dict): Extra request headers, optional
+        etags (dict): act_num -> ETag for conditional requests, optional
+        controller (AdaptiveConcurrency): Shared concurrency controller, optional
+    """
+    workers = max_in_flight
+    if controller is not None:
+        workers, max_retries = controller.maximum, controller.max_retries
+    asyncio.run(
+        _check_all(act_nums, base_url, on_result, workers, timeout, max_retries, headers, etags, controller)
+    )
+
+
+def list_blobs(session, container_url, prefix, page_size=LIST_PAGE_SIZE):
+    """
+    List every blob name and ETag under a prefix with the List Blobs REST API.
+
+    Pages are followed with the NextMarker the service returns. The
+    container must allow anonymous listing (public access level
+    "container"); otherwise the service answers 403 or 404 and
+    requests.HTTPError is raised.
+
+    Args:
+        session (requests.Session): Session to send the requests with
+        container_url (str): Container URL, e.g. https://<account>.blob.core.windows.net/raw-data/
+        prefix (str): Only names starting with this are listed
+        page_size (int): Names per request, at most 5000
+
+    Yields:
+        tuple: (blob name, ETag), in the service's (lexicographic) name order
+    """
+    marker = ""
+    while True:
+        params = {"restype": "container", "comp": "list", "prefix": prefix, "maxresults": page_size}
+        if marker:
+            params["marker"] = marker
+        response = session.get(container_url, params=params, timeout=30)
+        response.raise_for_status()
+        root = ET.fromstring(response.content)
+        for blob in root.iterfind("Blobs/Blob"):
+            yield blob.findtext("Name"), blob.findtext("Properties/Etag")
+        marker = root.findtext("NextMarker") or ""
+        if not marker:
+            return
+
+
+def check_by_listing(act_nums, blob_names):
+    """
+    Resolve act_nums against a set of listed blob names.
+
+    Gives the same results as a HEAD check that answers 200 or 404.
+
+    Args:
+        act_nums (iterable): act_num values to check
+        blob_names (set or dict): Existing blob names
+
+    Yields:
+        tuple: (act_num: str, exists: bool, status_code: int, error: str)
+    """
+    for act_num in act_nums:
+        if not act_num or act_num.strip() == "":
+            yield act_num, False, None, "Empty act_num"
+        elif f"{act_num}.pdf" in blob_names:
+            yield result_for_status(act_num, 200)
+        else:
+            yield result_for_status(act_num, 404)
@@ -0,0 +1,233 @@
+import asyncio
+import random
+import time
+from collections import deque
+from threading import Condition
+
+# outcomes reported to AdaptiveConcurrency.release
+SUCCESS = "success"
+THROTTLED = "throttled"
+FAILED = "failed"
+# an error answer that says nothing about load (e.g. 404, 409, 413)
+IGNORED = "ignored"
+
+# HTTP statuses that mean "slow down" rather than "no such thing"
+THROTTLE_STATUSES = (429, 503)
+
+
+def retry_after_seconds(headers):
+    """
+    Read the server-provided retry delay from throttling response headers.
+
+    Args:
+        headers (Mapping): Response headers
+
+    Returns:
+        float: Seconds to wait, or None if the server gave no hint
+    """
+    if not headers:
+        return None
+    for name, scale in (("x-ms-retry-after-ms", 1000.0), ("Retry-After", 1.0)):
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value) / scale
+            except ValueError:
+                pass
+    return None
+
+
+def backoff_delay(attempt, retry_after=None, base_delay=0.1, max_delay=30.0, rng=random):
+    """
+    Delay before retry number `attempt` (0-based).
+
+    A server hint wins; otherwise the delay is drawn uniformly between zero
+    and an exponentially growing cap ("full jitter"), so clients that failed
+    together do not retry together.
+
+    Args:
+        attempt (int): Number of the failed attempt, starting at 0
+        retry_after (float): Server-provided delay in seconds, optional
+        base_delay (float): Cap of the first retry in seconds
+        max_delay (float): Largest cap in seconds
+        rng: Random source with uniform()
+
+    Returns:
+        float: Seconds to wait
+    """
+    if retry_after is not None:
+        return retry_after
+    return rng.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit for one remote service, tuned by AIMD.
+
+    Each request takes a slot with `acquire` (threads) or `acquire_async`
+    (asyncio) and reports how it went with `release`. A success raises the
+    limit by `increase` per limit's worth of successes, as long as its
+    latency stays within `latency_tolerance` times the fastest seen;
+    slower successes hold the limit. A throttled (429/503) or failed
+    request multiplies the limit by `decrease`, at most once per request
+    latency so a burst of failures counts as one signal. A Retry-After
+    hint pauses every new request until it has passed.
+
+    The retry policy (`max_retries`, `backoff`) lives here too so every
+    caller of a service backs off the same way.
+    """
+
+    def __init__(
+        self,
+        initial=8,
+        minimum=1,
+        maximum=64,
+        increase=1.0,
+        decrease=0.5,
+        latency_tolerance=3.0,
+        max_retries=6,
+        base_delay=0.1,
+        max_delay=30.0,
+        seed=None,
+    ):
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.pause_until = 0.0
+        self.min_latency = None
+        self.peak_limit = self.limit
+        self.successes = 0
+        self.throttled = 0
+        self.failed = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._random = random.Random(seed)
+        self._cond = Condition()
+        # (event loop, future) of coroutines waiting in acquire_async
+        self._waiters = deque()
+
+    def _try_acquire(self, now):
+        if now < self.pause_until or self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        return True
+
+    def acquire(self):
+        """
+        Wait for a free slot.
+
+        Returns:
+            float: Start time to pass to release
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._try_acquire(now):
+                    return now
+                self._cond.wait(self.pause_until - now if now < self.pause_until else None)
+
+    async def acquire_async(self):
+        """
+        Wait for a free slot without blocking the event loop.
+
+        A waiting coroutine sleeps on a future that `release` resolves from
+        whichever thread frees a slot, or until a Retry-After pause ends.
+
+        Returns:
+            float: Start time to pass to release
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                if self._try_acquire(now):
+                    return now
+                timeout = self.pause_until - now if now < self.pause_until else None
+                waiter = (loop, loop.create_future())
+                self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                with self._cond:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    else:
+                        # the slot this waiter was woken for goes to the next one
+                        self._wake_async()
+                raise
+            with self._cond:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def _wake_async(self):
+        """Wake as many acquire_async waiters as there are free slots; call with the lock held."""
+        free = int(self.limit) - self.in_flight
+        while self._waiters and free > 0:
+            loop, future = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # the waiter's loop is closed
+                continue
+            free -= 1
+
+    def release(self, start, outcome, retry_after=None):
+        """
+        Free a slot and adjust the limit.
+
+        Args:
+            start (float): Value returned by acquire/acquire_async
+            outcome (str): SUCCESS, THROTTLED, FAILED or IGNORED
+            retry_after (float): Server-provided delay in seconds, optional
+        """
+        now = time.monotonic()
+        latency = now - start
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == IGNORED:
+                pass
+            elif outcome == SUCCESS:
+                self.successes += 1
+                if self.min_latency is None or latency < self.min_latency:
+                    self.min_latency = latency
+                if latency <= max(self.min_latency, 0.001) * self.latency_tolerance:
+                    self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+                    self.peak_limit = max(self.peak_limit, self.limit)
+            else:
+                if outcome == THROTTLED:
+                    self.throttled += 1
+                else:
+                    self.failed += 1
+                if now - self._last_decrease >= latency:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+                    self.decreases += 1
+                if retry_after:
+                    self.pause_until = max(self.pause_until, now + retry_after)
+            self._cond.notify_all()
+            self._wake_async()
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before retry number `attempt`, see backoff_delay."""
+        return backoff_delay(attempt, retry_after, self.base_delay, self.max_delay, self._random)
+
+    def summary(self):
+        return (
+            f"concurrency {int(self.limit)} (peak {int(self.peak_limit)}, max {self.maximum}), "
+            f"{self.successes} ok, {self.throttled} throttled, {self.failed} failed, "
+            f"{self.decreases} decreases"
+        )
@@ -0,0 +1,323 @@
+import gc
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from os.path import abspath, dirname, join
+from act_nums import KeyStats
+from alive_progress import config_handler
+from dotenv import load_dotenv
+import verify_data
+import verify_uploaded_raw_pdfs
+from classification import ClassificationIndex, load_classification
+from clean_dataset import dataset_dir_for, dataset_partitions, read_dataset, update_dataset
+from cosmos_uploader import UploadJournal, assemble_batches, stream_limits, upload_stream
+from delta_sync import plan_sync, sync_operations
+from pdf_cache import PdfExistenceCache
+from rate_control import AdaptiveConcurrency
+from storage import open_container
+from upload_data import build_operations
+
+# every column one of the stages reads, so each file is loaded once
+COLUMNS = list(dict.fromkeys(verify_data.COLUMNS + ["original_act_num"]))
+
+STAGES = ("verify", "pdfs", "upload")
+
+# item fields sent to Cosmos DB, as in upload_data.py
+KEYS_TO_UPLOAD = ["id", "act_num", "year", "state", "name", "link", "search_keys"]
+
+
+def run():
+    load_dotenv()
+
+    # Get the directory where the script is located
+    script_dir = dirname(abspath(__file__))
+
+    ## states and years to release, None for all; only their partitions are read
+    states = ["MN"]
+    years = None
+    ## stages to run over every file, in any combination of STAGES
+    stages = ["verify", "pdfs", "upload"]
+    ## "upload" upserts every row, "sync" only writes items that changed and
+    ## deletes items of the released partitions that are no longer in the CSV,
+    ## "prepare" builds the payloads without connecting to Cosmos DB
+    mode = "upload"
+    ## "cosmos" writes to the Cosmos DB account in .env, "local" to a SQLite
+    ## mirror of the container under data/.cache/ (no network, no RUs)
+    backend = "cosmos"
+    ## files loaded ahead of the ones whose PDF check and upload are still running;
+    ## each one held costs a file's worth of memory
+    lookahead = 1
+    ## batches in flight start at max_in_flight and adapt up to max_in_flight_limit
+    max_in_flight = 8
+    max_in_flight_limit = 32
+    ## rough memory budget for the queued upload batches
+    memory_budget_mb = 1024
+    chunk_rows, max_queued = stream_limits(memory_budget_mb)
+
+    container = None
+    journal = None
+    if "upload" in stages and mode != "prepare":
+        CONTAINER_NAME = "leginfo_clean"
+        container, COSMOS_DB_NAME = open_container(
+            backend, CONTAINER_NAME, local_path=join(script_dir, f"../data/.cache/{CONTAINER_NAME}.sqlite")
+        )
+        if mode == "upload":
+            # the same journal as upload_data.py, so either one resumes the other
+            journal = UploadJournal(
+                join(script_dir, f"../data/.cache/upload_journal_{COSMOS_DB_NAME}_{CONTAINER_NAME}.jsonl")
+            )
+            print(f"Upload journal: {journal.path} ({len(journal)} chunks already uploaded)")
+
+    pdf_cache = None
+    if "pdfs" in stages and verify_uploaded_raw_pdfs.PDF_CACHE_TTL_DAYS is not None:
+        pdf_cache = PdfExistenceCache(
+            join(script_dir, "../data/.cache/pdf_existence.sqlite"),
+            ttl_seconds=verify_uploaded_raw_pdfs.PDF_CACHE_TTL_DAYS * 24 * 3600,
+        )
+        print(f"PDF existence cache: {pdf_cache.path} ({len(pdf_cache)} act_nums)")
+
+    print("Preparing classification results...")
+    classification_path = join(script_dir, "../data/classification_results.csv")
+    load_classification(classification_path, states=[])
+    print("--------------------------------")
+
+    clean_data_dir = join(script_dir, "../data/clean-data")
+    dataset_dir = dataset_dir_for(clean_data_dir)
+    manifest = update_dataset(clean_data_dir, dataset_dir)
+
+    # stages run side by side, so their progress bars would draw over each other
+    config_handler.set_global(disable=True)
+    try:
+        release(
+            dataset_dir,
+            manifest,
+            list(manifest["sources"]),
+            classification_path,
+            stages,
+            states=states,
+            years=years,
+            container=container,
+            mode=mode,
+            journal=journal,
+            pdf_cache=pdf_cache,
+            pdf_controller=verify_uploaded_raw_pdfs.new_controller(),
+            upload_controller=AdaptiveConcurrency(initial=max_in_flight, maximum=max_in_flight_limit),
+            output_dir=join(script_dir, "missing_pdfs_output"),
+            chunk_rows=chunk_rows,
+            max_queued=max_queued,
+            lookahead=lookahead,
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+        if pdf_cache is not None:
+            pdf_cache.close()
+        verify_uploaded_raw_pdfs.session.close()
+
+
+def release(
+    dataset_dir,
+    manifest,
+    files,
+    classification_path,
+    stages=STAGES,
+    states=None,
+    years=None,
+    container=None,
+    mode="upload",
+    journal=None,
+    pdf_cache=None,
+    pdf_controller=None,
+    upload_controller=None,
+    output_dir="missing_pdfs_output",
+    chunk_rows=50_000,
+    max_queued=None,
+    keys_to_upload=KEYS_TO_UPLOAD,
+    lookahead=1,
+):
+    """
+    Verify, PDF-check and upload clean-data files, reading each file once.
+
+    Each file is read from the Parquet dataset and its classification
+    index is built once. The verify counters are computed on the calling
+    thread, while the PDF check and the upload of a file run on one
+    thread each, so they wait on the network while the next file is read
+    and verified. At most `lookahead` files are read ahead of the oldest
+    one whose stages are still running. Verify reports are printed as
+    files are read, PDF and upload reports as their stages finish.
+
+    Args:
+        dataset_dir (str): Clean-data Parquet dataset directory
+        manifest (dict): Dataset manifest, see clean_dataset.update_dataset
+        files (list): CSV names to release
+        classification_path (str): Path to classification_results.csv
+        stages (iterable): Any of "verify", "pdfs" and "upload"
+        states (iterable): State codes to release, or None for all
+        years (iterable): Years to release, or None for all
+        container: Cosmos container client (or a stand-in), not needed in "prepare" mode
+        mode (str): "upload", "sync" or "prepare", see upload_data.py
+        journal (UploadJournal): Checkpoint journal for "upload" mode, optional
+        pdf_cache (PdfExistenceCache): Cache of earlier PDF results, optional
+        pdf_controller (AdaptiveConcurrency): Concurrency controller for HEAD requests
+        upload_controller (AdaptiveConcurrency): Concurrency controller for batches
+        output_dir (str): Directory for the PDF outcome files
+        chunk_rows (int): Rows turned into payloads at a time
+        max_queued (int): Maximum upload batches held in memory
+        keys_to_upload (list): Item fields to send
+        lookahead (int): Files read ahead of the stages still running
+
+    Returns:
+        dict: Per CSV name, the verify report, the PDF ResultSink (closed)
+        and the UploadStats (or prepared item count) of the stages that ran
+    """
+    pdf_controller = pdf_controller or verify_uploaded_raw_pdfs.new_controller()
+    results = {}
+    timings = dict.fromkeys(["load", "verify"], 0.0)
+
+    with ThreadPoolExecutor(max_workers=1) as pdf_stage, ThreadPoolExecutor(max_workers=1) as upload_stage:
+        pending = deque()
+
+        def finish_oldest():
+            file, futures = pending.popleft()
+            for stage, future in futures.items():
+                results[file][stage] = future.result()
+
+        for i, file in enumerate(files):
+            partitions = dataset_partitions(manifest, states, years, sources=[file])
+            if not partitions:
+                continue
+            state_code = file.split("_")[0]
+            print(f"\nProcessing {file} [{state_code}] ({i+1}/{len(files)})")
+
+            start = time.perf_counter()
+            df = read_dataset(dataset_dir, manifest, COLUMNS, states=states, years=years, sources=[file])
+            classification_index = None
+            if "verify" in stages or "upload" in stages:
+                classification_index = ClassificationIndex.from_csv(
+                    classification_path,
+                    states=sorted({p["state"] for p in partitions if p["state"] is not None}),
+                    years=years,
+                )
+            timings["load"] += time.perf_counter() - start
+            results[file] = {}
+
+            futures = {}
+            if "pdfs" in stages:
+                futures["pdfs"] = pdf_stage.submit(
+                    verify_uploaded_raw_pdfs.check_file,
+                    file,
+                    state_code,
+                    df[["act_num"]] if "act_num" in df.columns else df,
+                    pdf_cache,
+                    pdf_controller,
+                    output_dir,
+                )
+            if "upload" in stages:
+                futures["upload"] = upload_stage.submit(
+                    upload_file,
+                    file,
+                    df,
+                    classification_index,
+                    container,
+                    mode,
+                    journal,
+                    upload_controller,
+                    chunk_rows,
+                    max_queued,
+                    keys_to_upload,
+                )
+
+            if "verify" in stages:
+                start = time.perf_counter()
+                report = {
+                    "total_rows": len(df),
+                    "name_missing": "name" not in df.columns,
+                    "csv": verify_data.check_csv(df),
+                    "classification": verify_data.check_classification(df, classification_index),
+                }
+                timings["verify"] += time.perf_counter() - start
+                results[file]["verify"] = report
+                verify_data.print_report(report)
+
+            del df, classification_index
+            pending.append((file, futures))
+            while len(pending) > lookahead:
+                finish_oldest()
+            gc.collect()
+
+        while pending:
+            finish_oldest()
+
+    print(f"Reading and indexing: {timings['load']:.1f}s, verify counters: {timings['verify']:.1f}s")
+    return results
+
+
+def upload_file(
+    file,
+    df,
+    classification_index,
+    container,
+    mode,
+    journal,
+    controller,
+    chunk_rows,
+    max_queued,
+    keys_to_upload,
+):
+    """
+    Upload one file's rows the way upload_data.py does, from an already loaded frame.
+
+    Args:
+        file (str): CSV name, the journal source
+        df (DataFrame): Normalized clean data with state, year, original_act_num, link and name
+        classification_index (ClassificationIndex): Resolved classification records
+        container: Cosmos container client (or a stand-in), not needed in "prepare" mode
+        mode (str): "upload", "sync" or "prepare"
+        journal (UploadJournal): Checkpoint journal for "upload" mode, optional
+        controller (AdaptiveConcurrency): Concurrency controller for batches, optional
+        chunk_rows (int): Rows turned into payloads at a time
+        max_queued (int): Maximum batches held in memory
+        keys_to_upload (list): Item fields to send
+
+    Returns:
+        UploadStats: Upload counters, or the number of prepared items in "prepare" mode
+    """
+
+    key_stats = KeyStats()
+
+    def operations(key_stats=None):
+        chunks = (df.iloc[start:start + chunk_rows] for start in range(0, len(df), chunk_rows))
+        return build_operations(chunks, classification_index, keys_to_upload, key_stats)
+
+    if mode == "prepare":
+        items = sum(len(batch) for _, _, batch in assemble_batches(operations(key_stats)))
+        print(f"[{file}] Prepared {items} items")
+        print(f"[{file}] Keys: {key_stats.summary()}")
+        return items
+
+    file_operations = operations(key_stats)
+    if mode == "sync":
+        # first pass diffs content hashes, second pass sends only the changes
+        # partitions are read with as many requests in flight as the batches,
+        # like upload_data.py does with max_in_flight
+        max_in_flight = int(controller.limit) if controller is not None else 8
+        plan = plan_sync(container, file_operations, max_in_flight=max_in_flight)
+        print(f"[{file}] Sync plan: {plan.summary()}")
+        file_operations = sync_operations(operations(), plan)
+        # a rerun recomputes the diff, so the journal is not needed
+        journal = None
+    stats = upload_stream(
+        container,
+        assemble_batches(file_operations),
+        max_queued=max_queued,
+        journal=journal,
+        source=file,
+        controller=controller,
+    )
+    print(f"[{file}] Uploaded {stats.summary()}")
+    print(f"[{file}] Keys: {key_stats.summary()}")
+    return stats
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,152 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Per-row parse status
+OK = 0
+EMPTY = 1
+BAD_FORMAT = 2
+
+# Below this many values a process pool costs more than it saves
+PARALLEL_THRESHOLD = 100_000
+
+
+def parse_search_keys(value):
+    """
+    Parse a uni_bigrams_word_counts value into its token -> count mapping.
+
+    Args:
+        value (str): Python-dict-like string, e.g. "{'water': 3}"
+
+    Returns:
+        dict: Parsed mapping
+
+    Raises:
+        ValueError: If the value is not a JSON-like mapping
+    """
+    parsed = json.loads(value.replace("'", '"'))
+    if not isinstance(parsed, dict):
+        raise ValueError(f"search keys are not a mapping: {value[:50]}")
+    return parsed
+
+
+def _parse_chunk(values):
+    """
+    Parse a chunk of values against a chunk-local vocabulary.
+
+    Returns:
+        tuple: (vocabulary list, token ids, offsets, status) for the chunk
+    """
+    vocabulary = {}
+    ids = []
+    offsets = [0]
+    status = []
+    for value in values:
+        if not isinstance(value, str) or value in ("{}", ""):
+            status.append(EMPTY)
+        else:
+            try:
+                parsed = parse_search_keys(value)
+            except ValueError:
+                status.append(BAD_FORMAT)
+            else:
+                status.append(OK)
+                for token in parsed:
+                    ids.append(vocabulary.setdefault(token, len(vocabulary)))
+        offsets.append(len(ids))
+    return (
+        list(vocabulary),
+        np.asarray(ids, dtype=np.int32),
+        np.asarray(offsets, dtype=np.int64),
+        np.asarray(status, dtype=np.int8),
+    )
+
+
+class SearchKeyStore:
+    """
+    Search keys for many acts with an interned vocabulary.
+
+    Every distinct token is stored once in `tokens`. The keys of row i are
+    `tokens[ids[offsets[i]:offsets[i + 1]]]`, in the order they appear in the
+    source value. `status[i]` records whether the value was OK, EMPTY or
+    BAD_FORMAT.
+    """
+
+    def __init__(self, tokens, ids, offsets, status):
+        self.tokens = tokens
+        self.ids = ids
+        self.offsets = offsets
+        self.status = status
+
+    @classmethod
+    def build(cls, values, workers=None, chunk_size=50_000):
+        """
+        Parse raw uni_bigrams_word_counts values into a store.
+
+        Args:
+            values (sequence): Raw values, one per row; NaN/None count as empty
+            workers (int): Processes to parse with, defaults to the CPU count
+            chunk_size (int): Values per parse task
+
+        Returns:
+            SearchKeyStore: Store with one row per value, in input order
+        """
+        values = list(values)
+        chunks = [values[i : i + chunk_size] for i in range(0, len(values), chunk_size)]
+        workers = workers or os.cpu_count() or 1
+
+        if workers > 1 and len(values) >= PARALLEL_THRESHOLD:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parsed = list(executor.map(_parse_chunk, chunks))
+        else:
+            parsed = [_parse_chunk(chunk) for chunk in chunks]
+
+        # remap chunk-local ids onto one global token table
+        token_ids = {}
+        all_ids = []
+        all_offsets = [np.zeros(1, dtype=np.int64)]
+        all_status = []
+        total = 0
+        for vocabulary, ids, offsets, status in parsed:
+            remap = np.fromiter(
+                (token_ids.setdefault(token, len(token_ids)) for token in vocabulary),
+                dtype=np.int32,
+                count=len(vocabulary),
+            )
+            all_ids.append(remap[ids])
+            all_offsets.append(offsets[1:] + total)
+            all_status.append(status)
+            total += len(ids)
+
+        return cls(
+            list(token_ids),
+            np.concatenate(all_ids) if all_ids else np.zeros(0, dtype=np.int32),
+            np.concatenate(all_offsets),
+            np.concatenate(all_status) if all_status else np.zeros(0, dtype=np.int8),
+        )
+
+    def __len__(self):
+        return len(self.status)
+
+    def keys(self, row):
+        """
+        Materialize the search keys for one row.
+
+        Args:
+            row (int): Row position
+
+        Returns:
+            list: Token strings, empty for EMPTY or BAD_FORMAT rows
+        """
+        tokens = self.tokens
+        return [tokens[i] for i in self.ids[self.offsets[row] : self.offsets[row + 1]]]
+
+    def key_counts(self):
+        """Return the number of keys per row as an array."""
+        return np.diff(self.offsets)
+
+    def nbytes(self):
+        """Approximate memory held by the id arrays and token table."""
+        token_bytes = sum(len(token) for token in self.tokens)
+        return self.ids.nbytes + self.offsets.nbytes + self.status.nbytes + token_bytes
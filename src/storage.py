@@ -0,0 +1,311 @@
+import json
+import os
+import re
+import sqlite3
+from os import environ
+from os.path import dirname
+from threading import Lock
+from azure.core.utils import CaseInsensitiveDict
+from azure.cosmos import CosmosClient, CosmosList
+from azure.cosmos.exceptions import CosmosBatchOperationError
+
+QUERY_PATTERN = re.compile(
+    r"^\s*SELECT\s+(?P<fields>\*|c\.\w+(?:\s*,\s*c\.\w+)*)\s+FROM\s+c"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+CONDITION_PATTERN = re.compile(
+    r"^\s*(?:CONTAINS\(\s*c\.(?P<contains_field>\w+)\s*,\s*(?P<contains_value>'(?:[^'\\]|\\.)*'|@\w+)\s*\)"
+    r"|c\.(?P<eq_field>\w+)\s*=\s*(?P<eq_value>'(?:[^'\\]|\\.)*'|-?\d+|@\w+))\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# item fields stored in their own indexed columns by SqliteContainer
+INDEXED_FIELDS = ["id", "state", "year", "act_num"]
+
+
+def _literal(token, parameters):
+    if token.startswith("@"):
+        return parameters[token]
+    if token.startswith("'"):
+        return token[1:-1].encode("latin-1", "backslashreplace").decode("unicode_escape")
+    return int(token)
+
+
+def parse_conditions(query, parameters=None):
+    """
+    Parse the Cosmos SQL subset the local containers understand.
+
+    Supported: `SELECT *` or `SELECT c.a, c.b` from `c`, with an optional
+    WHERE clause of `CONTAINS(c.field, 'text')` and `c.field = value`
+    conditions joined by AND. Values may be string or integer literals or
+    @parameters.
+
+    Args:
+        query (str): SQL text
+        parameters (list): [{"name": "@p", "value": ...}] query parameters
+
+    Returns:
+        tuple: (list of projected fields or None for *, list of
+        ("contains" or "equals", field, value) conditions)
+    """
+    match = QUERY_PATTERN.match(query)
+    if not match:
+        raise ValueError(f"Unsupported query: {query}")
+    parameters = {p["name"]: p["value"] for p in parameters or []}
+    fields = None
+    if match.group("fields") != "*":
+        fields = [field.strip()[2:] for field in match.group("fields").split(",")]
+
+    conditions = []
+    where = match.group("where")
+    for clause in re.split(r"\s+AND\s+", where, flags=re.IGNORECASE) if where else []:
+        condition = CONDITION_PATTERN.match(clause)
+        if not condition:
+            raise ValueError(f"Unsupported condition: {clause}")
+        if condition.group("contains_field"):
+            field = condition.group("contains_field")
+            conditions.append(("contains", field, _literal(condition.group("contains_value"), parameters)))
+        else:
+            field = condition.group("eq_field")
+            conditions.append(("equals", field, _literal(condition.group("eq_value"), parameters)))
+    return fields, conditions
+
+
+def parse_query(query, parameters=None):
+    """
+    Parse a query of the supported subset into a projection and a predicate.
+
+    Args:
+        query (str): SQL text
+        parameters (list): [{"name": "@p", "value": ...}] query parameters
+
+    Returns:
+        tuple: (list of projected fields or None for *, predicate callable)
+    """
+    fields, conditions = parse_conditions(query, parameters)
+    predicates = []
+    for kind, field, value in conditions:
+        if kind == "contains":
+            predicates.append(lambda item, f=field, v=value: isinstance(item.get(f), str) and v in item[f])
+        else:
+            predicates.append(lambda item, f=field, v=value: item.get(f) == v)
+    return fields, lambda item: all(predicate(item) for predicate in predicates)
+
+
+def _partition_key(partition_key):
+    return tuple(partition_key) if isinstance(partition_key, (list, tuple)) else (partition_key,)
+
+
+class SqliteItemPaged:
+    """
+    Query results read lazily from SQLite, also page by page like the SDK's ItemPaged.
+
+    Results are ordered by item id and a continuation token is the last id
+    returned, so a query reopened with a token resumes after that item.
+    """
+
+    def __init__(self, container, sql, params, fields, page_size=None):
+        self.container = container
+        self.sql = sql
+        self.params = params
+        self.fields = fields
+        self.page_size = page_size or 1000
+
+    def _rows(self, after, limit):
+        sql = self.sql
+        params = list(self.params)
+        if after is not None:
+            sql += " AND id > ?"
+            params.append(after)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = self.container._execute(sql, params)
+        items = []
+        for item_id, body in rows:
+            item = json.loads(body)
+            items.append(item if self.fields is None else {f: item[f] for f in self.fields if f in item})
+        return [row[0] for row in rows], items
+
+    def __iter__(self):
+        _, items = self._rows(None, None)
+        return iter(items)
+
+    def by_page(self, continuation_token=None):
+        return SqlitePager(self, continuation_token)
+
+
+class SqlitePager:
+    """Iterator of result pages returned by SqliteItemPaged.by_page."""
+
+    def __init__(self, results, continuation_token):
+        self.results = results
+        self.continuation_token = continuation_token
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        ids, page = self.results._rows(self.continuation_token, self.results.page_size)
+        if len(page) < self.results.page_size:
+            self.continuation_token = None
+            self._done = True
+        else:
+            self.continuation_token = ids[-1]
+        return iter(page)
+
+
+class SqliteContainer:
+    """
+    Container client backed by a local SQLite file, a mirror of leginfo_clean.
+
+    Implements the part of the Cosmos container client the scripts use:
+    transactional `execute_item_batch` with create/upsert/replace/delete
+    operations scoped to one partition key, and `query_items` for the SQL
+    subset of `parse_conditions`, optionally scoped to a partition key and
+    read page by page. Items are stored as JSON with id, state, year and
+    act_num in indexed columns, so partition-scoped queries and lookups by
+    act_num do not scan the table. Requests cost no RUs; responses report 0.
+
+    The file can also be queried directly, e.g.
+    `SELECT state, year, COUNT(*) FROM items GROUP BY state, year`.
+    """
+
+    def __init__(self, path):
+        os.makedirs(dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # upload_stream sends batches from worker threads; SQLite serializes writes anyway
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                state TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                id TEXT NOT NULL,
+                act_num TEXT,
+                body TEXT NOT NULL,
+                PRIMARY KEY (state, year, id)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS items_act_num ON items (act_num)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS items_year ON items (year)")
+        self._conn.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def __len__(self):
+        return self._execute("SELECT COUNT(*) FROM items")[0][0]
+
+    def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        state, year = _partition_key(partition_key)
+        results = []
+        with self._lock:
+            try:
+                for index, (operation, args, _) in enumerate(batch_operations):
+                    # (item,) for create/upsert, (id, item) for replace, (id,) for delete
+                    item = args[-1]
+                    item_id = args[0] if isinstance(args[0], str) else args[0]["id"]
+                    key = (state, year, item_id)
+                    status = 200
+                    exists = operation == "upsert" or self._conn.execute(
+                        "SELECT 1 FROM items WHERE state = ? AND year = ? AND id = ?", key
+                    ).fetchone() is not None
+                    if operation == "create":
+                        status = 409 if exists else 201
+                    elif operation in ("replace", "delete") and not exists:
+                        status = 404
+                    if status >= 400:
+                        raise CosmosBatchOperationError(
+                            error_index=index,
+                            headers={"x-ms-request-charge": "0"},
+                            status_code=status,
+                            message=f"Batch operation {index} ({operation}) failed with {status}",
+                            operation_responses=[{"statusCode": status}],
+                        )
+                    if operation == "delete":
+                        self._conn.execute("DELETE FROM items WHERE state = ? AND year = ? AND id = ?", key)
+                        status = 204
+                    else:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)",
+                            (state, year, item_id, item.get("act_num"), json.dumps(item)),
+                        )
+                    results.append({"statusCode": status, "requestCharge": 0.0})
+            except Exception:
+                # transactional like a Cosmos batch: nothing is applied on failure
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+        return CosmosList(results, response_headers=CaseInsensitiveDict({"x-ms-request-charge": "0"}))
+
+    def query_items(
+        self,
+        query,
+        parameters=None,
+        partition_key=None,
+        enable_cross_partition_query=False,
+        max_item_count=None,
+        **kwargs,
+    ):
+        """
+        Run a query from the supported subset, optionally scoped to one partition key.
+
+        Conditions on id, state, year and act_num use their indexed columns,
+        others the stored JSON.
+
+        Returns:
+            SqliteItemPaged: Matching items, projected to the selected fields
+        """
+        fields, conditions = parse_conditions(query, parameters)
+        clauses = ["1 = 1"]
+        params = []
+        if partition_key is not None:
+            clauses.append("state = ? AND year = ?")
+            params.extend(_partition_key(partition_key))
+        for kind, field, value in conditions:
+            column = field if field in INDEXED_FIELDS else f"json_extract(body, '$.{field}')"
+            if kind == "contains":
+                clauses.append(f"(typeof({column}) = 'text' AND instr({column}, ?) > 0)")
+            else:
+                clauses.append(f"{column} = ?")
+            params.append(value)
+        sql = f"SELECT id, body FROM items WHERE {' AND '.join(clauses)}"
+        return SqliteItemPaged(self, sql, params, fields, max_item_count)
+
+    def close(self):
+        self._conn.close()
+
+
+def open_container(backend, container_name, local_path=None):
+    """
+    Open the container the scripts write to and read from.
+
+    Args:
+        backend (str): "cosmos" for the Azure Cosmos DB account in the
+            environment (ACCOUNT_URI, ACCOUNT_KEY, COSMOS_DB_NAME), or
+            "local" for a SQLite mirror
+        container_name (str): Container name, e.g. "leginfo_clean"
+        local_path (str): SQLite file of the "local" backend
+
+    Returns:
+        tuple: (container client, name of the database, used to name
+        journals and checkpoints)
+    """
+    if backend == "local":
+        return SqliteContainer(local_path), "local"
+    if backend != "cosmos":
+        raise ValueError(f"Unknown storage backend: {backend}")
+    client = CosmosClient(environ["ACCOUNT_URI"], credential=environ["ACCOUNT_KEY"])
+    database_name = environ["COSMOS_DB_NAME"]
+    return client.get_database_client(database_name).get_container_client(container_name), database_name
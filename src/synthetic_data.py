@@ -0,0 +1,159 @@
+import argparse
+import csv
+import random
+from os import makedirs
+from os.path import join
+
+STATES = ["GA", "IA", "KS", "MI", "MN", "MO", "NM", "NY", "NC", "OR", "PA", "WV", "WY"]
+
+VOCABULARY = [
+    "water", "soil", "farm", "crop", "tax", "credit", "livestock", "dairy",
+    "grain", "forest", "conservation", "pesticide", "irrigation", "rural",
+    "broadband", "energy", "ethanol", "land", "lease", "drainage", "wetland",
+    "nutrient", "manure", "seed", "hemp", "loan", "insurance", "disaster",
+]
+
+
+def make_search_keys(rng, size):
+    """
+    Build a uni_bigrams_word_counts value in the Python-dict-like format.
+
+    Args:
+        rng (Random): Random generator
+        size (int): Number of tokens
+
+    Returns:
+        str: Mapping of token to count, e.g. "{'water': 3, 'farm bill': 1}"
+    """
+    tokens = set()
+    while len(tokens) < size:
+        words = rng.sample(VOCABULARY, rng.choice((1, 2)))
+        tokens.add(" ".join(words))
+    return "{" + ", ".join(f"'{t}': {rng.randint(1, 9)}" for t in tokens) + "}"
+
+
+def parse_years(text):
+    """
+    Parse a year range like "2000-2023" or a list like "2019,2021".
+
+    Args:
+        text (str): Range or comma-separated years
+
+    Returns:
+        list: Years as ints
+    """
+    if "-" in text:
+        first, last = text.split("-")
+        return list(range(int(first), int(last) + 1))
+    return [int(year) for year in text.split(",")]
+
+
+def generate(
+    output_dir,
+    rows,
+    states=("MN",),
+    years=range(2000, 2024),
+    search_keys_size=20,
+    anomaly_rate=0.01,
+    seed=0,
+):
+    """
+    Write synthetic clean-data CSVs and a matching classification_results.csv.
+
+    Rows are spread evenly over states. A fraction `anomaly_rate` of rows gets
+    one of the issues verify_data.py looks for: bad year, missing link, bad
+    act_num prefix, duplicate act_num, missing classification, conflicting
+    classification or empty search keys.
+
+    Args:
+        output_dir (str): Directory that receives clean-data/ and classification_results.csv
+        rows (int): Total number of clean-data rows
+        states (iterable): State codes, one CSV per state
+        years (iterable): Years to spread rows over
+        search_keys_size (int): Tokens per search_keys value
+        anomaly_rate (float): Fraction of rows with an injected issue
+        seed (int): Random seed
+
+    Returns:
+        list: Paths of the clean-data CSVs written
+    """
+    rng = random.Random(seed)
+    states = list(states)
+    years = [str(y) for y in years]
+    clean_dir = join(output_dir, "clean-data")
+    makedirs(clean_dir, exist_ok=True)
+
+    # a small pool of search key strings keeps generation fast at large scale
+    key_pool = [make_search_keys(rng, search_keys_size) for _ in range(256)]
+    issues = ["year", "link", "prefix", "duplicate", "unclassified", "conflict", "empty"]
+
+    written = []
+    classification_path = join(output_dir, "classification_results.csv")
+    with open(classification_path, "w", newline="") as cf:
+        classification = csv.writer(cf)
+        classification.writerow(["act_num", "year", "state", "uni_bigrams_word_counts"])
+
+        per_state = rows // len(states)
+        for s, state in enumerate(states):
+            count = per_state + (1 if s < rows % len(states) else 0)
+            path = join(clean_dir, f"{state}_leginfo_clean.csv")
+            with open(path, "w", newline="") as f:
+                clean = csv.writer(f)
+                clean.writerow(["state", "year", "act_num", "original_act_num", "link", "name"])
+                previous = None
+                for i in range(count):
+                    year = years[i % len(years)]
+                    original = f"HF{i}"
+                    act_num = state + year + original
+                    link = f"https://example.org/{state}/{year}/{original}"
+                    search_keys = key_pool[i % len(key_pool)]
+                    issue = rng.choice(issues) if rng.random() < anomaly_rate else None
+
+                    if issue == "year":
+                        year = year[:2] + "x" + year[3:]
+                    elif issue == "link":
+                        link = ""
+                    elif issue == "prefix":
+                        act_num = original
+                    elif issue == "duplicate" and previous is not None:
+                        year, act_num = previous
+                    elif issue == "empty":
+                        search_keys = "{}"
+
+                    clean.writerow([state, year, act_num, original, link, f"Act {original}"])
+                    previous = (year, act_num)
+                    if issue == "unclassified":
+                        continue
+                    classification.writerow([act_num, year, state, search_keys])
+                    if issue == "conflict":
+                        classification.writerow([act_num, year, state, key_pool[(i + 1) % len(key_pool)]])
+            written.append(path)
+
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic clean-data and classification CSVs")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--states", default="MN", help="Comma-separated state codes")
+    parser.add_argument("--years", default="2000-2023", help="Year range or comma-separated years")
+    parser.add_argument("--acts", type=int, default=None, help="Acts per state and year, overrides --rows")
+    parser.add_argument("--output", required=True, help="Directory to write into, e.g. /tmp/synthetic")
+    parser.add_argument("--search-keys-size", type=int, default=20)
+    parser.add_argument("--anomaly-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    states = args.states.split(",")
+    years = parse_years(args.years)
+    rows = args.rows if args.acts is None else len(states) * len(years) * args.acts
+
+    files = generate(
+        args.output,
+        rows,
+        states=states,
+        years=years,
+        search_keys_size=args.search_keys_size,
+        anomaly_rate=args.anomaly_rate,
+        seed=args.seed,
+    )
+    print(f"Wrote {rows} rows to {len(files)} files under {args.output}")
@@ -1,154 +1,223 @@
-import json
-import time
-import uuid
-from alive_progress import alive_it
-from azure.cosmos import CosmosClient
-from dotenv import load_dotenv
 import pandas as pd
-from os import listdir, environ
+from dotenv import load_dotenv
+from act_nums import KeyStats, canonical_act_nums
+from classification import ClassificationIndex, load_classification
+from clean_dataset import dataset_dir_for, dataset_partitions, iter_dataset, read_dataset, update_dataset
+from delta_sync import plan_sync, sync_operations
+from cosmos_uploader import (
+    UploadJournal,
+    assemble_batches,
+    content_hash,
+    item_id,
+    stream_limits,
+    upload_stream,
+)
+from os import listdir
 from os.path import isfile, join, dirname, abspath
+from parallel import jobs_argument, ordered_map
+from rate_control import AdaptiveConcurrency
+from storage import open_container
 
-dtype = {
-    "state": str,
-    "year": str,
-    "act_num": str,
-    "original_act_num": str,
-    "link": str,
-    "name": str,
-}
+# clean-data columns an item is built from; act_num is rebuilt from them
+COLUMNS = ["state", "year", "original_act_num", "link", "name"]
 
 
-def run():
+def run(jobs=1):
     load_dotenv()
 
-    URL = environ["ACCOUNT_URI"]
-    KEY = environ["ACCOUNT_KEY"]
-    COSMOS_DB_NAME = environ["COSMOS_DB_NAME"]
-    client = CosmosClient(URL, credential=KEY)
-
+    ## "cosmos" writes to the Cosmos DB account in .env, "local" to a SQLite
+    ## mirror of the container under data/.cache/ (no network, no RUs)
+    backend = "cosmos"
     ## add all states to upload here e.g.: ["GA", "IA"]
     states_to_upload = [
         "MN",
     ]
+    ## years to upload, e.g. [2023, 2024]; None for every year
+    years_to_upload = None
+    ## "upload" upserts every row, "sync" only writes items that changed
+    ## and deletes items of the uploaded partitions that are no longer in the CSV
+    mode = "upload"
+    ## batches in flight start at max_in_flight and adapt up to
+    ## max_in_flight_limit, backing off when Cosmos DB throttles (429)
+    max_in_flight = 8
+    max_in_flight_limit = 32
+    ## rough memory budget for one file's parsed chunk plus queued batches
+    memory_budget_mb = 1024
+    chunk_rows, max_queued = stream_limits(memory_budget_mb)
     keys_to_upload = ["id", "act_num", "year", "state", "name", "link", "search_keys"]
 
-    database = client.get_database_client(COSMOS_DB_NAME)
     CONTAINER_NAME = "leginfo_clean"
-    container = database.get_container_client(CONTAINER_NAME)
+    container, COSMOS_DB_NAME = open_container(
+        backend, CONTAINER_NAME, local_path=f"../data/.cache/{CONTAINER_NAME}.sqlite"
+    )
 
     # Get the directory where the script is located
     script_dir = dirname(abspath(__file__))
 
-    # open data/classification_results.csv
-    print("Loading classification results, this may take a while...")
-    # Read only necessary columns to save memory
-    df_classification = pd.read_csv(
-        "../data/classification_results.csv", dtype={"year": str}
-    )
-    df_classification.rename(
-        columns={"uni_bigrams_word_counts": "search_keys"}, inplace=True
-    )
-    df_classification = df_classification[
-        df_classification["state"].isin(states_to_upload)
-    ]
-    df_classification.set_index(["act_num"], inplace=True)
+    classification_path = "../data/classification_results.csv"
+    if jobs > 1:
+        print("Preparing classification results...")
+        load_classification(classification_path, states=[])
+        classification_index = None
+    else:
+        # open data/classification_results.csv
+        print("Loading classification results, this may take a while...")
+        # one record per (state, year, act_num); duplicates resolve to the first row
+        classification_index = ClassificationIndex.from_csv(
+            classification_path, states=states_to_upload
+        )
     print("--------------------------------")
 
+    # acknowledged chunks are journaled so a rerun resumes where it stopped;
+    # delete the journal to force a full re-upload
+    journal = UploadJournal(
+        f"../data/.cache/upload_journal_{COSMOS_DB_NAME}_{CONTAINER_NAME}.jsonl"
+    )
+    print(f"Upload journal: {journal.path} ({len(journal)} chunks already uploaded)")
+    uploaded_items = 0
+    upload_time = 0.0
+    # shared by every file, so the learned limit carries over
+    controller = AdaptiveConcurrency(initial=max_in_flight, maximum=max_in_flight_limit)
+
     # get all csv files in clean-data
     onlyfiles = [
         f
         for f in listdir("../data/clean-data")
         if isfile(join("../data/clean-data", f)) and f.endswith(".csv")
     ]
+    dataset_dir = dataset_dir_for("../data/clean-data")
+    manifest = update_dataset("../data/clean-data", dataset_dir)
+
+    def file_operations(file, key_stats=None):
+        if jobs > 1:
+            # payloads are built per (state, year) in worker processes and
+            # come back in partition order, so batches are the same as with one job
+            tasks = [
+                (classification_path, dataset_dir, manifest, file, p["state"], p["year"], keys_to_upload)
+                for p in dataset_partitions(manifest, states_to_upload, years_to_upload, sources=[file])
+            ]
+            print(f"Preparing {len(tasks)} partitions with {jobs} worker processes...")
+            return partition_operations(ordered_map(build_partition_operations, tasks, jobs), key_stats)
+        print(f"Loading data in chunks of {chunk_rows} rows...")
+        chunks = iter_dataset(
+            dataset_dir,
+            manifest,
+            chunk_rows,
+            COLUMNS,
+            states=states_to_upload,
+            years=years_to_upload,
+            sources=[file],
+        )
+        return build_operations(chunks, classification_index, keys_to_upload, key_stats)
+
     for i, file in enumerate(onlyfiles):
         if file.split("_")[0] not in states_to_upload:
             continue
         print(f"Processing {file} ({i+1}/{len(onlyfiles)})")
-        df = load_csv("../data/clean-data/" + file)
-        total_rows = df.shape[0]
-
-        # # Create batches of operations for bulk upload
-        item_batches = {}
-        # filter df_classification by state and year
-        for _, row in df.iterrows():
-            batch_key = f"{row['state']}/{row['year']}"
-            if batch_key not in item_batches:
-                item_batches[batch_key] = []
-            # standardize act_num to match classification key format
-            row["act_num"] = row["state"] + row["year"] + row["original_act_num"]
-            try:
-                classification = df_classification.loc[row["act_num"]]
-            except KeyError:
-                continue
-            # Handle multiple classifications
-            if isinstance(classification, pd.DataFrame):
-                # Take the first classification or combine them as needed
-                classification = classification.iloc[0]  # Takes first row
-
-            search_keys_list = list(
-                json.loads(classification["search_keys"].replace("'", '"')).keys()
-            )
+        # parse, join and upload chunk by chunk so memory stays within the budget
+        key_stats = KeyStats()
+        operations = file_operations(file, key_stats)
+        file_journal = journal
+        if mode == "sync":
+            # first pass diffs content hashes, second pass sends only the changes
+            plan = plan_sync(container, operations, max_in_flight=max_in_flight)
+            print(f"Sync plan: {plan.summary()}")
+            operations = sync_operations(file_operations(file), plan)
+            # a rerun recomputes the diff, so the journal is not needed
+            file_journal = None
+        stats = upload_stream(
+            container,
+            assemble_batches(operations),
+            max_queued=max_queued,
+            journal=file_journal,
+            source=file,
+            controller=controller,
+        )
+        print(f"Uploaded {stats.summary()}")
+        print(f"Keys: {key_stats.summary()}")
+        print(f"Batches: {controller.summary()}")
+        uploaded_items += stats.items
+        upload_time += stats.elapsed
+
+    journal.close()
+    if uploaded_items:
+        print(
+            f"Time taken to upsert a row on average: {upload_time / uploaded_items} seconds",
+        )
+
+
+def partition_operations(results, key_stats=None):
+    """Chain the operations of build_partition_operations results, adding up their key counters."""
+    for operations, stats in results:
+        if key_stats is not None:
+            key_stats.add(stats)
+        yield from operations
+
+
+def build_partition_operations(task):
+    """
+    Worker entry point: build the upsert operations of one (state, year) partition.
+
+    The classification index covers just this partition and is read from
+    the shared memory-mapped columnar cache.
+
+    Args:
+        task (tuple): (classification path, dataset_dir, manifest, file, state, year, keys_to_upload)
+
+    Returns:
+        tuple: (list of ("state/year" batch key, upsert operation), KeyStats)
+    """
+    classification_path, dataset_dir, manifest, file, state, year, keys_to_upload = task
+    classification_index = ClassificationIndex.from_csv(
+        classification_path, states=[state], years=[year], workers=1
+    )
+    df = read_dataset(dataset_dir, manifest, COLUMNS, states=[state], years=[year], sources=[file])
+    key_stats = KeyStats()
+    return list(build_operations([df], classification_index, keys_to_upload, key_stats)), key_stats
+
+
+def build_operations(chunks, classification_index, keys_to_upload, key_stats=None):
+    """
+    Join clean-data rows with their classification and build upsert operations.
+
+    act_nums are rebuilt as canonical keys (see act_nums.canonical_act_nums)
+    and joined to the classification a chunk at a time. Rows without a
+    complete key, without a classification or without search keys are skipped.
+
+    Args:
+        chunks (iterable): Normalized clean-data DataFrames
+        classification_index (ClassificationIndex): Resolved classification records
+        keys_to_upload (list): Item fields to send
+        key_stats (KeyStats): Counters the keys of every chunk are added to, optional
+
+    Yields:
+        tuple: ("state/year" batch key, upsert operation)
+    """
+    for chunk in chunks:
+        # standardize act_num to match classification key format
+        act_nums, stats = canonical_act_nums(chunk)
+        if key_stats is not None:
+            key_stats.add(stats)
+        positions = classification_index.positions(
+            pd.MultiIndex.from_arrays([chunk["state"], chunk["year"], act_nums])
+        )
+        # rows without a key or a classification never reach the payloads
+        found = positions >= 0
+        rows = chunk.assign(act_num=act_nums)[found]
+        for row, position in zip(rows.to_dict("records"), positions[found]):
+            search_keys_list = classification_index.search_keys.keys(position)
             if search_keys_list == []:
                 continue
             # build payload after act_num is standardized and include search_keys
-            data = row.to_dict()
-            data["search_keys"] = search_keys_list
-            data = {key: data[key] for key in keys_to_upload}
+            row["id"] = item_id(row["state"], row["year"], row["act_num"])
+            row["search_keys"] = search_keys_list
+            # NaN -> None for proper JSON serialization
+            data = {key: (None if row[key] != row[key] else row[key]) for key in keys_to_upload}
             data["year"] = int(data["year"])
-            item_batches[batch_key].append(("create", (data,), {}))
-
-        # # Execute batch operations in chunks of 100 (Azure Cosmos DB limit)
-        batch_size = 100
-        start_time = time.time()
-        print(f"Uploading {total_rows} rows to Cosmos DB ({len(item_batches)} batches)")
-        for key, value in alive_it(item_batches.items()):
-            num_items = len(value)
-            for i in range(0, num_items, batch_size):
-                batch = value[i : i + batch_size]
-                container.execute_item_batch(
-                    batch, partition_key=(key.split("/")[0], int(key.split("/")[1]))
-                )
-
-    end_time = time.time()
-    print(
-        f"Time taken to upsert a row on average: {(end_time - start_time) / df.shape[0]} seconds",
-    )
-
-
-def load_csv(file_path):
-    print(f"Loading data from file...")
-    df = pd.read_csv(file_path, dtype=dtype)
-
-    # Drop the first column as it's usually a row number
-    if "Unnamed: 0" in df.columns[0]:
-        df.drop(columns=["Unnamed: 0"], inplace=True)
-
-    if "State" in df.columns:
-        df.rename(columns={"State": "state"}, inplace=True)
-
-    if "Year" in df.columns:
-        df.rename(columns={"Year": "year"}, inplace=True)
-
-    if "bill_num" in df.columns:
-        df.rename(columns={"bill_num": "original_act_num"}, inplace=True)
-
-    if "Title" in df.columns:
-        df.rename(columns={"Title": "name"}, inplace=True)
-
-    if "links" in df.columns:
-        df.rename(columns={"links": "link"}, inplace=True)
-
-    if "Link to full text" in df.columns:
-        df.rename(columns={"Link to full text": "link"}, inplace=True)
-
-    # Replace all NaN values with None for proper JSON serialization
-    df = df.where(pd.notna(df), None)
-
-    # Add UUID column to DataFrame
-    df["id"] = [str(uuid.uuid4()) for _ in range(len(df))]
-
-    return df
+            # lets sync mode detect changed items without reading them back
+            data["content_hash"] = content_hash(data)
+            yield f"{row['state']}/{row['year']}", ("upsert", (data,), {})
 
 
 if __name__ == "__main__":
-    run()
+    run(jobs=jobs_argument("Upload clean-data with classifications to Cosmos DB"))
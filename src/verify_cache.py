@@ -0,0 +1,119 @@
+import json
+import os
+import sqlite3
+from os.path import dirname
+import numpy as np
+from classification import load_classification
+from clean_dataset import frame_digest
+from columnar_cache import cache_dir_for, read_manifest
+
+
+class VerifyCache:
+    """
+    On-disk record of verify_data statistics per clean-data partition.
+
+    Each entry is keyed by the partition's dataset path and stores the
+    fingerprint it was computed for, its counters and the hashes of its
+    act_nums (needed for the file-wide duplicate count). The digest of
+    each (state, year) slice of classification_results.csv is kept too,
+    recomputed per state only when the file changes.
+
+    Several processes may use the same file; SQLite serializes the writes.
+    """
+
+    def __init__(self, path, classification_path):
+        os.makedirs(dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.classification_path = classification_path
+        # the columnar cache records the content hash of the CSV it was built from
+        manifest = read_manifest(cache_dir_for(classification_path))
+        self.classification_sha = manifest["source"]["sha256"] if manifest else None
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS partition_stats (
+                path TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                stats TEXT NOT NULL,
+                act_num_hashes BLOB NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS classification_slices (
+                classification TEXT NOT NULL,
+                state TEXT NOT NULL,
+                year TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (classification, state, year)
+            )
+            """
+        )
+        self._slices = {}
+
+    def slice_digest(self, state, year):
+        """
+        Get the digest of the classification rows of one (state, year).
+
+        Args:
+            state (str): State code
+            year (str): Year as a string
+
+        Returns:
+            str: Digest, the same for every (state, year) without rows
+        """
+        if state not in self._slices:
+            self._slices[state] = self._state_slices(state)
+        return self._slices[state].get(year, "")
+
+    def _state_slices(self, state):
+        rows = self._conn.execute(
+            "SELECT year, digest FROM classification_slices WHERE classification = ? AND state = ?",
+            (self.classification_sha, state),
+        ).fetchall()
+        if rows:
+            return dict(rows)
+        df = load_classification(self.classification_path, states=[state])
+        slices = {
+            year: frame_digest(group[["act_num", "search_keys"]])
+            for year, group in df.groupby("year", sort=False)
+        }
+        with self._conn:
+            # slices of older versions of the file are no longer needed
+            self._conn.execute(
+                "DELETE FROM classification_slices WHERE classification != ? AND state = ?",
+                (self.classification_sha, state),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO classification_slices VALUES (?, ?, ?, ?)",
+                [(self.classification_sha, state, year, digest) for year, digest in slices.items()],
+            )
+        return slices
+
+    def get(self, path, fingerprint):
+        """
+        Get the statistics of a partition if they were computed for `fingerprint`.
+
+        Returns:
+            tuple: (stats dict, act_num hash array), or None
+        """
+        row = self._conn.execute(
+            "SELECT stats, act_num_hashes FROM partition_stats WHERE path = ? AND fingerprint = ?",
+            (path, fingerprint),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), np.frombuffer(row[1], dtype=np.uint64)
+
+    def put(self, path, fingerprint, stats, act_num_hashes):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO partition_stats VALUES (?, ?, ?, ?)",
+                (path, fingerprint, json.dumps(stats), act_num_hashes.astype(np.uint64).tobytes()),
+            )
+
+    def close(self):
+        self._conn.close()
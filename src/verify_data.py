@@ -1,218 +1,408 @@
 import gc
+import hashlib
 import json
-from alive_progress import alive_it
+import numpy as np
 import pandas as pd
+import search_keys
+from act_nums import sanitize
+from classification import ClassificationIndex, load_classification
+from clean_dataset import dataset_dir_for, dataset_partitions, read_dataset, update_dataset
 from os import listdir
 from os.path import isfile, join, dirname, abspath
-
-dtype = {
-    "state": str,
-    "year": str,
-    "act_num": str,
-    "original_act_num": str,
-    "link": str,
-    "name": str,
-}
-
-
-def run():
+from parallel import jobs_argument, ordered_map
+from verify_cache import VerifyCache
+
+# clean-data columns the checks read
+COLUMNS = ["state", "year", "act_num", "name", "link"]
+
+# counters summed over partitions; duplicate_act_num is merged file-wide
+CSV_COUNTERS = [
+    "act_num_missing",
+    "act_num_bad_format",
+    "act_num_unsanitized",
+    "nan_year_count",
+    "link_missing",
+]
+CLASSIFICATION_COUNTERS = [
+    "classification_missing",
+    "multiple_classification",
+    "search_keys_missing",
+    "search_keys_bad_format",
+]
+
+# bump when a check changes, so cached partition statistics are recomputed
+STATS_VERSION = 2
+
+
+def run(jobs=1):
     # Get the directory where the script is located
     script_dir = dirname(abspath(__file__))
 
-    # open data/classification_results.csv
-    print("Loading classification results, this may take a while...")
-    # Read only necessary columns to save memory
-    df_classification = pd.read_csv(
-        join(script_dir, "../data/classification_results.csv"),
-        dtype={"year": str},
-        usecols=["act_num", "year", "state", "uni_bigrams_word_counts"],
-    )
-    df_classification.rename(
-        columns={"uni_bigrams_word_counts": "search_keys"}, inplace=True
-    )
-    df_classification.set_index(["act_num"], inplace=True)
+    ## states and years to verify, None for all; only their partitions are read
+    states = None
+    years = None
+    ## reuse the statistics of partitions whose rows and classification
+    ## did not change since the last run; False recomputes everything
+    incremental = True
+
+    print("Preparing classification results...")
+    classification_path = join(script_dir, "../data/classification_results.csv")
+    load_classification(classification_path, states=[])
+    cache_path = join(script_dir, "../data/.cache/verify_stats.sqlite") if incremental else None
     print("--------------------------------")
 
     # get all csv files in clean-data
     clean_data_dir = join(script_dir, "../data/clean-data")
+    dataset_dir = dataset_dir_for(clean_data_dir)
+    manifest = update_dataset(clean_data_dir, dataset_dir)
     onlyfiles = [
         f
         for f in listdir(clean_data_dir)
         if isfile(join(clean_data_dir, f)) and f.endswith(".csv")
     ]
-    for i, file in enumerate(onlyfiles):
-        classification_missing = 0
-        search_keys_missing = 0
-        search_keys_bad_format = 0
-        multiple_classification = 0
-        nan_year_count = 0
-        link_missing = 0
-        act_num_bad_format = 0
-        act_num_missing = 0
-        duplicate_act_num = 0
+    if jobs > 1:
+        print(f"Verifying {len(onlyfiles)} files with {jobs} worker processes")
+    tasks = [
+        # with a pool, search keys are parsed in one process per file
+        (classification_path, dataset_dir, manifest, file, states, years, cache_path, 1 if jobs > 1 else None)
+        for file in onlyfiles
+    ]
+
+    # reports come back in file order whatever the number of jobs
+    for i, (file, report) in enumerate(zip(onlyfiles, ordered_map(verify_file_task, tasks, jobs))):
+        if report is None:
+            continue
         print(f"Processing {file} ({i+1}/{len(onlyfiles)})")
-        df = load_csv(join(clean_data_dir, file))
-        total_rows = df.shape[0]
-        df_grouped = df.groupby(["state", "year"])
-
-        # Group by state and year, and process each group
-        for (state, year), group_df in alive_it(df_grouped, total=len(df_grouped)):
-            # filter classification by year and state
-            year_classification = df_classification[
-                (df_classification["year"] == year)
-                & (df_classification["state"] == state)
-            ]
-
-            # Process each row in the group
-            for _, row in group_df.iterrows():
-                # check links missing, check act_num well formatted
-                if not str(row["year"]).isnumeric():
-                    nan_year_count += 1
-
-                try:
-                    if row["link"] == None or row["link"] == "":
-                        link_missing += 1
-                except KeyError:
-                    link_missing += 1
-
-                # should start with state+year
-                try:
-                    if row["act_num"] == None or row["act_num"] == "":
-                        act_num_missing += 1
-                    else:
-                        if not row["act_num"].startswith(row["state"] + str(row["year"])):
-                            act_num_bad_format += 1
-                        # check if act_num occurs more than once in the clean data df
-                        if df[df["act_num"] == row["act_num"]].shape[0] > 1:
-                            duplicate_act_num += 1
-                except KeyError:
-                    act_num_missing += 1
-                    continue
-
-                try:
-                    classification = year_classification.loc[row["act_num"]]
-                except KeyError:
-                    classification_missing += 1
-                    continue
-
-                # Check for multiple classifications where the data is different
-                if isinstance(classification, pd.DataFrame):
-                    # Check if all rows are identical by comparing with the first row
-                    first_row = classification.iloc[0]
-                    if not (classification == first_row).all(axis=1).all():
-                        multiple_classification += 1
-                        continue
-                    classification = first_row
-
-                # Check for missing search keys
-                if (
-                    classification["search_keys"] == "{}"
-                    or classification["search_keys"] == ""
-                    or classification["search_keys"] == None
-                ):
-                    search_keys_missing += 1
-                else:
-                    try:
-                        json.loads(classification["search_keys"].replace("'", '"'))
-                    except KeyError:
-                        search_keys_bad_format += 1
-
-                del classification
-
-            del year_classification
-            del group_df
-
-        # Print statistics with better formatting
-        print("\nCSV Check Results:")
-        print("=" * 50)
-        print(f"Total rows processed: {total_rows}")
-
-        # Check if name column is missing (fixed the logic)
-        if "name" not in df.columns:
-            print("WARNING: Name column is missing")
-
-        # Format percentages to 2 decimal places
-        stats = {
-            "Act numbers missing": act_num_missing,
-            "Act numbers badly formatted": act_num_bad_format,
-            "Act numbers duplicate": duplicate_act_num,
-            "Years with invalid value": nan_year_count,
-            "Links missing": link_missing,
-        }
+        if report["reused"]:
+            print(f"Reused statistics of {report['reused']}/{report['partitions']} unchanged partitions")
+        print_report(report)
+        gc.collect()
 
-        if any(stats.values()) > 0:
-            for label, count in stats.items():
-                if count > 0:
-                    percentage = (count / total_rows) * 100
-                    print(f"{label:30}: {count:5}/{total_rows} ({percentage:.2f}%)")
-        else:
-            print("No issues found")
-
-        print("\nClassification Check Results:")
-        print("=" * 50)
-        class_stats = {
-            "Act number classifications missing": classification_missing,
-            "Act number multiple classifications with different data": multiple_classification,
-            "Search keys are empty": search_keys_missing,
-            "Search keys badly formatted (not a json)": search_keys_bad_format,
-        }
 
-        if any(class_stats.values()) > 0:
-            for label, count in class_stats.items():
-                if count > 0:
-                    percentage = (count / total_rows) * 100
-                    print(f"{label:30}: {count:5}/{total_rows} ({percentage:.2f}%)")
+def verify_file(
+    dataset_dir,
+    manifest,
+    file,
+    classification_path,
+    states=None,
+    years=None,
+    cache=None,
+    workers=None,
+):
+    """
+    Run the CSV and classification checks on one clean-data file.
+
+    The counters are computed per (state, year) partition and summed; the
+    duplicate count is merged from the act_num hashes of every partition,
+    so it still covers the whole file. With a cache, partitions whose rows
+    and classification slice are unchanged reuse their stored statistics,
+    and the classification index is only built if some partition changed.
+
+    Args:
+        dataset_dir (str): Clean-data Parquet dataset directory
+        manifest (dict): Dataset manifest, see clean_dataset.update_dataset
+        file (str): CSV name
+        classification_path (str): Path to classification_results.csv
+        states (iterable): State codes to check, or None for all
+        years (iterable): Years to check, or None for all
+        cache (VerifyCache): Statistics of earlier runs, optional
+        workers (int): Processes used to parse search keys
+
+    Returns:
+        dict: total_rows, name_missing, the "csv" and "classification"
+        counters, and the number of partitions and of reused ones; None if
+        a state/year filter selects no rows
+    """
+    partitions = dataset_partitions(manifest, states, years, sources=[file])
+    if not partitions and (states is not None or years is not None):
+        return None
+    columns = [column for column in COLUMNS if column in manifest["sources"][file]["columns"]]
+
+    # look every partition up first, so the index only covers the changed ones
+    fingerprints = []
+    cached = []
+    for partition in partitions:
+        fingerprint = None
+        if cache is not None:
+            slice_digest = ""
+            if partition["state"] is not None and partition["year"] is not None:
+                slice_digest = cache.slice_digest(partition["state"], partition["year"])
+            fingerprint = hashlib.sha256(
+                json.dumps([STATS_VERSION, partition["digest"], slice_digest, columns]).encode()
+            ).hexdigest()
+        fingerprints.append(fingerprint)
+        cached.append(cache.get(partition["path"], fingerprint) if cache is not None else None)
+
+    changed = [
+        partition
+        for partition, entry in zip(partitions, cached)
+        if entry is None and partition["state"] is not None and partition["year"] is not None
+    ]
+    classification_index = None
+    if changed:
+        classification_index = ClassificationIndex.from_csv(
+            classification_path,
+            states=sorted({partition["state"] for partition in changed}),
+            years=sorted({partition["year"] for partition in changed}),
+            workers=workers,
+        )
+
+    # duplicate_act_num stays 0 for a file without rows or partitions
+    csv_counts = dict.fromkeys(CSV_COUNTERS + ["duplicate_act_num"], 0)
+    class_counts = dict.fromkeys(CLASSIFICATION_COUNTERS, 0)
+    hashes = []
+    grouped = []
+    reused = 0
+    for partition, fingerprint, entry in zip(partitions, fingerprints, cached):
+        is_grouped = partition["state"] is not None and partition["year"] is not None
+        if entry is not None:
+            stats, act_num_hashes = entry
+            reused += 1
         else:
-            print("No issues found")
+            df = read_dataset(
+                dataset_dir,
+                manifest,
+                COLUMNS,
+                states=[partition["state"]],
+                years=[partition["year"]],
+                sources=[file],
+            )
+            stats, act_num_hashes = partition_stats(df, classification_index if is_grouped else None)
+            if cache is not None:
+                cache.put(partition["path"], fingerprint, stats, act_num_hashes)
+
+        for name in CSV_COUNTERS:
+            csv_counts[name] += stats["csv"][name]
+        for name in CLASSIFICATION_COUNTERS:
+            class_counts[name] += stats["classification"][name]
+        hashes.append(act_num_hashes)
+        grouped.append(np.full(len(act_num_hashes), is_grouped))
+
+    # act_nums are duplicates if they occur twice anywhere in the file, but
+    # only rows with a state and year are counted, as in check_csv
+    if hashes:
+        _, inverse, counts = np.unique(np.concatenate(hashes), return_inverse=True, return_counts=True)
+        csv_counts["duplicate_act_num"] = int((counts[inverse][np.concatenate(grouped)] > 1).sum())
+
+    return {
+        "total_rows": sum(partition["rows"] for partition in partitions),
+        "name_missing": "name" not in columns,
+        "csv": csv_counts,
+        "classification": class_counts,
+        "partitions": len(partitions),
+        "reused": reused,
+    }
 
-        print("-" * 50 + "\n\n")
-        del df_grouped
-        del df
-        gc.collect()
 
-    del df_classification
-
-
-def load_csv(file_path):
-    print(f"Loading data from file...")
-    # Get available columns first
-    all_columns = pd.read_csv(file_path, nrows=0).columns
-
-    # Define column mappings
-    column_mappings = {
-        "State": "state",
-        "Year": "year",
-        "Title": "name",
-        "links": "link",
-        "Link to full text": "link",
-        "act_num": "act_num",
-        "year": "year",
-        "state": "state",
-        "name": "name",
-        "link": "link",
+def verify_file_task(task):
+    """
+    Process pool entry point for verify_file.
+
+    Args:
+        task (tuple): (classification path, dataset_dir, manifest, file,
+            states, years, cache path or None, search key workers)
+
+    Returns:
+        dict: Report from verify_file
+    """
+    classification_path, dataset_dir, manifest, file, states, years, cache_path, workers = task
+    cache = VerifyCache(cache_path, classification_path) if cache_path else None
+    try:
+        return verify_file(dataset_dir, manifest, file, classification_path, states, years, cache, workers)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def partition_stats(df, classification_index):
+    """
+    Compute the counters of one partition and the hashes of its act_nums.
+
+    Args:
+        df (DataFrame): Rows of one (state, year) partition
+        classification_index (ClassificationIndex): Resolved classification
+            records, None for rows without a state or year (they are not counted)
+
+    Returns:
+        tuple: (dict with "csv" counters without duplicate_act_num and
+        "classification" counters, uint64 array with one hash per non-empty act_num)
+    """
+    if "act_num" in df.columns:
+        act_num = df["act_num"]
+        act_num = act_num[act_num.notna() & (act_num != "")]
+        act_num_hashes = pd.util.hash_array(act_num.to_numpy(dtype=object))
+    else:
+        act_num_hashes = np.zeros(0, dtype=np.uint64)
+    if classification_index is None:
+        stats = {
+            "csv": dict.fromkeys(CSV_COUNTERS, 0),
+            "classification": dict.fromkeys(CLASSIFICATION_COUNTERS, 0),
+        }
+    else:
+        csv_counts = check_csv(df)
+        # merged file-wide from the act_num hashes by verify_file
+        del csv_counts["duplicate_act_num"]
+        stats = {"csv": csv_counts, "classification": check_classification(df, classification_index)}
+    return stats, act_num_hashes
+
+
+def print_report(report):
+    total_rows = report["total_rows"]
+    csv_counts = report["csv"]
+    class_counts = report["classification"]
+
+    # Print statistics with better formatting
+    print("\nCSV Check Results:")
+    print("=" * 50)
+    print(f"Total rows processed: {total_rows}")
+
+    # Check if name column is missing (fixed the logic)
+    if report["name_missing"]:
+        print("WARNING: Name column is missing")
+
+    # Format percentages to 2 decimal places
+    stats = {
+        "Act numbers missing": csv_counts["act_num_missing"],
+        "Act numbers badly formatted": csv_counts["act_num_bad_format"],
+        "Act numbers with control characters or surrounding whitespace": csv_counts["act_num_unsanitized"],
+        "Act numbers duplicate": csv_counts["duplicate_act_num"],
+        "Years with invalid value": csv_counts["nan_year_count"],
+        "Links missing": csv_counts["link_missing"],
     }
 
-    # Filter to only columns we care about
-    columns_to_load = [
-        col
-        for col in all_columns
-        if col in column_mappings.keys() or col in column_mappings.values()
-    ]
+    if any(stats.values()) > 0:
+        for label, count in stats.items():
+            if count > 0:
+                percentage = (count / total_rows) * 100
+                print(f"{label:30}: {count:5}/{total_rows} ({percentage:.2f}%)")
+    else:
+        print("No issues found")
+
+    print("\nClassification Check Results:")
+    print("=" * 50)
+    class_stats = {
+        "Act number classifications missing": class_counts["classification_missing"],
+        "Act number multiple classifications with different data": class_counts["multiple_classification"],
+        "Search keys are empty": class_counts["search_keys_missing"],
+        "Search keys badly formatted (not a json)": class_counts["search_keys_bad_format"],
+    }
+
+    if any(class_stats.values()) > 0:
+        for label, count in class_stats.items():
+            if count > 0:
+                percentage = (count / total_rows) * 100
+                print(f"{label:30}: {count:5}/{total_rows} ({percentage:.2f}%)")
+    else:
+        print("No issues found")
+
+    print("-" * 50 + "\n\n")
+
+
+def grouped_rows(df):
+    """
+    Select the rows that take part in the (state, year) checks.
+
+    Rows with a missing state or year are dropped, matching pandas groupby.
+
+    Args:
+        df (DataFrame): Normalized clean data, see clean_data.to_frame
 
-    # Load only the columns that exist
-    df = pd.read_csv(file_path, dtype=dtype, usecols=columns_to_load)
+    Returns:
+        DataFrame: Rows with both state and year present
+    """
+    return df[df["state"].notna() & df["year"].notna()]
 
-    # Apply column renaming
-    for old_col, new_col in column_mappings.items():
-        if old_col in df.columns:
-            df.rename(columns={old_col: new_col}, inplace=True)
 
-    # Replace all NaN values with None for proper JSON serialization
-    df = df.where(pd.notna(df), None)
+def check_csv(df):
+    """
+    Compute the CSV counters for a clean-data file with whole-column operations.
+
+    Args:
+        df (DataFrame): Normalized clean data, see clean_data.to_frame
+
+    Returns:
+        dict: Counters keyed by act_num_missing, act_num_bad_format,
+        act_num_unsanitized, duplicate_act_num, nan_year_count and link_missing
+    """
+    rows = grouped_rows(df)
+    counts = {
+        "act_num_missing": 0,
+        "act_num_bad_format": 0,
+        "act_num_unsanitized": 0,
+        "duplicate_act_num": 0,
+        "nan_year_count": int((~rows["year"].astype(str).str.isnumeric()).sum()),
+        "link_missing": len(rows),
+    }
+
+    if "link" in rows.columns:
+        link = rows["link"]
+        counts["link_missing"] = int((link.isna() | (link == "")).sum())
+
+    if "act_num" not in rows.columns:
+        counts["act_num_missing"] = len(rows)
+        return counts
+
+    act_num = rows["act_num"]
+    act_num_empty = act_num.isna() | (act_num == "")
+    counts["act_num_missing"] = int(act_num_empty.sum())
+    # keys the upload rewrites; a value that is only whitespace counts too
+    sanitized = sanitize(act_num)
+    counts["act_num_unsanitized"] = int(((sanitized != act_num) & ~act_num_empty).sum())
+
+    # act_num should start with state+year; compare one prefix length at a time
+    prefix = rows["state"].astype(str) + rows["year"].astype(str)
+    prefix_len = prefix.str.len()
+    for length in prefix_len.unique():
+        same_len = (prefix_len == length) & ~act_num_empty
+        mismatch = act_num[same_len].str.slice(0, length) != prefix[same_len]
+        counts["act_num_bad_format"] += int(mismatch.sum())
+
+    # duplicates are counted against the whole file, not just the grouped rows
+    duplicated = df["act_num"].duplicated(keep=False)
+    counts["duplicate_act_num"] = int((duplicated[rows.index] & ~act_num_empty).sum())
+
+    return counts
+
+
+def check_classification(df, classification_index):
+    """
+    Compute the classification counters for a clean-data file.
+
+    Args:
+        df (DataFrame): Normalized clean data, see clean_data.to_frame
+        classification_index (ClassificationIndex): Resolved classification records
+
+    Returns:
+        dict: Counters keyed by classification_missing, multiple_classification,
+        search_keys_missing and search_keys_bad_format
+    """
+    counts = {
+        "classification_missing": 0,
+        "multiple_classification": 0,
+        "search_keys_missing": 0,
+        "search_keys_bad_format": 0,
+    }
+    rows = grouped_rows(df)
+    if "act_num" not in rows.columns:
+        return counts
+
+    # classification act_nums are sanitized the same way when loaded
+    keys = pd.MultiIndex.from_arrays(
+        [rows["state"], rows["year"], sanitize(rows["act_num"])]
+    )
+    positions = classification_index.positions(keys)
+    positions = positions[positions >= 0]
+    conflicting = classification_index.frame["conflicting"].to_numpy(dtype=bool)[positions]
+    status = classification_index.search_keys.status[positions[~conflicting]]
+
+    counts["classification_missing"] = len(rows) - len(positions)
+    counts["multiple_classification"] = int(conflicting.sum())
+    counts["search_keys_missing"] = int((status == search_keys.EMPTY).sum())
+    counts["search_keys_bad_format"] = int((status == search_keys.BAD_FORMAT).sum())
 
-    return df
+    return counts
 
 
 if __name__ == "__main__":
-    run()
+    run(jobs=jobs_argument("Validate clean-data CSVs and their classifications"))
     gc.collect()
@@ -1,7 +1,8 @@
 import gc
+import os
+import tempfile
 import requests
-import pandas as pd
-from alive_progress import alive_it
+from alive_progress import alive_bar, alive_it
 from os import listdir
 from os.path import isfile, join, dirname, abspath
 from urllib.parse import quote
@@ -9,6 +10,12 @@ import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
 import json
+from act_nums import sanitize
+from clean_data import load_clean_csv
+from clean_dataset import dataset_dir_for, read_dataset, update_dataset
+from pdf_cache import PdfExistenceCache
+from pdf_checker import check_by_listing, check_pdf_urls, list_blobs, result_for_status
+from rate_control import THROTTLE_STATUSES, AdaptiveConcurrency, backoff_delay, retry_after_seconds
 
 # Configuration: States to process (add/remove state codes as needed)
 STATES_TO_PROCESS = {
@@ -27,26 +34,38 @@ STATES_TO_PROCESS = {
     'WY',  # Wyoming
 }
 
-dtype = {
-    "state": str,
-    "year": str,
-    "act_num": str,
-    "original_act_num": str,
-    "link": str,
-    "name": str,
-}
+# Years to process, e.g. {2023, 2024}; None for every year
+YEARS_TO_PROCESS = None
 
 # Base URL for PDF checking
 PDF_BASE_URL = "https://statelegislativedata.blob.core.windows.net/raw-data/"
 
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Concurrent HEAD requests for the asyncio checker: starts at
+# INITIAL_IN_FLIGHT and adapts up to MAX_IN_FLIGHT, backing off when the
+# storage account throttles or slows down
+INITIAL_IN_FLIGHT = 64
+MAX_IN_FLIGHT = 512
+# Attempts per act_num before a timeout/throttle/error is reported
+MAX_ATTEMPTS = 6
+
+# "list": list the container once per state and compare names,
+# "head": send one HEAD request per act_num
+CHECK_MODE = "list"
+# In list mode, fewer act_nums than this left to probe are HEAD-checked instead
+HEAD_PROBE_LIMIT = 1000
+
+# Found PDFs are trusted for this long before they are checked again;
+# None disables the cache
+PDF_CACHE_TTL_DAYS = 30
+
 # Global session for connection reuse
 session = requests.Session()
 session.headers.update({
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    'User-Agent': USER_AGENT
 })
 
-# Thread-safe counters
-results_lock = Lock()
 
 def extract_state_code_from_filename(filename):
     """
@@ -85,7 +104,7 @@ def should_process_file(filename, allowed_states):
     state_code = extract_state_code_from_filename(filename)
     return state_code in allowed_states if state_code else False
 
-def check_pdf_url_exists(act_num, timeout=5, max_retries=2):
+def check_pdf_url_exists(act_num, timeout=5, max_retries=MAX_ATTEMPTS):
     """
     Check if a PDF exists at the specified URL format.
     Uses HEAD request to minimize resource usage.
@@ -93,7 +112,8 @@ def check_pdf_url_exists(act_num, timeout=5, max_retries=2):
     Args:
         act_num (str): The act number to check
         timeout (int): Request timeout in seconds
-        max_retries (int): Maximum number of retry attempts
+        max_retries (int): Maximum number of attempts; throttled (429/503),
+            timed out and failed requests are retried with jittered backoff
 
     Returns:
         tuple: (act_num: str, exists: bool, status_code: int, error: str)
@@ -106,49 +126,126 @@ def check_pdf_url_exists(act_num, timeout=5, max_retries=2):
     pdf_url = PDF_BASE_URL + quote(pdf_filename)
 
     for attempt in range(max_retries):
+        retry_after = None
         try:
             # Use HEAD request to check existence without downloading
             response = session.head(pdf_url, timeout=timeout, allow_redirects=True)
-
-            if response.status_code == 200:
-                return act_num, True, response.status_code, None
-            elif response.status_code == 404:
-                return act_num, False, response.status_code, "Not found"
-            else:
-                return act_num, False, response.status_code, f"HTTP {response.status_code}"
+            if response.status_code not in THROTTLE_STATUSES or attempt == max_retries - 1:
+                return result_for_status(act_num, response.status_code)
+            retry_after = retry_after_seconds(response.headers)
 
         except requests.exceptions.Timeout:
-            if attempt < max_retries - 1:
-                time.sleep(0.1)  # Brief pause before retry
-                continue
-            return act_num, False, None, "Timeout"
+            if attempt == max_retries - 1:
+                return act_num, False, None, "Timeout"
         except requests.exceptions.RequestException as e:
-            if attempt < max_retries - 1:
-                time.sleep(0.1)  # Brief pause before retry
-                continue
-            return act_num, False, None, f"Request error: {str(e)}"
+            if attempt == max_retries - 1:
+                return act_num, False, None, f"Request error: {str(e)}"
+        time.sleep(backoff_delay(attempt, retry_after))
 
     return act_num, False, None, "Max retries exceeded"
 
-def process_act_nums_batch(act_nums, max_workers=20):
+class ResultSink:
+    """
+    Streams PDF check outcomes to a JSONL file and keeps only counters in memory.
+
+    Every outcome is appended as it completes ("found", "missing" or
+    "error", with status code and error) and the file is flushed every
+    `flush_every` outcomes or `flush_seconds`, so an interrupted run keeps
+    what it checked. The missing/error summaries are read back from the
+    stream at the end. Without a path the stream goes to a temporary file.
+    """
+
+    def __init__(self, path=None, flush_every=1000, flush_seconds=5.0):
+        self.path = path
+        if path is None:
+            self._file = tempfile.TemporaryFile('w+')
+        else:
+            os.makedirs(dirname(path) or '.', exist_ok=True)
+            self._file = open(path, 'w+')
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.pdf_exists_count = 0
+        self.pdf_missing_count = 0
+        self.pdf_error_count = 0
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        self._lock = Lock()
+
+    def add(self, act_num, exists, status_code, error):
+        """Record one check_pdf_url_exists result."""
+        if exists:
+            outcome = 'found'
+        elif error and "Not found" not in error:
+            outcome = 'error'
+        else:
+            outcome = 'missing'
+            error = error or "Not found"
+        line = json.dumps({
+            'act_num': act_num,
+            'outcome': outcome,
+            'status_code': status_code,
+            'error': error
+        }) + '\n'
+
+        with self._lock:
+            self._file.write(line)
+            if outcome == 'found':
+                self.pdf_exists_count += 1
+            elif outcome == 'error':
+                self.pdf_error_count += 1
+            else:
+                self.pdf_missing_count += 1
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_seconds:
+                self._flush()
+
+    def _flush(self):
+        self._file.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def outcomes(self, outcome):
+        """
+        Read back the recorded outcomes of one kind, in completion order.
+
+        Args:
+            outcome (str): "found", "missing" or "error"
+
+        Yields:
+            dict: act_num, status_code and error of each matching outcome
+        """
+        with self._lock:
+            self._flush()
+            self._file.seek(0)
+            try:
+                for line in self._file:
+                    record = json.loads(line)
+                    if record.pop('outcome') == outcome:
+                        yield record
+            finally:
+                self._file.seek(0, os.SEEK_END)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def process_act_nums_batch(act_nums, max_workers=20, sink=None):
     """
-    Process a batch of act_nums concurrently.
+    Process a batch of act_nums concurrently with a thread pool.
 
     Args:
         act_nums (list): List of act_num values to check
         max_workers (int): Maximum number of concurrent threads
+        sink (ResultSink): Where outcomes go, defaults to a temporary stream
 
     Returns:
-        dict: Results dictionary with counts and details
+        ResultSink: Counters and the stream of outcomes
     """
-    results = {
-        'pdf_exists_count': 0,
-        'pdf_missing_count': 0,
-        'pdf_error_count': 0,
-        'missing_act_nums': [],
-        'error_act_nums': [],
-        'details': []
-    }
+    sink = ResultSink() if sink is None else sink
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Submit all tasks
@@ -160,89 +257,277 @@ def process_act_nums_batch(act_nums, max_workers=20):
         # Process completed tasks with progress bar
         for future in alive_it(as_completed(future_to_act_num), total=len(act_nums), title="Checking URLs"):
             try:
-                act_num, exists, status_code, error = future.result()
-
-                with results_lock:
-                    if exists:
-                        results['pdf_exists_count'] += 1
-                    elif error and "Not found" not in error:
-                        results['pdf_error_count'] += 1
-                        results['error_act_nums'].append({
-                            'act_num': act_num,
-                            'status_code': status_code,
-                            'error': error
-                        })
-                    else:
-                        results['pdf_missing_count'] += 1
-                        results['missing_act_nums'].append({
-                            'act_num': act_num,
-                            'status_code': status_code,
-                            'error': error or "Not found"
-                        })
-
-                    results['details'].append({
-                        'act_num': act_num,
-                        'exists': exists,
-                        'status_code': status_code,
-                        'error': error
-                    })
+                sink.add(*future.result())
 
             except Exception as e:
                 print(f"Error processing future: {e}")
-                with results_lock:
-                    results['pdf_error_count'] += 1
-                    results['error_act_nums'].append({
-                        'act_num': 'unknown',
-                        'status_code': None,
-                        'error': f"Processing error: {str(e)}"
-                    })
+                sink.add('unknown', False, None, f"Processing error: {str(e)}")
 
-    return results
+    return sink
+
+def new_controller():
+    """Concurrency controller shared by all HEAD requests to the storage account."""
+    return AdaptiveConcurrency(initial=INITIAL_IN_FLIGHT, maximum=MAX_IN_FLIGHT, max_retries=MAX_ATTEMPTS)
+
+def process_act_nums_async(act_nums, controller=None, sink=None, cache=None, etags=None):
+    """
+    Process a batch of act_nums with asyncio HEAD requests on pooled connections.
+
+    Produces the same outcomes as process_act_nums_batch without a thread
+    per request.
+
+    Args:
+        act_nums (list): List of act_num values to check
+        controller (AdaptiveConcurrency): Concurrency controller, defaults to new_controller()
+        sink (ResultSink): Where outcomes go, defaults to a temporary stream
+        cache (PdfExistenceCache): Cache to record every result in, optional
+        etags (dict): act_num -> ETag for conditional requests, optional
+
+    Returns:
+        ResultSink: Counters and the stream of outcomes
+    """
+    sink = ResultSink() if sink is None else sink
+    etags = {} if etags is None else etags
+
+    with alive_bar(len(act_nums), title="Checking URLs") as bar:
+        def on_result(result):
+            sink.add(*result)
+            if cache is not None:
+                act_num, exists, status_code, _ = result
+                cache.record(act_num, exists, status_code, etags.get(act_num))
+            bar()
+
+        check_pdf_urls(
+            act_nums,
+            PDF_BASE_URL,
+            on_result,
+            headers={'User-Agent': USER_AGENT},
+            etags=etags,
+            controller=controller or new_controller(),
+        )
+
+    return sink
+
+def process_act_nums_listing(act_nums, state_code, controller=None, sink=None, cache=None):
+    """
+    Resolve act_nums from a listing of the blobs whose names start with the state code.
+
+    act_nums that do not start with the state code cannot be covered by the
+    listing and are HEAD-checked instead.
+
+    Args:
+        act_nums (list): List of act_num values to check
+        state_code (str): State code used as the listing prefix
+        controller (AdaptiveConcurrency): Concurrency controller for HEAD requests, optional
+        sink (ResultSink): Where outcomes go, defaults to a temporary stream
+        cache (PdfExistenceCache): Cache to record every result in, optional
+
+    Returns:
+        ResultSink: Counters and the stream of outcomes
+    """
+    blob_etags = {
+        name: etag
+        for name, etag in alive_it(list_blobs(session, PDF_BASE_URL, state_code), title=f"Listing {state_code}* blobs")
+    }
+    print(f"Listed {len(blob_etags)} blobs with prefix {state_code}")
+
+    sink = ResultSink() if sink is None else sink
+    listed = [act_num for act_num in act_nums if act_num.startswith(state_code)]
+    unlisted = [act_num for act_num in act_nums if not act_num.startswith(state_code)]
+    if unlisted:
+        process_act_nums_async(unlisted, controller=controller, sink=sink, cache=cache)
+    for result in check_by_listing(listed, blob_etags):
+        sink.add(*result)
+        if cache is not None:
+            act_num, exists, status_code, _ = result
+            cache.record(act_num, exists, status_code, blob_etags.get(f"{act_num}.pdf"))
+    return sink
+
+def process_act_nums(act_nums, state_code, cache=None, controller=None, sink=None):
+    """
+    Check act_nums the way CHECK_MODE asks, skipping those the cache vouches for.
+
+    Cached found PDFs younger than the TTL are counted without a request.
+    The rest are resolved from a listing of the state's blobs, or with HEAD
+    requests (conditional on the cached ETag) when they are few, when
+    CHECK_MODE is "head", or when listing is not permitted.
+
+    Args:
+        act_nums (list): List of act_num values to check
+        state_code (str): State code of the act_nums
+        cache (PdfExistenceCache): Cache of earlier results, optional
+        controller (AdaptiveConcurrency): Concurrency controller for HEAD requests, optional
+        sink (ResultSink): Where outcomes go, defaults to a temporary stream
+
+    Returns:
+        ResultSink: Counters and the stream of outcomes
+    """
+    sink = ResultSink() if sink is None else sink
+    to_probe, etags = act_nums, {}
+    if cache is not None:
+        cached, to_probe, etags = cache.split(act_nums)
+        for result in cached:
+            sink.add(*result)
+        print(f"Cached results trusted: {len(cached)}, act_nums to probe: {len(to_probe)}")
+        if not to_probe:
+            return sink
+
+    if CHECK_MODE == "list" and len(to_probe) >= HEAD_PROBE_LIMIT:
+        try:
+            return process_act_nums_listing(to_probe, state_code, controller, sink=sink, cache=cache)
+        except requests.exceptions.RequestException as e:
+            print(f"Listing failed ({e}), falling back to HEAD requests")
+    return process_act_nums_async(to_probe, controller, sink=sink, cache=cache, etags=etags)
 
-def write_missing_act_nums(state_code, filename, missing_act_nums, error_act_nums, output_dir):
+def write_missing_act_nums(state_code, filename, sink, output_dir):
     """
-    Write missing and error act_nums to files.
+    Write missing and error act_nums to files, reading them back from the outcome stream.
 
     Args:
         state_code (str): State code (e.g., "WV")
         filename (str): Original CSV filename
-        missing_act_nums (list): List of missing act_nums with details
-        error_act_nums (list): List of error act_nums with details
+        sink (ResultSink): Outcomes of the state's checks
         output_dir (str): Output directory path
     """
-    import os
-
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
 
     # Write missing act_nums (404s)
-    if missing_act_nums:
+    if sink.pdf_missing_count:
         missing_file = join(output_dir, f"{state_code}_missing_act_nums.txt")
         with open(missing_file, 'w') as f:
             f.write(f"Missing act_nums for {filename} ({state_code})\n")
             f.write(f"Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Total missing: {len(missing_act_nums)}\n")
+            f.write(f"Total missing: {sink.pdf_missing_count}\n")
             f.write("=" * 50 + "\n\n")
 
-            for item in missing_act_nums:
+            for item in sink.outcomes('missing'):
                 f.write(f"{item['act_num']}\n")
 
         print(f"  → Missing act_nums written to: {missing_file}")
 
     # Write error act_nums (timeouts, connection errors, etc.)
-    if error_act_nums:
+    if sink.pdf_error_count:
         error_file = join(output_dir, f"{state_code}_error_act_nums.json")
         with open(error_file, 'w') as f:
             json.dump({
                 'filename': filename,
                 'state_code': state_code,
                 'generated': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'total_errors': len(error_act_nums),
-                'errors': error_act_nums
+                'total_errors': sink.pdf_error_count,
+                'errors': list(sink.outcomes('error'))
             }, f, indent=2)
 
         print(f"  → Error act_nums written to: {error_file}")
 
+def check_file(file, state_code, df, cache, controller, output_dir):
+    """
+    Check the PDFs of one clean-data file and write its outcome files.
+
+    Args:
+        file (str): CSV name, used in the report
+        state_code (str): State code of the file
+        df (DataFrame): Clean data with an act_num column
+        cache (PdfExistenceCache): Cache of earlier results, optional
+        controller (AdaptiveConcurrency): Concurrency controller for HEAD requests
+        output_dir (str): Directory for the outcome files
+
+    Returns:
+        ResultSink: Counters and the closed stream of outcomes, or None if
+        there was nothing to check
+    """
+    if df.empty or "act_num" not in df.columns:
+        print("No data found or missing act_num column, skipping...")
+        return
+
+    total_rows = df.shape[0]
+
+    # Get unique act_nums to avoid duplicate checks; blobs are named after
+    # the canonical keys the upload uses, without control characters
+    unique_act_nums = sanitize(df['act_num']).dropna()
+    unique_act_nums = unique_act_nums[unique_act_nums != "nan"]
+    unique_act_nums = unique_act_nums.unique().tolist()
+
+    act_num_missing = total_rows - len(df['act_num'].dropna())
+    total_checked = len(unique_act_nums)
+
+    print(f"Total rows in CSV: {total_rows}")
+    print(f"Act numbers missing/empty: {act_num_missing}")
+    print(f"Unique act_nums to check: {total_checked}")
+
+    if total_checked == 0:
+        print("No valid act_nums found to check")
+        return
+
+    # Process all act_nums concurrently, streaming every outcome to disk
+    start_time = time.time()
+    results = ResultSink(join(output_dir, f"{state_code}_pdf_checks.jsonl"))
+    try:
+        process_act_nums(unique_act_nums, state_code, cache, controller, sink=results)
+    finally:
+        results.flush()
+        if cache is not None:
+            cache.flush()
+    end_time = time.time()
+    print(f"  → All outcomes written to: {results.path}")
+
+    # Write missing/error act_nums to files
+    write_missing_act_nums(state_code, file, results, output_dir)
+
+    # Print results
+    print(f"\nPDF URL Check Results for {file}:")
+    print("=" * 50)
+    print(f"Processing time: {end_time - start_time:.1f} seconds")
+    print(f"Average speed: {total_checked / (end_time - start_time):.1f} URLs/second")
+    print(f"HEAD requests: {controller.summary()}")
+
+    if total_checked > 0:
+        exists_pct = (results.pdf_exists_count / total_checked) * 100
+        missing_pct = (results.pdf_missing_count / total_checked) * 100
+        error_pct = (results.pdf_error_count / total_checked) * 100
+
+        print(f"\nPDF Availability:")
+        print(f"  PDFs found:     {results.pdf_exists_count:5}/{total_checked} ({exists_pct:.1f}%)")
+        print(f"  PDFs missing:   {results.pdf_missing_count:5}/{total_checked} ({missing_pct:.1f}%)")
+        print(f"  Check errors:   {results.pdf_error_count:5}/{total_checked} ({error_pct:.1f}%)")
+
+    print("-" * 50)
+    results.close()
+    return results
+
+
+def read_file_act_nums(clean_data_dir, dataset_dir, manifest, file, years=None):
+    """
+    Read the act_nums of one clean-data file, whatever the state of each row.
+
+    Files are selected by name, so rows with a missing or different state
+    are checked too. Files without state and year columns have no
+    partitions in the dataset and are read from the CSV. With `years`,
+    rows of other or missing years are left out and counted.
+
+    Args:
+        clean_data_dir (str): Directory with the clean-data CSVs
+        dataset_dir (str): Clean-data Parquet dataset directory
+        manifest (dict): Dataset manifest, see clean_dataset.update_dataset
+        file (str): CSV name
+        years (iterable): Years to keep, or None for every row
+
+    Returns:
+        DataFrame: act_num column of the selected rows
+    """
+    entry = manifest["sources"][file]
+    if not entry["partitions"]:
+        df = load_clean_csv(join(clean_data_dir, file), ["act_num"])
+        if years is not None:
+            print(f"No year column, checking all {len(df)} rows")
+        return df
+    df = read_dataset(dataset_dir, manifest, ["act_num"], years=years, sources=[file])
+    excluded = sum(partition["rows"] for partition in entry["partitions"]) - len(df)
+    if excluded:
+        print(f"Skipped {excluded} rows outside YEARS_TO_PROCESS or without a year")
+    return df
+
+
 def run():
     # Get the directory where the script is located
     script_dir = dirname(abspath(__file__))
@@ -272,123 +557,36 @@ def run():
         skipped_files = [f for f in all_files if f not in filtered_files]
         print(f"Skipped files: {', '.join(skipped_files[:5])}" + (f" and {len(skipped_files)-5} more" if len(skipped_files) > 5 else ""))
 
+    cache = None
+    if PDF_CACHE_TTL_DAYS is not None:
+        cache = PdfExistenceCache(
+            join(script_dir, "../data/.cache/pdf_existence.sqlite"),
+            ttl_seconds=PDF_CACHE_TTL_DAYS * 24 * 3600,
+        )
+        print(f"PDF existence cache: {cache.path} ({len(cache)} act_nums)")
+
+    # one controller for the whole run, so what it learned about the
+    # storage account carries over from state to state
+    controller = new_controller()
+
     print("Checking PDF URL availability with concurrent processing...")
     print("=" * 60)
 
+    dataset_dir = dataset_dir_for(clean_data_dir)
+    manifest = update_dataset(clean_data_dir, dataset_dir)
+
     for i, file in enumerate(filtered_files):
         state_code = extract_state_code_from_filename(file)
         print(f"\nProcessing {file} [{state_code}] ({i+1}/{len(filtered_files)})")
-        df = load_csv(join(clean_data_dir, file))
-
-        if df.empty:
-            print("No data found or missing act_num column, skipping...")
-            continue
-
-        total_rows = df.shape[0]
-
-        # Get unique act_nums to avoid duplicate checks
-        unique_act_nums = df['act_num'].dropna().astype(str)
-        unique_act_nums = unique_act_nums[unique_act_nums.str.strip() != ""]
-        unique_act_nums = unique_act_nums[unique_act_nums != "nan"]
-        unique_act_nums = unique_act_nums.unique().tolist()
-
-        act_num_missing = total_rows - len(df['act_num'].dropna())
-        total_checked = len(unique_act_nums)
-
-        print(f"Total rows in CSV: {total_rows}")
-        print(f"Act numbers missing/empty: {act_num_missing}")
-        print(f"Unique act_nums to check: {total_checked}")
-
-        if total_checked == 0:
-            print("No valid act_nums found to check")
-            continue
-
-        # Process all act_nums concurrently
-        start_time = time.time()
-        results = process_act_nums_batch(unique_act_nums, max_workers=30)
-        end_time = time.time()
-
-        # Write missing/error act_nums to files
-        if results['missing_act_nums'] or results['error_act_nums']:
-            write_missing_act_nums(
-                state_code,
-                file,
-                results['missing_act_nums'],
-                results['error_act_nums'],
-                output_dir
-            )
-
-        # Print results
-        print(f"\nPDF URL Check Results for {file}:")
-        print("=" * 50)
-        print(f"Processing time: {end_time - start_time:.1f} seconds")
-        print(f"Average speed: {total_checked / (end_time - start_time):.1f} URLs/second")
-
-        if total_checked > 0:
-            exists_pct = (results['pdf_exists_count'] / total_checked) * 100
-            missing_pct = (results['pdf_missing_count'] / total_checked) * 100
-            error_pct = (results['pdf_error_count'] / total_checked) * 100
-
-            print(f"\nPDF Availability:")
-            print(f"  PDFs found:     {results['pdf_exists_count']:5}/{total_checked} ({exists_pct:.1f}%)")
-            print(f"  PDFs missing:   {results['pdf_missing_count']:5}/{total_checked} ({missing_pct:.1f}%)")
-            print(f"  Check errors:   {results['pdf_error_count']:5}/{total_checked} ({error_pct:.1f}%)")
-
-        print("-" * 50)
+        df = read_file_act_nums(clean_data_dir, dataset_dir, manifest, file, YEARS_TO_PROCESS)
+
+        check_file(file, state_code, df, cache, controller, output_dir)
         del df
-        del results
         gc.collect()
 
-def load_csv(file_path):
-    """Load CSV file with proper column mapping and error handling."""
-    print(f"Loading data from {file_path}...")
+    if cache is not None:
+        cache.close()
 
-    try:
-        # Get available columns first
-        all_columns = pd.read_csv(file_path, nrows=0).columns
-    except Exception as e:
-        print(f"Error reading CSV headers: {e}")
-        return pd.DataFrame()
-
-    # Define column mappings
-    column_mappings = {
-        "State": "state",
-        "Year": "year",
-        "Title": "name",
-        "links": "link",
-        "Link to full text": "link",
-        "act_num": "act_num",
-        "year": "year",
-        "state": "state",
-        "name": "name",
-        "link": "link",
-    }
-
-    # Filter to only columns we care about (prioritize act_num)
-    columns_to_load = [
-        col
-        for col in all_columns
-        if col in column_mappings.keys() or col in column_mappings.values()
-    ]
-
-    # Ensure we have at least act_num column
-    if "act_num" not in columns_to_load and "act_num" not in [column_mappings.get(col) for col in columns_to_load]:
-        print("WARNING: No act_num column found in CSV")
-        return pd.DataFrame()
-
-    # Load only the columns that exist
-    try:
-        df = pd.read_csv(file_path, dtype=dtype, usecols=columns_to_load)
-    except Exception as e:
-        print(f"Error loading CSV: {e}")
-        return pd.DataFrame()
-
-    # Apply column renaming
-    for old_col, new_col in column_mappings.items():
-        if old_col in df.columns:
-            df.rename(columns={old_col: new_col}, inplace=True)
-
-    return df
 
 if __name__ == "__main__":
     try: